@@ -0,0 +1 @@
+"""Local micro-benchmarks and test harnesses. Run from backend/: python -m benchmarks.<name>"""
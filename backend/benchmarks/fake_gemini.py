@@ -0,0 +1,94 @@
+"""
+fake_gemini.py — local stand-in for the Gemini REST API.
+
+Serves `POST /v1beta/models/<model>:generateContent` (and its streaming twin
+`:streamGenerateContent?alt=sse`, one word per event) with a canned answer so
+NeuroBot's client (services/llm.py) can be exercised without network access,
+including slow and failing upstreams:
+
+    python -m benchmarks.fake_gemini --port 8089 --delay 0.2 --fail-rate 0.1
+    GEMINI_API_KEY=fake GEMINI_API_BASE=http://127.0.0.1:8089 uvicorn main:app
+
+--delay      seconds to wait before answering (exceed GEMINI_TIMEOUT_SECONDS
+             to exercise the deadline and circuit breaker)
+--fail-rate  fraction of requests answered with HTTP 500
+"""
+
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def answer_for(body: dict) -> str:
+    prompt   = body["contents"][0]["parts"][0]["text"]
+    question = prompt.split("\n", 1)[0].removeprefix("Question: ")
+    return (f"(fake model) Here is some general, educational information about "
+            f"\"{question[:80]}\". Please consult a neurologist for personal advice.")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, text: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for word in text.split(" "):
+            chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": word + " "}]}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode())
+            self.wfile.flush()
+            time.sleep(self.server.token_delay)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.server.requests += 1
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if random.random() < self.server.fail_rate:
+            return self._send(500, {"error": {"code": 500, "message": "fake upstream failure"}})
+        method = self.path.split("?")[0].rsplit(":", 1)[-1]
+        if method == "streamGenerateContent":
+            return self._stream(answer_for(body))
+        if method != "generateContent":
+            return self._send(404, {"error": {"code": 404, "message": "unknown method"}})
+        self._send(200, {"candidates": [{"content": {
+            "role": "model", "parts": [{"text": answer_for(body)}],
+        }}]})
+
+
+def serve(port: int, delay: float = 0.0, fail_rate: float = 0.0) -> ThreadingHTTPServer:
+    """
+    Build the server (call serve_forever() on it, e.g. in a thread). `delay`,
+    `fail_rate` and `token_delay` are attributes of the returned server and
+    may be changed live.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.delay, server.fail_rate, server.requests = delay, fail_rate, 0
+    server.token_delay = 0.01   # between streamed words
+    return server
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--delay", type=float, default=0.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    args = ap.parse_args()
+    print(f"fake Gemini on http://127.0.0.1:{args.port} (delay={args.delay}s, fail_rate={args.fail_rate})")
+    serve(args.port, args.delay, args.fail_rate).serve_forever()
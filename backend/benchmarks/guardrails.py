@@ -0,0 +1,97 @@
+"""
+guardrails.py — per-question guardrail cost vs. rule count.
+
+Pads the built-in rule pack with generated clinician-style rules (phrases
+over the knowledge-base vocabulary, in the shapes the built-in patterns use)
+up to 1,000 rules. It then times check_guardrails-style matching of NeuroBot
+questions two ways:
+
+  loop       re.search per pattern on the lower-cased question (the old code)
+  compiled   RuleSet.match — one trie-factored regex
+
+Compiled cost should stay roughly flat as rules are added.
+
+    python -m benchmarks.guardrails [max_rules]
+"""
+
+import random
+import re
+import statistics
+import sys
+import time
+
+from benchmarks.kb_retrieval import QUESTIONS
+from knowledge_base.bm25 import tokenize
+from knowledge_base.guardrails import BUILTIN_RULES, RuleSet, load_pack
+from knowledge_base.index import KNOWLEDGE_BASE
+
+SIZES     = [13, 100, 300, 1_000]
+QUESTION_COUNT = 2_000
+SHAPES    = [
+    r"\b{a} {b}\b",
+    r"\b{a} (my|your) {b}",
+    r"\b{a}(s)? {b}\b",
+    r"\bis (this|it) {a}\b",
+    r"\b{a}\w* {b}",
+]
+
+
+def _rules(n: int, vocab: list, rng: random.Random) -> dict:
+    patterns = set()
+    while len(patterns) < n:
+        a, b = rng.sample(vocab, 2)
+        patterns.add(rng.choice(SHAPES).format(a=re.escape(a), b=re.escape(b)))
+    return {"name": "synthetic", "version": 1,
+            "categories": [{"reason": "medication_request", "patterns": sorted(patterns)}]}
+
+
+def _questions(vocab: list, rng: random.Random) -> list:
+    out = []
+    for i in range(QUESTION_COUNT):
+        if i % 2:
+            out.append(rng.choice(QUESTIONS))
+        else:
+            out.append(" ".join(rng.sample(vocab, rng.randint(5, 15))).capitalize() + "?")
+    return out
+
+
+def _time(fn, questions: list) -> tuple:
+    for q in questions[:100]:       # warm-up
+        fn(q)
+    times = []
+    for q in questions:
+        t0 = time.perf_counter()
+        fn(q)
+        times.append((time.perf_counter() - t0) * 1e6)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.99)]
+
+
+def main(max_rules: int):
+    rng       = random.Random(11)
+    vocab     = sorted({t for c in KNOWLEDGE_BASE for t in tokenize(c["text"])})
+    builtin   = load_pack(BUILTIN_RULES)
+    questions = _questions(vocab, rng)
+    print(f"{'rules':>6} {'compile ms':>11} {'loop p50':>9} {'loop p99':>9} "
+          f"{'comp p50':>9} {'comp p99':>9} {'blocked':>8}   (µs per question)")
+    for n in (s for s in SIZES if s <= max_rules):
+        packs = [builtin] + ([_rules(n - 13, vocab, rng)] if n > 13 else [])
+        t0 = time.perf_counter()
+        rules = RuleSet(packs)
+        build = (time.perf_counter() - t0) * 1000
+        patterns = [p for c in rules.categories for p in c["patterns"]]
+
+        def loop(q: str):
+            q = q.lower()
+            return next((p for p in patterns if re.search(p, q)), None)
+
+        blocked = sum(rules.match(q.lower()) is not None for q in questions)
+        assert blocked == sum(loop(q) is not None for q in questions)
+        l50, l99 = _time(loop, questions)
+        c50, c99 = _time(lambda q: rules.match(q.lower()), questions)
+        print(f"{len(rules):>6} {build:>11.1f} {l50:>9.1f} {l99:>9.1f} {c50:>9.1f} {c99:>9.1f} "
+              f"{blocked / len(questions):>8.0%}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else SIZES[-1])
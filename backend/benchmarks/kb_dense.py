@@ -0,0 +1,77 @@
+"""
+kb_dense.py — dense retrieval latency and IVF recall vs. knowledge-base size.
+
+Embeds the same synthetic corpora as kb_retrieval (1k → 100k chunks) and
+times top-10 search, reported separately for:
+
+  exhaustive   blocked matrix–vector product over every row + argpartition
+  ivf          the nprobe closest of √n k-means lists (built at ≥ 20k rows)
+
+recall@10 is the share of the exhaustive top-10 that IVF also returns, for
+each nprobe given. Query embedding time is reported on its own.
+
+    python -m benchmarks.kb_dense [max_chunks] [nprobe,nprobe,...]
+"""
+
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.kb_retrieval import SIZES, _corpus, _queries
+from knowledge_base.dense import IVF_MIN_ROWS, IVF_NPROBE, DenseIndex
+
+QUERIES = 500
+TOP_K   = 10
+
+
+def _pct(times: list) -> tuple:
+    times = sorted(times)
+    return statistics.median(times), times[int(len(times) * 0.99)]
+
+
+def main(max_chunks: int, nprobes: list):
+    rng = np.random.default_rng(42)
+    print(f"{'chunks':>8} {'embed s':>8} {'q-embed µs':>11} {'exh p50':>8} {'exh p99':>8} "
+          f"{'nprobe':>7} {'ivf p50':>8} {'ivf p99':>8} {'recall@10':>10}   (search µs)")
+    for n in (s for s in SIZES if s <= max_chunks):
+        chunks = _corpus(n, rng)
+        t0 = time.perf_counter()
+        index = DenseIndex(chunks, nlist=int(np.sqrt(n)) if n >= IVF_MIN_ROWS else 0)
+        build = time.perf_counter() - t0
+        centroids = index.centroids
+
+        qvecs, embed_t = [], []
+        for q in _queries(chunks)[:QUERIES]:
+            t0 = time.perf_counter()
+            qvecs.append(index.embedder.embed(q))
+            embed_t.append((time.perf_counter() - t0) * 1e6)
+
+        exact, exh_t = [], []
+        index.centroids = None                    # force exhaustive search
+        for v in qvecs:
+            t0 = time.perf_counter()
+            exact.append(set(index.search_vec(v, TOP_K)[0].tolist()))
+            exh_t.append((time.perf_counter() - t0) * 1e6)
+        index.centroids = centroids
+
+        e50, e99 = _pct(exh_t)
+        row = f"{n:>8} {build:>8.2f} {statistics.median(embed_t):>11.0f} {e50:>8.0f} {e99:>8.0f}"
+        if centroids is None:
+            print(f"{row} {'-':>7} {'-':>8} {'-':>8} {'-':>10}")
+        for nprobe in nprobes if centroids is not None else ():
+            ivf_t, hits = [], 0
+            for v, truth in zip(qvecs, exact):
+                t0 = time.perf_counter()
+                got = index.search_vec(v, TOP_K, nprobe=nprobe)[0]
+                ivf_t.append((time.perf_counter() - t0) * 1e6)
+                hits += len(truth & set(got.tolist()))
+            p50, p99 = _pct(ivf_t)
+            print(f"{row} {nprobe:>7} {p50:>8.0f} {p99:>8.0f} {hits / (TOP_K * len(qvecs)):>10.2f}")
+            row = " " * len(row)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else SIZES[-1],
+         [int(p) for p in sys.argv[2].split(",")] if len(sys.argv) > 2 else [IVF_NPROBE, 32, 64])
@@ -0,0 +1,89 @@
+"""
+kb_retrieval.py — BM25 retrieval latency vs. knowledge-base size.
+
+Builds the index over synthetic corpora of 1k → 100k chunks (the curated
+chunks plus generated ones drawn from a Zipf-distributed vocabulary, so
+common words have long postings as in real text) and times
+retrieve-style top-3 queries. Latency should grow with the postings a query
+matches, not with corpus size, and stay under 1 ms at 100k chunks.
+
+    python -m benchmarks.kb_retrieval [max_chunks]
+"""
+
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from knowledge_base.bm25 import BM25Index, tokenize
+from knowledge_base.index import KNOWLEDGE_BASE
+
+SIZES      = [1_000, 10_000, 100_000]
+VOCAB      = 30_000
+CHUNK_LEN  = 80
+QUERIES    = 2_000
+
+QUESTIONS = [
+    "What is pause ratio?", "is slow reaction normal", "forgetting names",
+    "why does my memory score drop when I am tired", "parkinson tremor tapping",
+    "what does lexical diversity mean for speech", "cognitive reserve and education",
+]
+
+
+def _corpus(n: int, rng: np.random.Generator) -> list:
+    domain = sorted({t for c in KNOWLEDGE_BASE for t in tokenize(c["text"])})
+    words  = domain + [f"w{i}" for i in range(VOCAB - len(domain))]
+    rng.shuffle(words)   # domain words land at random frequency ranks
+    ranks  = rng.zipf(1.15, size=(n, CHUNK_LEN)) % len(words)
+    chunks = list(KNOWLEDGE_BASE)
+    for i in range(n - len(chunks)):
+        chunks.append({"id": f"syn_{i}", "source": "synthetic", "keywords": [],
+                       "text": " ".join(words[r] for r in ranks[i])})
+    return chunks
+
+
+def _queries(chunks: list) -> list:
+    rng = random.Random(7)
+    out = []
+    for _ in range(QUERIES):
+        if rng.random() < 0.5:
+            out.append(rng.choice(QUESTIONS))
+        else:   # a few words lifted from a random chunk
+            words = rng.choice(chunks)["text"].split()
+            out.append(" ".join(rng.sample(words, min(4, len(words)))))
+    return out
+
+
+def main(max_chunks: int):
+    rng = np.random.default_rng(42)
+    print(f"{'chunks':>8} {'build s':>8} {'load ms':>8} {'postings':>10} "
+          f"{'p50 µs':>8} {'p99 µs':>8} {'matched/q':>10}")
+    for n in (s for s in SIZES if s <= max_chunks):
+        chunks = _corpus(n, rng)
+        t0 = time.perf_counter()
+        index = BM25Index(chunks)
+        build = time.perf_counter() - t0
+        saved = tempfile.mkdtemp()
+        index.save(saved)
+        t0 = time.perf_counter()
+        index = BM25Index.load(saved)
+        load = (time.perf_counter() - t0) * 1000
+
+        queries, times, matched = _queries(chunks), [], []
+        for q in queries[:100]:                 # warm-up
+            index.search(q, 3)
+        for q in queries:
+            t0 = time.perf_counter()
+            index.search(q, 3)
+            times.append((time.perf_counter() - t0) * 1e6)
+            matched.append(sum(len(p[0]) for p in index._postings(tokenize(q))))
+        times.sort()
+        print(f"{n:>8} {build:>8.2f} {load:>8.0f} {len(index.doc_ids):>10} {statistics.median(times):>8.0f} "
+              f"{times[int(len(times) * 0.99)]:>8.0f} {statistics.mean(matched):>10.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else SIZES[-1])
@@ -0,0 +1,56 @@
+"""
+login_lookup.py — /auth/login email lookup latency vs. user count.
+
+Grows a throwaway database from 1k to 1M users and times the (email, role)
+lookup that login and register perform. Latency should stay flat.
+
+    python -m benchmarks.login_lookup [max_users]
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ["MINDSAATHI_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from storage import db  # noqa: E402
+
+SIZES   = [1_000, 10_000, 100_000, 1_000_000]
+LOOKUPS = 2_000
+
+
+def _grow(conn, start: int, stop: int):
+    rows = []
+    for i in range(start, stop):
+        email = f"user{i}@example.com"
+        doc   = db._dumps({"id": f"u{i}", "email": email, "role": "patient", "full_name": f"User {i}"})
+        rows.append((f"u{i}", email, "patient", doc))
+    with db.transaction():
+        conn.executemany("INSERT INTO users (id, email, role, doc) VALUES (?, ?, ?, ?)", rows)
+
+
+def main(max_users: int):
+    conn = db.get_conn()
+    have = 0
+    print(f"{'users':>10} {'p50 µs':>9} {'p99 µs':>9}")
+    for n in (s for s in SIZES if s <= max_users):
+        _grow(conn, have, n)
+        have = n
+        samples = []
+        for _ in range(LOOKUPS):
+            email = f"user{random.randrange(n)}@example.com"
+            t0 = time.perf_counter()
+            user = db.find_user_by_email(email, "patient")
+            samples.append((time.perf_counter() - t0) * 1e6)
+            assert user and user["email"] == email
+        samples.sort()
+        p50 = statistics.median(samples)
+        p99 = samples[int(len(samples) * 0.99) - 1]
+        print(f"{n:>10,} {p50:>9.1f} {p99:>9.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else SIZES[-1])
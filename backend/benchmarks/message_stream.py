@@ -0,0 +1,169 @@
+"""
+message_stream.py — server throughput with 1,000 connected message clients.
+
+Starts the API under uvicorn on a throwaway database and measures requests/sec
+(and p99 latency) of a fixed request load — `GET /api/messages/unread/count`
+from 16 concurrent workers — in three situations:
+
+  baseline   nothing else connected
+  sse-idle   1,000 clients holding /api/messages/stream open, no traffic
+  polling    1,000 clients polling /api/messages/{id} every 4 s (the old model)
+
+It then times push delivery: send → `message` event on the recipient's stream.
+
+    python -m benchmarks.message_stream [clients] [seconds]
+"""
+
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND     = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKERS     = 16
+POLL_PERIOD = 4.0
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(port: int) -> subprocess.Popen:
+    env = dict(os.environ, MINDSAATHI_DB_PATH=os.path.join(tempfile.mkdtemp(), "bench.db"))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND, env=env, stdout=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def _setup(base: str) -> tuple:
+    """A doctor and an enrolled patient; returns (doctor_token, patient_token, doctor_id, patient_id)."""
+    def register(**body):
+        r = httpx.post(f"{base}/api/auth/register", json=dict(password="secret1", **body))
+        r.raise_for_status()
+        return r.json()["token"], r.json()["user"]["id"]
+
+    dt, did = register(full_name="Bench Doctor", email="doc@bench.local", role="doctor")
+    pt, pid = register(full_name="Bench Patient", email="pat@bench.local")
+    httpx.post(f"{base}/api/auth/doctors/enroll", json={"doctor_id": did},
+               headers={"Authorization": f"Bearer {pt}"}).raise_for_status()
+    httpx.post(f"{base}/api/auth/doctors/approve", json={"patient_id": pid, "action": "approve"},
+               headers={"Authorization": f"Bearer {dt}"}).raise_for_status()
+    return dt, pt, did, pid
+
+
+# ── Clients ───────────────────────────────────────────────────────────────────
+
+async def _open_stream(port: int, token: str):
+    """Raw SSE connection; returns once the initial `unread` event has arrived."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"GET /api/messages/stream HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+        f"Authorization: Bearer {token}\r\nAccept: text/event-stream\r\n\r\n".encode()
+    )
+    await writer.drain()
+    while b"event: unread" not in await reader.readline():
+        pass
+    return reader, writer
+
+
+async def _poller(client: httpx.AsyncClient, path: str, headers: dict, stop: asyncio.Event):
+    await asyncio.sleep(random.uniform(0, POLL_PERIOD))
+    while not stop.is_set():
+        await client.get(path, headers=headers)
+        await asyncio.sleep(POLL_PERIOD)
+
+
+async def _load(client: httpx.AsyncClient, headers: dict, seconds: float) -> tuple:
+    latencies = []
+    deadline  = time.perf_counter() + seconds
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            r  = await client.get("/api/messages/unread/count", headers=headers)
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(worker() for _ in range(WORKERS)))
+    latencies.sort()
+    return len(latencies) / seconds, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+# ── Scenarios ─────────────────────────────────────────────────────────────────
+
+async def run(port: int, clients: int, seconds: float):
+    base = f"http://127.0.0.1:{port}"
+    dt, pt, did, pid = _setup(base)
+    H = lambda t: {"Authorization": f"Bearer {t}"}
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30) as client:
+        print(f"{'scenario':>10} {'req/s':>9} {'p99 ms':>8}")
+
+        rps, p99 = await _load(client, H(pt), seconds)
+        print(f"{'baseline':>10} {rps:>9.0f} {p99:>8.1f}")
+
+        streams = []
+        for i in range(0, clients, 100):
+            streams += await asyncio.gather(*(_open_stream(port, dt) for _ in range(min(100, clients - i))))
+        rps, p99 = await _load(client, H(pt), seconds)
+        print(f"{'sse-idle':>10} {rps:>9.0f} {p99:>8.1f}   ({len(streams)} streams open)")
+        for _, w in streams:
+            w.close()
+
+        stop    = asyncio.Event()
+        pollers = [asyncio.create_task(_poller(client, f"/api/messages/{pid}", H(dt), stop))
+                   for _ in range(clients)]
+        await asyncio.sleep(POLL_PERIOD)   # let every poller get going
+        rps, p99 = await _load(client, H(pt), seconds)
+        print(f"{'polling':>10} {rps:>9.0f} {p99:>8.1f}   ({clients} clients / {POLL_PERIOD:.0f} s)")
+        stop.set()
+        await asyncio.gather(*pollers)
+
+        # Push latency: doctor sends, patient's stream receives.
+        reader, writer = await _open_stream(port, pt)
+        delays = []
+        for i in range(50):
+            t0 = time.perf_counter()
+            r  = await client.post("/api/messages/send", json={"recipient_id": pid, "text": f"m{i}"},
+                                   headers=H(dt))
+            r.raise_for_status()
+            while b"event: message" not in await reader.readline():
+                pass
+            delays.append((time.perf_counter() - t0) * 1000)
+        writer.close()
+        print(f"\npush send → event: p50 {statistics.median(delays):.1f} ms, "
+              f"max {max(delays):.1f} ms (includes the send request)")
+
+
+def main(clients: int, seconds: float):
+    port = _free_port()
+    proc = _start_server(port)
+    try:
+        asyncio.run(run(port, clients, seconds))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 5.0)
@@ -0,0 +1,81 @@
+"""
+risk_batching.py — disease-risk scoring throughput and latency, per call vs. micro-batched.
+
+Runs closed-loop workers on one event loop, at concurrency 1 → 1,024. Each
+worker repeatedly yields to the loop (standing in for the rest of an
+/api/analyze request) and then scores one feature vector, either:
+
+  direct    compute_disease_risks() — three np.dot calls per vector
+  batched   MicroBatcher over compute_disease_risks_batch() — one
+            (N × 18) · (18 × 3) product per window
+
+Latency runs from the yield to the scores being available, so it includes
+the time spent queued behind other workers' scoring.
+
+    python -m benchmarks.risk_batching [seconds_per_run]
+"""
+
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+from models.schemas import FeatureVector, UserProfile
+from services.ai_service import (
+    FEATURE_NAMES, FEATURE_SCALE, RISK_BATCH_MAX, RISK_BATCH_WINDOW_MS,
+    compute_disease_risks, compute_disease_risks_batch,
+)
+from utils.batching import MicroBatcher
+
+CONCURRENCY = [1, 8, 64, 256, 1_024]
+SAMPLES     = 4_096
+
+
+def _samples() -> list:
+    rng = random.Random(3)
+    out = []
+    for _ in range(SAMPLES):
+        fv = FeatureVector(**{n: rng.uniform(0.2, 1.5) * s for n, s in zip(FEATURE_NAMES, FEATURE_SCALE)})
+        profile = UserProfile(age=rng.randint(40, 90), sleep_hours=rng.uniform(4, 9)) if rng.random() < 0.5 else None
+        out.append((fv, profile))
+    return out
+
+
+async def _run(score, concurrency: int, seconds: float, samples: list) -> tuple:
+    latencies, stop = [], time.perf_counter() + seconds
+
+    async def worker(i: int):
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            await asyncio.sleep(0)
+            await score(samples[i % SAMPLES])
+            latencies.append(time.perf_counter() - t0)
+            i += concurrency
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, statistics.median(latencies) * 1e3, latencies[int(len(latencies) * 0.99)] * 1e3
+
+
+async def main(seconds: float):
+    samples = _samples()
+
+    async def direct(item):
+        return compute_disease_risks(*item)
+
+    print(f"window {RISK_BATCH_WINDOW_MS} ms, max batch {RISK_BATCH_MAX}")
+    print(f"{'workers':>8} {'direct/s':>10} {'p50 ms':>7} {'p99 ms':>7} "
+          f"{'batched/s':>10} {'p50 ms':>7} {'p99 ms':>7} {'mean batch':>11}")
+    for c in CONCURRENCY:
+        batcher = MicroBatcher(compute_disease_risks_batch, RISK_BATCH_WINDOW_MS / 1000, RISK_BATCH_MAX)
+        d_rate, d50, d99 = await _run(direct, c, seconds, samples)
+        b_rate, b50, b99 = await _run(batcher.submit, c, seconds, samples)
+        print(f"{c:>8} {d_rate:>10.0f} {d50:>7.2f} {d99:>7.2f} "
+              f"{b_rate:>10.0f} {b50:>7.2f} {b99:>7.2f} {batcher.stats()['mean_batch']:>11}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(float(sys.argv[1]) if len(sys.argv) > 1 else 2.0))
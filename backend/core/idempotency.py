@@ -0,0 +1,120 @@
+"""
+idempotency.py — `Idempotency-Key` support for endpoints that score and store.
+
+Mobile clients resend a submission when a response is lost to a timeout.
+When the request carries an `Idempotency-Key` header, the first request with
+that key runs as usual and its response is kept. A repeat of the key, from
+the same caller to the same endpoint with the same body, gets the kept
+response back. Nothing is scored or written again.
+
+  - A repeat that arrives while the first request is still running → 409
+  - The same key with a different body → 422
+  - A request that fails is forgotten, so its retry runs again
+
+Keys are held in process memory. The store keeps at most
+IDEMPOTENCY_MAX_KEYS of them, evicting the least recently used, and each
+expires IDEMPOTENCY_TTL_SECONDS after its response was stored.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from fastapi import HTTPException
+
+from utils.cache import TTLCache
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_KEYS    = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+MAX_KEY_LENGTH          = 255
+
+_PENDING   = object()
+_keys      = TTLCache(IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_TTL_SECONDS)   # scoped key → (fingerprint, response)
+_lock      = threading.Lock()
+_replays   = 0
+_conflicts = 0
+
+
+def fingerprint(body: Any) -> str:
+    """SHA-256 of a request body's canonical JSON."""
+    return hashlib.sha256(json.dumps(body, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def scoped_key(endpoint: str, user: Optional[dict], key: Optional[str]) -> Optional[str]:
+    """The header's key scoped to endpoint and caller (None if no header was sent); 400 if malformed."""
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1–{MAX_KEY_LENGTH} characters.")
+    return f"{endpoint}|{user['id'] if user else '-'}|{key}"
+
+
+def begin(scoped: str, fp: str) -> Any:
+    """
+    The stored response for a repeated key, or None after reserving the key
+    for this request (then call finish() or abandon()).
+    """
+    global _replays, _conflicts
+    with _lock:
+        entry = _keys.get(scoped)
+        if entry is None:
+            _keys.set(scoped, (fp, _PENDING))
+            return None
+        stored_fp, response = entry
+        if stored_fp != fp:
+            _conflicts += 1
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request.")
+        if response is _PENDING:
+            _conflicts += 1
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed.")
+        _replays += 1
+        return response
+
+
+def finish(scoped: str, fp: str, response: Any):
+    with _lock:
+        _keys.set(scoped, (fp, response))
+
+
+def abandon(scoped: str):
+    with _lock:
+        _keys.pop(scoped)
+
+
+def call(scoped: Optional[str], fp: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+    """(response, replayed): fn() once per key. Without a key, fn() is simply called."""
+    if scoped is None:
+        return fn(), False
+    stored = begin(scoped, fp)
+    if stored is not None:
+        return stored, True
+    try:
+        response = fn()
+    except BaseException:
+        abandon(scoped)
+        raise
+    finish(scoped, fp, response)
+    return response, False
+
+
+async def acall(scoped: Optional[str], fp: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+    """call() for async handlers."""
+    if scoped is None:
+        return await fn(), False
+    stored = begin(scoped, fp)
+    if stored is not None:
+        return stored, True
+    try:
+        response = await fn()
+    except BaseException:
+        abandon(scoped)
+        raise
+    finish(scoped, fp, response)
+    return response, False
+
+
+def idempotency_stats() -> dict:
+    return {**_keys.stats(), "replays": _replays, "conflicts": _conflicts}
@@ -1,6 +1,22 @@
+import math
 import statistics
 from typing import Optional
 
+METRICS = [
+    ("memory_score",    "Memory"),
+    ("speech_score",    "Speech"),
+    ("reaction_score",  "Reaction Time"),
+    ("executive_score", "Executive Function"),
+    ("motor_score",     "Motor Control"),
+]
+RISK_FIELDS = ["alzheimers_risk", "dementia_risk", "parkinsons_risk"]
+
+
+def _trend_from_slope(slope: float) -> str:
+    if slope > 1.0:      return "improving"
+    elif slope < -1.0:   return "declining"
+    else:                return "stable"
+
 
 def compute_trend(scores: list[float]) -> str:
     """
@@ -21,11 +37,7 @@ def compute_trend(scores: list[float]) -> str:
     if denominator == 0:
         return "stable"
 
-    slope = numerator / denominator
-
-    if slope > 1.0:      return "improving"
-    elif slope < -1.0:   return "declining"
-    else:                return "stable"
+    return _trend_from_slope(numerator / denominator)
 
 
 def compute_change_rate(scores: list[float]) -> Optional[float]:
@@ -42,6 +54,19 @@ def compute_change_rate(scores: list[float]) -> Optional[float]:
     return round(((latest - first) / first) * 100, 2)
 
 
+def _overall_trajectory(trends: list[str]) -> str:
+    """Overall trajectory = most common of the per-metric trends."""
+    if not trends:
+        return "insufficient_data"
+    improving_count = trends.count("improving")
+    declining_count = trends.count("declining")
+    if declining_count > improving_count:
+        return "declining"
+    elif improving_count > declining_count:
+        return "improving"
+    return "stable"
+
+
 def build_progress_summary(historical_results: list[dict]) -> dict:
     """
     Build a full progress summary from historical results.
@@ -56,14 +81,6 @@ def build_progress_summary(historical_results: list[dict]) -> dict:
             "metrics": {},
         }
 
-    METRICS = [
-        ("memory_score",    "Memory"),
-        ("speech_score",    "Speech"),
-        ("reaction_score",  "Reaction Time"),
-        ("executive_score", "Executive Function"),
-        ("motor_score",     "Motor Control"),
-    ]
-
     metric_summaries = {}
     trajectory_scores = []
 
@@ -78,29 +95,18 @@ def build_progress_summary(historical_results: list[dict]) -> dict:
             "average":      round(statistics.mean(series), 2),
             "best":         round(max(series), 2),
             "worst":        round(min(series), 2),
+            "std_dev":      round(statistics.stdev(series), 2) if len(series) > 1 else None,
             "trend":        compute_trend(series),
             "change_rate":  compute_change_rate(series),
             "history":      [round(s, 2) for s in series],
         }
         trajectory_scores.append(compute_trend(series))
 
-    # Overall trajectory = most common trend
-    if trajectory_scores:
-        improving_count = trajectory_scores.count("improving")
-        declining_count = trajectory_scores.count("declining")
-        if declining_count > improving_count:
-            overall = "declining"
-        elif improving_count > declining_count:
-            overall = "improving"
-        else:
-            overall = "stable"
-    else:
-        overall = "insufficient_data"
+    overall = _overall_trajectory(trajectory_scores)
 
     # Risk trend from stored probabilities
-    risk_fields = ["alzheimers_risk", "dementia_risk", "parkinsons_risk"]
     risk_trends = {}
-    for rf in risk_fields:
+    for rf in RISK_FIELDS:
         series = [r[rf] for r in historical_results if rf in r]
         if series:
             risk_trends[rf] = {
@@ -115,3 +121,162 @@ def build_progress_summary(historical_results: list[dict]) -> dict:
         "metrics":            metric_summaries,
         "risk_trends":        risk_trends,
     }
+
+
+# ── Running progress state ────────────────────────────────────────────────────
+# build_progress_summary() re-folds the whole history on every call. The state
+# below carries the same statistics forward one result at a time, so a summary
+# can be served without loading the history. Per series (each metric and risk
+# field) it keeps the count, Welford mean / M2, Σx·y over the positions
+# 0..n-1 for the regression slope, min / max and the retained values (the
+# summary returns them as `history`; first / last are their ends). Results
+# leave the state oldest first, when the stored history is trimmed.
+
+def _empty_series() -> dict:
+    return {"n": 0, "mean": 0.0, "m2": 0.0, "sxy": 0.0, "min": None, "max": None, "values": []}
+
+
+def _push(s: dict, y: float):
+    n = s["n"]
+    s["sxy"]  += n * y                 # y sits at x = n
+    s["n"]     = n + 1
+    d          = y - s["mean"]
+    s["mean"] += d / (n + 1)
+    s["m2"]   += d * (y - s["mean"])
+    s["min"]   = y if s["min"] is None else min(s["min"], y)
+    s["max"]   = y if s["max"] is None else max(s["max"], y)
+    s["values"].append(y)
+
+
+def _pop_oldest(s: dict):
+    y = s["values"].pop(0)
+    n = s["n"] - 1
+    if n == 0:
+        s.update(_empty_series())
+        return
+    s["n"]     = n
+    d          = y - s["mean"]
+    s["mean"] -= d / n
+    s["m2"]   -= d * (y - s["mean"])
+    s["sxy"]  -= n * s["mean"]         # y was at x = 0; every remaining x moves down by one
+    if y == s["min"]:
+        s["min"] = min(s["values"])
+    if y == s["max"]:
+        s["max"] = max(s["values"])
+
+
+def _slope(s: dict) -> float:
+    """Least-squares slope of the series over x = 0..n-1 (n ≥ 2)."""
+    n = s["n"]
+    return (s["sxy"] - (n - 1) / 2 * n * s["mean"]) / (n * (n * n - 1) / 12)
+
+
+def new_progress_state() -> dict:
+    return {"sessions": 0, "series": {f: _empty_series() for f in (*(f for f, _ in METRICS), *RISK_FIELDS)}}
+
+
+def progress_state_add(state: dict, result: dict):
+    """Fold the newest result into the state."""
+    state["sessions"] += 1
+    for field, s in state["series"].items():
+        if field in result:
+            _push(s, result[field])
+
+
+def progress_state_remove(state: dict, result: dict):
+    """Drop the oldest result (one trimmed from the stored history) from the state."""
+    state["sessions"] -= 1
+    for field, s in state["series"].items():
+        if field in result:
+            _pop_oldest(s)
+
+
+def progress_state_from(historical_results: list[dict]) -> dict:
+    state = new_progress_state()
+    for r in historical_results:
+        progress_state_add(state, r)
+    return state
+
+
+def progress_summary_from_state(state: Optional[dict]) -> dict:
+    """build_progress_summary() from a running state, without the history."""
+    if not state or not state["sessions"]:
+        return {
+            "session_count": 0,
+            "overall_trajectory": "no_data",
+            "metrics": {},
+        }
+
+    metric_summaries = {}
+    trajectory_scores = []
+    for field, label in METRICS:
+        s = state["series"][field]
+        if not s["n"]:
+            continue
+        trend = _trend_from_slope(_slope(s)) if s["n"] > 1 else "insufficient_data"
+        metric_summaries[field] = {
+            "label":        label,
+            "latest":       round(s["values"][-1], 2),
+            "average":      round(s["mean"], 2),
+            "best":         round(s["max"], 2),
+            "worst":        round(s["min"], 2),
+            "std_dev":      round(math.sqrt(max(s["m2"], 0.0) / (s["n"] - 1)), 2) if s["n"] > 1 else None,
+            "trend":        trend,
+            "change_rate":  compute_change_rate(s["values"]),
+            "history":      [round(v, 2) for v in s["values"]],
+        }
+        trajectory_scores.append(trend)
+
+    risk_trends = {}
+    for rf in RISK_FIELDS:
+        s = state["series"][rf]
+        if s["n"]:
+            risk_trends[rf] = {
+                "latest":  round(s["values"][-1], 4),
+                "average": round(s["mean"], 4),
+                "trend":   _trend_from_slope(_slope(s) * 100) if s["n"] > 1 else "insufficient_data",
+            }
+
+    return {
+        "session_count":      state["sessions"],
+        "overall_trajectory": _overall_trajectory(trajectory_scores),
+        "metrics":            metric_summaries,
+        "risk_trends":        risk_trends,
+    }
+
+
+def progress_state_drift(state: Optional[dict], historical_results: list[dict], tol: float = 1e-6) -> list[str]:
+    """
+    Where a running state disagrees with the statistics computed from scratch
+    over `historical_results`, as "field.stat" names (empty if consistent).
+    Floating-point quantities are compared to within `tol` (relative).
+    """
+    state = state or new_progress_state()
+    drift = [] if state["sessions"] == len(historical_results) else ["sessions"]
+
+    def close(a, b):
+        return math.isclose(a, b, rel_tol=tol, abs_tol=tol)
+
+    for field, s in state["series"].items():
+        series = [r[field] for r in historical_results if field in r]
+        n      = len(series)
+        if s["n"] != n or s["values"] != series:
+            drift.append(f"{field}.values")
+            continue
+        if not n:
+            continue
+        x_mean = (n - 1) / 2
+        checks = {
+            "mean":     (s["mean"], statistics.mean(series)),
+            "variance": (s["m2"] / (n - 1) if n > 1 else 0.0, statistics.variance(series) if n > 1 else 0.0),
+            "min":      (s["min"], min(series)),
+            "max":      (s["max"], max(series)),
+        }
+        if n > 1:
+            checks["slope"] = (
+                _slope(s),
+                sum((i - x_mean) * (y - statistics.mean(series)) for i, y in enumerate(series))
+                / sum((i - x_mean) ** 2 for i in range(n)),
+            )
+        drift += [f"{field}.{name}" for name, (got, want) in checks.items() if not close(got, want)]
+    return drift
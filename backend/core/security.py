@@ -0,0 +1,265 @@
+"""
+security.py — MindSaathi request authentication
+Single FastAPI dependency that resolves `Authorization: Bearer <token>` to a
+user document, replacing the per-router `_user_from_token` / `_auth` helpers.
+
+Resolution goes through two bounded LRU+TTL caches:
+  token   → user_id   (dropped on /auth/logout)
+  user_id → user doc  (dropped whenever a route writes that user)
+so the polling endpoints (/messages/unread/count, /messages/{id}) do not touch
+storage between writes. The TTL bounds staleness across uvicorn workers.
+
+Sessions expire SESSION_ABSOLUTE_TTL_SECONDS after login, or after
+SESSION_IDLE_TTL_SECONDS without a request. Activity is recorded at most once
+per SESSION_TOUCH_INTERVAL_SECONDS per session through the write queue, and
+`sweep_sessions()` deletes expired rows in the background so the sessions
+table holds only live logins.
+
+With AUTH_TOKEN_MODE=signed, login issues stateless HMAC-signed tokens
+(`v1.<claims>.<signature>`) carrying user id, role, issue time and expiry.
+They verify with CPU work alone in any worker or host sharing
+AUTH_TOKEN_SECRET. Logout adds the token id to a small denylist that each
+worker mirrors in memory and refreshes every AUTH_DENYLIST_REFRESH_SECONDS.
+A token whose role no longer matches the user's is refused. Session tokens
+issued earlier keep working in either mode.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from storage import db
+from storage.writer import writer
+from utils.cache import TTLCache
+from utils.logger import log_error, log_info
+
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+SESSION_ABSOLUTE_TTL_SECONDS   = float(os.getenv("SESSION_ABSOLUTE_TTL_SECONDS", str(7 * 24 * 3600)))
+SESSION_IDLE_TTL_SECONDS       = float(os.getenv("SESSION_IDLE_TTL_SECONDS", str(24 * 3600)))
+SESSION_TOUCH_INTERVAL_SECONDS = float(os.getenv("SESSION_TOUCH_INTERVAL_SECONDS", "60"))
+SESSION_SWEEP_INTERVAL_SECONDS = float(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "300"))
+
+AUTH_TOKEN_MODE                = os.getenv("AUTH_TOKEN_MODE", "session").lower()   # session | signed
+AUTH_TOKEN_SECRET              = os.getenv("AUTH_TOKEN_SECRET", "").encode()
+AUTH_DENYLIST_REFRESH_SECONDS  = float(os.getenv("AUTH_DENYLIST_REFRESH_SECONDS", "5"))
+
+if AUTH_TOKEN_MODE not in ("session", "signed"):
+    raise RuntimeError(f"AUTH_TOKEN_MODE must be 'session' or 'signed', got {AUTH_TOKEN_MODE!r}")
+if AUTH_TOKEN_MODE == "signed" and len(AUTH_TOKEN_SECRET) < 32:
+    raise RuntimeError("AUTH_TOKEN_MODE=signed needs AUTH_TOKEN_SECRET (at least 32 bytes)")
+
+SIGNED_TOKEN_PREFIX = "v1."
+
+_token_cache = TTLCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS)
+_user_cache  = TTLCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS)
+
+_sweeps = {"runs": 0, "expired": 0, "last_run_at": None}
+
+_denylist: dict = {}            # jti → expiry, mirrored from storage
+_denylist_loaded_at = 0.0
+_denylist_lock = threading.Lock()
+
+
+def token_from_header(authorization: Optional[str]) -> str:
+    return (authorization or "").replace("Bearer ", "").strip()
+
+
+# ── Signed tokens ─────────────────────────────────────────────────────────────
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(body: str) -> bytes:
+    return hmac.new(AUTH_TOKEN_SECRET, body.encode(), hashlib.sha256).digest()
+
+
+def issue_signed_token(user: dict, now: Optional[float] = None) -> str:
+    now    = now or time.time()
+    claims = {
+        "sub":  user["id"],
+        "role": user.get("role", "patient"),
+        "iat":  int(now),
+        "exp":  int(now + SESSION_ABSOLUTE_TTL_SECONDS),
+        "jti":  secrets.token_hex(8),
+    }
+    body = _b64(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{SIGNED_TOKEN_PREFIX}{body}.{_b64(_sign(body))}"
+
+
+def _is_denied(jti: str, now: float) -> bool:
+    global _denylist, _denylist_loaded_at
+    if now - _denylist_loaded_at >= AUTH_DENYLIST_REFRESH_SECONDS:
+        with _denylist_lock:
+            if now - _denylist_loaded_at >= AUTH_DENYLIST_REFRESH_SECONDS:
+                _denylist, _denylist_loaded_at = db.load_denylist(now), now
+    return jti in _denylist
+
+
+def verify_signed_token(token: str, now: Optional[float] = None) -> Optional[dict]:
+    """Claims of a valid, unexpired, non-revoked signed token; None otherwise."""
+    if not AUTH_TOKEN_SECRET or not token.startswith(SIGNED_TOKEN_PREFIX):
+        return None
+    now = now or time.time()
+    try:
+        body, sig = token[len(SIGNED_TOKEN_PREFIX):].split(".")
+        if not hmac.compare_digest(_unb64(sig), _sign(body)):
+            return None
+        claims = json.loads(_unb64(body))
+    except (ValueError, TypeError):
+        return None
+    if claims.get("exp", 0) <= now or _is_denied(claims.get("jti", ""), now):
+        return None
+    return claims
+
+
+def revoke_signed_token(token: str) -> bool:
+    """Deny a signed token until it would have expired (logout). False if it was not valid."""
+    claims = verify_signed_token(token)
+    if not claims:
+        return False
+    writer.run(db.deny_token, claims["jti"], claims["exp"])
+    with _denylist_lock:   # a reload in progress may predate the insert; add to the list it installs
+        _denylist[claims["jti"]] = claims["exp"]
+    return True
+
+
+# ── Token resolution ──────────────────────────────────────────────────────────
+
+def _session_live(session: dict, now: float) -> bool:
+    return (now - session["created_ts"] < SESSION_ABSOLUTE_TTL_SECONDS
+            and now - session["last_seen"] < SESSION_IDLE_TTL_SECONDS)
+
+
+def resolve_token(token: str) -> Optional[dict]:
+    """Token → user document (a shallow copy, safe for the caller to modify)."""
+    if not token:
+        return None
+
+    now = time.time()
+    if token.startswith(SIGNED_TOKEN_PREFIX):
+        claims = verify_signed_token(token, now)
+        if not claims:
+            return None
+        user = _load_user(claims["sub"])
+        # A role change invalidates every token that still claims the old role.
+        if not user or user.get("role", "patient") != claims["role"]:
+            return None
+        return dict(user)
+
+    session = _token_cache.get(token)
+    if session is None or not _session_live(session, now):
+        # Cache miss, or it looks expired: storage is authoritative (another
+        # worker may have seen more recent activity on this session).
+        session = db.get_session(token)
+        if not session or not _session_live(session, now):
+            _token_cache.pop(token)
+            return None
+        _token_cache.set(token, session)
+
+    if now - session["last_seen"] >= SESSION_TOUCH_INTERVAL_SECONDS:
+        session["last_seen"] = now
+        writer.submit(db.touch_session, token, now)   # fire-and-forget, coalesced
+
+    user = _load_user(session["user_id"])
+    return dict(user) if user else None
+
+
+def _load_user(user_id: str) -> Optional[dict]:
+    user = _user_cache.get(user_id)
+    if user is None:
+        user = db.get_user(user_id)
+        if user:
+            _user_cache.set(user_id, user)
+    return user
+
+
+# ── FastAPI dependencies ──────────────────────────────────────────────────────
+
+def current_user(authorization: str = Header(...)) -> dict:
+    """Require a valid session; 401 otherwise."""
+    user = resolve_token(token_from_header(authorization))
+    if not user:
+        raise HTTPException(status_code=401, detail="Unauthorized. Please log in.")
+    return user
+
+
+def optional_user(authorization: Optional[str] = Header(default=None)) -> Optional[dict]:
+    """Resolve the session if one is supplied (anonymous use allowed)."""
+    if not authorization:
+        return None
+    return resolve_token(token_from_header(authorization))
+
+
+# ── Invalidation + metrics ────────────────────────────────────────────────────
+
+def invalidate_token(token: str) -> None:
+    _token_cache.pop(token)
+
+
+def invalidate_user(*user_ids: str) -> None:
+    """Call after committing a write to these users' documents."""
+    for uid in user_ids:
+        if uid:
+            _user_cache.pop(uid)
+
+
+def cache_stats() -> dict:
+    return {"tokens": _token_cache.stats(), "users": _user_cache.stats()}
+
+
+# ── Session expiry ────────────────────────────────────────────────────────────
+
+def expire_sessions(now: Optional[float] = None) -> int:
+    """Delete every session past its absolute or idle TTL (runs on the write queue)."""
+    now = now or time.time()
+    removed = writer.run(
+        db.delete_expired_sessions,
+        now - SESSION_ABSOLUTE_TTL_SECONDS,
+        now - SESSION_IDLE_TTL_SECONDS,
+    )
+    writer.run(db.delete_expired_denials, now)
+    _sweeps["runs"]       += 1
+    _sweeps["expired"]    += removed
+    _sweeps["last_run_at"] = now
+    return removed
+
+
+async def sweep_sessions():
+    """Background task: expire sessions every SESSION_SWEEP_INTERVAL_SECONDS."""
+    while True:
+        try:
+            removed = await asyncio.to_thread(expire_sessions)
+            if removed:
+                log_info(f"[sessions] swept {removed} expired sessions")
+        except Exception as exc:
+            log_error(f"[sessions] sweep failed: {exc}")
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL_SECONDS)
+
+
+def session_stats() -> dict:
+    return {
+        "live":             db.count_sessions(),
+        "token_mode":       AUTH_TOKEN_MODE,
+        "denylist":         len(_denylist),
+        "absolute_ttl_s":   SESSION_ABSOLUTE_TTL_SECONDS,
+        "idle_ttl_s":       SESSION_IDLE_TTL_SECONDS,
+        "sweeps":           _sweeps["runs"],
+        "expired_total":    _sweeps["expired"],
+        "last_sweep_at":    _sweeps["last_run_at"],
+    }
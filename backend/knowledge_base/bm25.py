@@ -0,0 +1,283 @@
+"""
+MindSaathi RAG - BM25 Inverted Index
+====================================
+Okapi BM25 over knowledge-base chunks, built once and queried many times.
+Indexes can be saved as plain .npy arrays and reopened memory-mapped, and
+updated with added / removed chunks without re-tokenizing the rest.
+
+Postings are stored CSR-style in flat NumPy arrays — per term a slice of
+`doc_ids` (int32) and precomputed BM25 `weights` (float32) — so a query
+only touches the postings of its own terms:
+
+    score(d) = Σ_t∈q  idf(t) · tf·(k1+1) / (tf + k1·(1 − b + b·|d|/avgdl))
+
+Each term's postings are kept twice: by doc id (for binary-search probes)
+and by impact, highest weight first. A query is answered exactly in two
+steps without walking whole postings lists:
+
+  1. Score the union of every term's top-SEED postings in full. The k-th
+     score among them, θ, is a lower bound on the final k-th score.
+  2. Terms whose max weights together stay below θ cannot carry a document
+     there on their own (MaxScore), so every result contains one of the
+     other, "essential" terms t. It also needs w_t(d) ≥ θ − Σ_{u≠t} max w_u.
+     Only the impact-ordered prefix of each essential list above that line
+     can hold a result. Score that union.
+
+When the prefixes are no smaller than the lists themselves, every posting
+is accumulated into a per-thread buffer instead. Either way the work depends
+on the query's postings, never on the corpus size. The top-k are picked
+with argpartition, and ties go to the earlier chunk.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import Counter
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+K1 = 1.2
+B  = 0.75
+KEYWORD_BOOST = 2   # curated keywords count this many times a body word
+SEED  = 32          # impact-ordered postings per term used to seed the threshold
+
+STOPWORDS = frozenset("""
+    a an the is are was were be been being am do does did can could should would
+    will may might must i me my we our you your it its this that these those
+    there here what which who whom whose how why when where of in on at to for
+    with by from as and or but if so than then too very just about into over
+    such also has have had having any some more most other
+""".split())
+
+_WORD = re.compile(r"\w+")
+
+
+def _stem(word: str) -> str:
+    """Fold simple plurals: pauses → pause, signs → sign (not 'loss', 'status')."""
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(w) for w in _WORD.findall(text.lower())
+            if len(w) > 1 and w not in STOPWORDS]
+
+
+def chunk_terms(chunk: dict) -> List[str]:
+    """Indexed terms of a chunk: its text plus its curated keywords (boosted)."""
+    keywords = tokenize(" ".join(chunk.get("keywords", ())))
+    return tokenize(chunk["text"]) + keywords * KEYWORD_BOOST
+
+
+_ARRAYS = ("offsets", "doc_ids", "tfs", "lengths", "weights", "imp_ids", "imp_weights")
+
+
+def _count_terms(chunks: List[dict], vocab: dict, first_doc: int) -> tuple:
+    """(term ids, doc ids, tfs, doc lengths) for `chunks`; new terms are added to `vocab`."""
+    terms, docs, tfs = [], [], []
+    lengths = np.zeros(len(chunks), dtype=np.float32)
+    for i, chunk in enumerate(chunks):
+        counts = Counter(chunk_terms(chunk))
+        lengths[i] = sum(counts.values())
+        for term, tf in counts.items():
+            terms.append(vocab.setdefault(term, len(vocab)))
+            docs.append(first_doc + i)
+            tfs.append(tf)
+    return (np.asarray(terms, dtype=np.int32), np.asarray(docs, dtype=np.int32),
+            np.asarray(tfs, dtype=np.float32), lengths)
+
+
+class BM25Index:
+    """
+    Immutable once built: update() returns a new index and leaves this one
+    untouched, so readers holding it are never disturbed (hot-swap).
+    """
+
+    def __init__(self, chunks: Iterable[dict] = (), k1: float = K1, b: float = B):
+        chunks = list(chunks)
+        vocab: dict = {}
+        terms, docs, tfs, lengths = _count_terms(chunks, vocab, first_doc=0)
+        self._assemble(chunks, vocab, terms, docs, tfs, lengths, k1, b)
+
+    # ── Construction ──────────────────────────────────────────────────────────
+    def _assemble(self, chunks, vocab, terms, docs, tfs, lengths, k1, b):
+        """Lay (term, doc, tf) triples out as CSR postings and derive the BM25 weights."""
+        order = np.lexsort((docs, terms))
+        self._set_arrays(
+            chunks, vocab, k1, b,
+            offsets=np.concatenate(([0], np.cumsum(np.bincount(terms, minlength=len(vocab))))).astype(np.int64),
+            doc_ids=docs[order].astype(np.int32),
+            tfs=tfs[order].astype(np.float32),
+            lengths=lengths.astype(np.float32),
+        )
+        self._weigh()
+
+    def _set_arrays(self, chunks, vocab, k1, b, **arrays):
+        self.chunks, self.terms = chunks, vocab
+        self.k1, self.b = k1, b
+        for name, value in arrays.items():
+            setattr(self, name, value)
+        self._local = threading.local()
+
+    def _term_of_posting(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int32), np.diff(self.offsets))
+
+    def _weigh(self):
+        """Weights for every posting from tf, df and doc lengths — vectorized, no tokenizing."""
+        n, k1, b = len(self.chunks), self.k1, self.b
+        df    = np.diff(self.offsets).astype(np.float32)
+        idf   = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(self.lengths.mean()) if n else 1.0
+        norm  = (k1 * (1 - b + b * self.lengths / avgdl)).astype(np.float32)
+        term  = self._term_of_posting()
+        tf    = self.tfs
+        self.weights = (idf[term] * tf * (k1 + 1) / (tf + norm[self.doc_ids])).astype(np.float32)
+        impact = np.lexsort((self.doc_ids, -self.weights, term))
+        self.imp_ids     = self.doc_ids[impact]
+        self.imp_weights = self.weights[impact]
+
+    def update(self, remove: Optional[Callable[[dict], bool]] = None,
+               add: Iterable[dict] = ()) -> "BM25Index":
+        """
+        New index without the chunks `remove` selects and with `add` appended.
+        Only the added chunks are tokenized; the kept postings are carried
+        over as arrays and all weights re-derived (idf and avgdl change).
+        """
+        keep = np.array([not remove(c) for c in self.chunks], dtype=bool) if remove \
+            else np.ones(len(self.chunks), dtype=bool)
+        renum = np.cumsum(keep) - 1
+        live  = keep[self.doc_ids]
+        kept  = [c for c, k in zip(self.chunks, keep) if k]
+        add   = list(add)
+
+        vocab = dict(self.terms)
+        terms, docs, tfs, lengths = _count_terms(add, vocab, first_doc=len(kept))
+        index = BM25Index.__new__(BM25Index)
+        index._assemble(
+            kept + add, vocab,
+            np.concatenate((self._term_of_posting()[live], terms)),
+            np.concatenate((renum[self.doc_ids[live]], docs)),
+            np.concatenate((self.tfs[live], tfs)),
+            np.concatenate((self.lengths[keep], lengths)),
+            self.k1, self.b,
+        )
+        return index
+
+    # ── Persistence ───────────────────────────────────────────────────────────
+    def save(self, directory: str):
+        """Write the index as .npy arrays + chunks.jsonl + meta.json into `directory`."""
+        os.makedirs(directory, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, "chunks.jsonl"), "w") as f:
+            for chunk in self.chunks:
+                f.write(json.dumps(chunk) + "\n")
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"format": 1, "k1": self.k1, "b": self.b,
+                       "vocab": sorted(self.terms, key=self.terms.get)}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "BM25Index":
+        """Open a saved index; with `mmap` the arrays are paged in from disk on demand."""
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, "chunks.jsonl")) as f:
+            chunks = [json.loads(line) for line in f]
+        index = cls.__new__(cls)
+        index._set_arrays(
+            chunks, {t: i for i, t in enumerate(meta["vocab"])}, meta["k1"], meta["b"],
+            **{name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+               for name in _ARRAYS},
+        )
+        return index
+
+    # ── Search ────────────────────────────────────────────────────────────────
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def _buffer(self) -> np.ndarray:
+        buf = getattr(self._local, "scores", None)
+        if buf is None or len(buf) != len(self.chunks):
+            buf = self._local.scores = np.zeros(len(self.chunks), dtype=np.float32)
+        return buf
+
+    def _postings(self, terms: Iterable[str]) -> List[tuple]:
+        """(doc_ids, weights, impact-ordered doc_ids, impact-ordered weights) per distinct known term."""
+        out = []
+        for term in set(terms):
+            t = self.terms.get(term)
+            if t is None:
+                continue
+            lo, hi = self.offsets[t], self.offsets[t + 1]
+            if hi > lo:                 # a term can outlive all its chunks after update()
+                out.append((self.doc_ids[lo:hi], self.weights[lo:hi],
+                            self.imp_ids[lo:hi], self.imp_weights[lo:hi]))
+        return out
+
+    def _accumulate(self, postings: list) -> Tuple[np.ndarray, np.ndarray]:
+        """Exhaustive scoring: (matched doc ids, their scores)."""
+        scores = self._buffer()
+        for docs, w, *_ in postings:    # doc ids are unique within one term's postings
+            scores[docs] += w
+        matched = np.unique(np.concatenate([p[0] for p in postings])) if len(postings) > 1 \
+            else postings[0][0]
+        found = scores[matched]
+        scores[matched] = 0.0           # leave the buffer clean for the next query
+        return matched, found
+
+    @staticmethod
+    def _probe(postings: list, cand: np.ndarray) -> np.ndarray:
+        """Full scores of the candidate docs, looked up by binary search in each postings list."""
+        found = np.zeros(len(cand), dtype=np.float32)
+        for docs, w, *_ in postings:    # postings are sorted by doc id
+            at  = np.minimum(np.searchsorted(docs, cand), len(docs) - 1)
+            hit = docs[at] == cand
+            found[hit] += w[at[hit]]
+        return found
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[float, dict]]:
+        """(score, chunk) pairs for the best `top_k` matching chunks, best first."""
+        ids, scores = self.search_ids(query, top_k)
+        return [(float(s), self.chunks[i]) for i, s in zip(ids, scores)]
+
+    def score_docs(self, query: str, ids: np.ndarray) -> np.ndarray:
+        """BM25 scores of the given chunk rows for `query` (0 where no term matches)."""
+        postings = self._postings(tokenize(query))
+        return self._probe(postings, ids) if postings else np.zeros(len(ids), dtype=np.float32)
+
+    def search_ids(self, query: str, top_k: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        """(chunk rows, scores) of the best `top_k` matching chunks, best first."""
+        postings = self._postings(tokenize(query))
+        if not postings or top_k <= 0:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+
+        matched = None
+        cand = np.unique(np.concatenate([ids[:SEED] for _, _, ids, _ in postings]))
+        if len(cand) >= top_k:
+            found = self._probe(postings, cand)
+            theta = np.partition(found, len(found) - top_k)[len(found) - top_k]
+            caps  = [float(iw[0]) for *_, iw in postings]
+            slack = sum(caps) - theta + 1e-4      # float32 rounding margin
+            # non-essential: the lowest-capped terms while their caps sum below θ
+            by_cap, low = sorted(range(len(caps)), key=caps.__getitem__), 0.0
+            while by_cap and low + caps[by_cap[0]] < theta - 1e-4:
+                low += caps[by_cap.pop(0)]
+            # per essential term: the postings with w_t ≥ cap_t − slack (lists are weight-descending)
+            cuts  = {t: np.searchsorted(-postings[t][3], slack - caps[t], side="right") for t in by_cap}
+            if sum(cuts.values()) * len(postings) < sum(len(p[0]) for p in postings):
+                matched = np.unique(np.concatenate([postings[t][2][:c] for t, c in cuts.items()]))
+                found   = self._probe(postings, matched)
+        if matched is None:
+            matched, found = self._accumulate(postings)
+
+        if len(matched) > top_k:
+            part = np.argpartition(-found, top_k - 1)[:top_k]
+            # argpartition may cut a tie at the k-th score arbitrarily; widen to all ties
+            kth  = found[part].min()
+            part = np.flatnonzero(found >= kth)
+            matched, found = matched[part], found[part]
+        order = np.lexsort((matched, -found))[:top_k]
+        return matched[order], found[order]
@@ -0,0 +1,326 @@
+"""
+MindSaathi RAG - Document Corpus
+================================
+Turns a local directory of trusted documents (.html/.htm, .md/.markdown,
+.txt) into overlapping chunks, and keeps a persisted BM25 index in step
+with it.
+
+Each file may declare where it comes from:
+  - Markdown / text: a leading front-matter block
+
+        ---
+        source: Alzheimer's Association
+        url: https://www.alz.org/alzheimers-dementia/10_signs
+        keywords: memory loss, warning signs
+        ---
+
+  - HTML: <title>, and <meta name="source" | "url" | "keywords" content="...">
+
+Without that, the source is the file name.
+
+Persisted layout (the index directory):
+
+    CURRENT             name of the live generation
+    gen-<id>/           BM25Index.save() output + manifest.json
+    gen-<id>/dense/     DenseIndex.save() output, when dense retrieval is on
+    build-<id>/         a generation still being written
+
+A new generation is written under build-<id>/ and renamed to gen-<id>/
+once complete. Publishing keeps the generation it replaces and removes
+only those published before that one, so a worker that has just loaded
+the previous generation keeps its files.
+
+sync() compares the corpus with the live generation's manifest. It
+re-chunks only the files that were added or changed, drops the chunks of
+changed or deleted files, and writes the result as a new generation. It
+then flips CURRENT with os.replace. A crash mid-sync leaves the old
+generation live.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+
+from knowledge_base.bm25 import BM25Index
+from knowledge_base.dense import DenseIndex, HashedNgramEmbedder
+
+EXTENSIONS    = {".html": "html", ".htm": "html", ".md": "markdown", ".markdown": "markdown", ".txt": "text"}
+CHUNK_WORDS   = 160     # target chunk size
+OVERLAP_WORDS = 40      # words repeated from the end of the previous chunk
+BUILTIN_DOC   = "builtin"
+
+
+# ── Reading documents ──────────────────────────────────────────────────────────
+
+class _HTMLText(HTMLParser):
+    SKIP  = {"script", "style", "nav", "header", "footer", "noscript", "svg"}
+    BLOCK = {"p", "div", "section", "article", "li", "br", "tr", "h1", "h2", "h3", "h4", "h5", "h6"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts, self.meta, self.title = [], {}, ""
+        self._skip, self._in_title = 0, False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in self.SKIP:
+            self._skip += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "meta" and attrs.get("name") in ("source", "url", "keywords"):
+            self.meta[attrs["name"]] = attrs.get("content") or ""
+        if tag in self.BLOCK:
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skip:
+            self._skip -= 1
+        elif tag == "title":
+            self._in_title = False
+        if tag in self.BLOCK:
+            self.parts.append("\n\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip:
+            self.parts.append(data)
+
+
+def _front_matter(raw: str) -> Tuple[dict, str]:
+    m = re.match(r"\A---\s*\n(.*?)\n---\s*\n", raw, re.S)
+    if not m:
+        return {}, raw
+    meta = {}
+    for line in m.group(1).splitlines():
+        key, sep, value = line.partition(":")
+        if sep:
+            meta[key.strip().lower()] = value.strip().strip("\"'")
+    return meta, raw[m.end():]
+
+
+def _markdown_text(md: str) -> str:
+    md = re.sub(r"```.*?```", " ", md, flags=re.S)                 # code blocks
+    md = re.sub(r"!\[[^\]]*\]\([^)]*\)", " ", md)                   # images
+    md = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", md)                # links → text
+    md = re.sub(r"<[^>]+>", " ", md)                                # inline HTML
+    md = re.sub(r"^\s{0,3}(#{1,6}|>|[-*+]|\d+\.)\s+", "", md, flags=re.M)
+    return re.sub(r"[*_`]", "", md)
+
+
+def read_document(path: str) -> dict:
+    """{"text", "source", "url", "keywords"} for one corpus file."""
+    kind = EXTENSIONS[os.path.splitext(path)[1].lower()]
+    with open(path, encoding="utf-8", errors="replace") as f:
+        raw = f.read()
+    if kind == "html":
+        parser = _HTMLText()
+        parser.feed(raw)
+        meta, text = dict(parser.meta), "".join(parser.parts)
+        meta.setdefault("source", parser.title.strip())
+    else:
+        meta, text = _front_matter(raw)
+        if kind == "markdown":
+            text = _markdown_text(text)
+    return {
+        "text":     text,
+        "source":   meta.get("source") or os.path.splitext(os.path.basename(path))[0],
+        "url":      meta.get("url", ""),
+        "keywords": [k.strip() for k in meta.get("keywords", "").split(",") if k.strip()],
+    }
+
+
+def chunk_text(text: str, size: int = CHUNK_WORDS, overlap: int = OVERLAP_WORDS) -> List[str]:
+    """
+    Pack whole sentences into chunks of about `size` words; each chunk after
+    the first starts with the last sentences (≥ `overlap` words) of the one before.
+    """
+    paragraphs = [" ".join(p.split()) for p in re.split(r"\n\s*\n", text)]
+    sentences  = [s for p in paragraphs if p for s in re.split(r"(?<=[.!?])\s+", p)]
+    chunks, current, words = [], [], 0
+    for sentence in sentences:
+        n = len(sentence.split())
+        if current and words + n > size:
+            chunks.append(" ".join(current))
+            carry, carried = [], 0
+            while current and carried < overlap:
+                carry.insert(0, current.pop())
+                carried += len(carry[0].split())
+            if carried >= words:          # never carry a whole chunk over
+                carry, carried = [], 0
+            current, words = carry, carried
+        current.append(sentence)
+        words += n
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def document_chunks(rel: str, doc: dict) -> List[dict]:
+    return [
+        {"id": f"{rel}#{i}", "doc": rel, "source": doc["source"], "url": doc["url"],
+         "keywords": doc["keywords"], "text": text}
+        for i, text in enumerate(chunk_text(doc["text"]))
+    ]
+
+
+def scan(corpus_dir: str) -> dict:
+    """{relative path: (mtime_ns, size)} for every supported file under corpus_dir."""
+    found = {}
+    if not os.path.isdir(corpus_dir):
+        return found
+    for root, _, files in os.walk(corpus_dir):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in EXTENSIONS:
+                path = os.path.join(root, name)
+                st   = os.stat(path)
+                found[os.path.relpath(path, corpus_dir).replace(os.sep, "/")] = (st.st_mtime_ns, st.st_size)
+    return found
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _fingerprint(chunks: List[dict]) -> str:
+    return hashlib.sha256(json.dumps(chunks, sort_keys=True).encode()).hexdigest()
+
+
+def version_of(manifest: dict) -> str:
+    """Content hash of everything indexed (built-in chunks + every file)."""
+    files = sorted((rel, f["sha256"]) for rel, f in manifest["files"].items())
+    return hashlib.sha256(json.dumps([manifest["builtin"], files]).encode()).hexdigest()[:12]
+
+
+# ── Persisted generations ─────────────────────────────────────────────────────
+
+def load_current(index_dir: str, dense: bool = False) -> Tuple[Optional[BM25Index], Optional[DenseIndex], Optional[dict]]:
+    """The live generation: (BM25 index, dense index or None, manifest), or Nones if there is none."""
+    try:
+        with open(os.path.join(index_dir, "CURRENT")) as f:
+            gen = os.path.join(index_dir, f.read().strip())
+        with open(os.path.join(gen, "manifest.json")) as f:
+            manifest = json.load(f)
+        index = BM25Index.load(gen)
+    except (OSError, ValueError, KeyError):
+        return None, None, None
+    vectors = None
+    if dense:
+        try:
+            vectors = DenseIndex.load(os.path.join(gen, "dense"), index.chunks, HashedNgramEmbedder())
+        except (OSError, ValueError, KeyError):
+            pass      # not built yet, or with other settings — sync() rebuilds it
+    return index, vectors, manifest
+
+
+def _stamp(name: str) -> Optional[int]:
+    """Publication time encoded in a generation name, or None if it is not one."""
+    try:
+        return int(name.split("-")[1], 16) if name.startswith("gen-") else None
+    except (IndexError, ValueError):
+        return None
+
+
+def _publish(index_dir: str, index: BM25Index, vectors: Optional[DenseIndex], manifest: dict) -> str:
+    # Build under a name that is never pruned, then rename it into place.
+    build = os.path.join(index_dir, f"build-{time.time_ns():x}-{os.getpid()}")
+    index.save(build)
+    if vectors is not None:
+        vectors.save(os.path.join(build, "dense"))
+    with open(os.path.join(build, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    name = f"gen-{time.time_ns():x}-{os.getpid()}"
+    gen  = os.path.join(index_dir, name)
+    os.rename(build, gen)
+    try:
+        with open(os.path.join(index_dir, "CURRENT")) as f:
+            prev = f.read().strip()
+    except OSError:
+        prev = None
+    tmp = os.path.join(index_dir, f"CURRENT.{os.getpid()}")
+    with open(tmp, "w") as f:
+        f.write(name)
+    os.replace(tmp, os.path.join(index_dir, "CURRENT"))
+    # Keep the previous generation: another worker may have just loaded it.
+    # Only generations published before it are pruned.
+    cutoff = _stamp(prev) if prev else None
+    if cutoff is not None:
+        for old in os.listdir(index_dir):
+            stamp = _stamp(old)
+            if stamp is not None and stamp < cutoff and old != name:
+                shutil.rmtree(os.path.join(index_dir, old), ignore_errors=True)
+    return gen
+
+
+def sync(corpus_dir: str, index_dir: str, builtin: List[dict],
+         dense: bool = False) -> Tuple[BM25Index, Optional[DenseIndex], dict]:
+    """
+    Bring the persisted index up to date with `corpus_dir` (+ the built-in
+    chunks) and return it memory-mapped, with a summary of what changed.
+    With `dense`, a DenseIndex over the same chunks is kept alongside.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    index, vectors, manifest = load_current(index_dir, dense)
+    old_files = manifest["files"] if manifest else {}
+
+    files, changed = {}, []
+    for rel, (mtime, size) in scan(corpus_dir).items():
+        prev = old_files.get(rel)
+        if prev and (prev["mtime_ns"], prev["size"]) == (mtime, size):
+            files[rel] = prev
+            continue
+        sha = _sha256(os.path.join(corpus_dir, rel))
+        files[rel] = {"mtime_ns": mtime, "size": size, "sha256": sha}
+        if not prev or prev["sha256"] != sha:
+            changed.append(rel)
+        else:
+            files[rel]["chunks"] = prev["chunks"]       # touched, same content
+    removed = [rel for rel in old_files if rel not in files]
+
+    builtin_fp = _fingerprint(builtin)
+    stale = set(changed) | set(removed)
+    add   = []
+    if index is None or manifest["builtin"] != builtin_fp:
+        stale.add(BUILTIN_DOC)
+        add += [{**c, "doc": BUILTIN_DOC} for c in builtin]
+    for rel in changed:
+        chunks = document_chunks(rel, read_document(os.path.join(corpus_dir, rel)))
+        files[rel]["chunks"] = len(chunks)
+        add += chunks
+
+    new_manifest = {"builtin": builtin_fp, "files": files}
+    stats = {
+        "documents": len(files),
+        "added":     len(changed),
+        "removed":   len(removed),
+        "version":   version_of(new_manifest),
+    }
+    missing_dense = dense and vectors is None
+    if index is not None and not stale and not missing_dense and new_manifest == manifest:
+        return index, vectors, dict(stats, chunks=len(index), rebuilt=False)
+
+    def drop(c: dict) -> bool:
+        return c.get("doc") in stale
+
+    if index is None:
+        index = BM25Index(add)
+    elif stale or add:
+        if vectors is not None:
+            vectors = vectors.update(remove=drop, add=add)
+        index = index.update(remove=drop, add=add)
+    if dense and (vectors is None or len(vectors) != len(index)):
+        vectors = DenseIndex(index.chunks)
+    gen   = _publish(index_dir, index, vectors if dense else None, new_manifest)
+    index = BM25Index.load(gen)
+    if dense:
+        vectors = DenseIndex.load(os.path.join(gen, "dense"), index.chunks, HashedNgramEmbedder())
+    return index, vectors, dict(stats, chunks=len(index), rebuilt=True)
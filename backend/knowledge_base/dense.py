@@ -0,0 +1,261 @@
+"""
+MindSaathi RAG - Dense Retrieval
+================================
+Local dense-vector retrieval over knowledge-base chunks. No model download
+and no network.
+
+Embedding: signed feature hashing of each term (BM25 tokenizer: stopwords
+dropped, plurals folded) plus its character 4- and 5-grams, with sublinear tf,
+L2-normalized into DENSE_DIM dimensions. The n-grams let "forgetting",
+"forgetful" and "forgetfulness" meet without a stemmer. It does not know
+synonyms. Hybrid mode (hybrid_search) covers that by fusing with BM25.
+
+Storage: one contiguous float32 matrix (chunks × DENSE_DIM), saved as .npy
+and reopened memory-mapped. Exhaustive search is a blocked matrix–vector
+product with an argpartition top-k per block. For large corpora an IVF
+coarse quantizer (spherical k-means) narrows the search to the `nprobe`
+closest lists.
+
+Like BM25Index, a DenseIndex is immutable. update() returns a new one that
+reuses the kept rows and only embeds the added chunks.
+"""
+
+import functools
+import json
+import math
+import os
+import zlib
+from collections import Counter
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from knowledge_base.bm25 import BM25Index, tokenize
+
+DENSE_DIM     = 512
+NGRAMS        = (4, 5)
+NGRAM_WEIGHT  = 0.5       # relative to the whole term
+BLOCK_ROWS    = 65_536    # rows per matrix-vector block in exhaustive search
+IVF_MIN_ROWS  = 20_000    # below this, exhaustive search is fast enough
+IVF_NPROBE    = int(os.getenv("KB_DENSE_NPROBE", "8"))    # lists scanned per query; recall vs latency
+KMEANS_ITERS  = 10
+TERM_CACHE    = int(os.getenv("KB_DENSE_TERM_CACHE", "50000"))    # memoized term features (LRU)
+
+
+# ── Embedding ─────────────────────────────────────────────────────────────────
+
+class HashedNgramEmbedder:
+    def __init__(self, dim: int = DENSE_DIM):
+        self.dim       = dim
+        # term → (bucket ids, signed weights). Bounded: queries bring arbitrary terms.
+        self._features = functools.lru_cache(maxsize=TERM_CACHE)(self._term_features)
+
+    def config(self) -> dict:
+        return {"kind": "hashed-ngram", "dim": self.dim, "ngrams": list(NGRAMS), "ngram_weight": NGRAM_WEIGHT}
+
+    def _term_features(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        padded = f"<{term}>"
+        grams  = [(term, 1.0)] + [(padded[i:i + n], NGRAM_WEIGHT)
+                                  for n in NGRAMS for i in range(len(padded) - n + 1)]
+        ids, weights = [], []
+        for gram, w in grams:
+            h = zlib.crc32(gram.encode())
+            ids.append(h % self.dim)
+            weights.append(w if h & 0x80000000 else -w)
+        return np.asarray(ids, dtype=np.int32), np.asarray(weights, dtype=np.float32)
+
+    def embed(self, text: str) -> np.ndarray:
+        counts = Counter(tokenize(text))
+        if not counts:
+            return np.zeros(self.dim, dtype=np.float32)
+        feats = [self._features(term) for term in counts]
+        scale = [1 + math.log(tf) for tf in counts.values()]
+        ids   = np.concatenate([f[0] for f in feats])
+        vals  = np.concatenate([f[1] * s for f, s in zip(feats, scale)])
+        vec   = np.bincount(ids, weights=vals, minlength=self.dim).astype(np.float32)
+        norm  = float(np.linalg.norm(vec))
+        return vec / norm if norm else vec
+
+    def embed_many(self, texts: Iterable[str]) -> np.ndarray:
+        texts = list(texts)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            out[i] = self.embed(text)
+        return out
+
+
+def chunk_text_for_embedding(chunk: dict) -> str:
+    return " ".join([chunk["text"], *chunk.get("keywords", ())])
+
+
+# ── IVF coarse quantizer ──────────────────────────────────────────────────────
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    out = np.empty(len(vectors), dtype=np.int32)
+    for lo in range(0, len(vectors), BLOCK_ROWS):
+        out[lo:lo + BLOCK_ROWS] = np.argmax(np.asarray(vectors[lo:lo + BLOCK_ROWS]) @ centroids.T, axis=1)
+    return out
+
+
+def train_ivf(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids (nlist × dim) from a sample of the rows."""
+    rng    = np.random.default_rng(seed)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), min(len(vectors), nlist * 40), replace=False))])
+    cents  = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERS):
+        assign = np.argmax(sample @ cents.T, axis=1)
+        sums   = np.zeros_like(cents)
+        np.add.at(sums, assign, sample)
+        norms  = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty  = norms[:, 0] == 0
+        cents  = np.where(empty[:, None], cents, sums / np.where(norms == 0, 1, norms))
+    return cents.astype(np.float32)
+
+
+# ── Index ─────────────────────────────────────────────────────────────────────
+
+class DenseIndex:
+    def __init__(self, chunks: Iterable[dict] = (), embedder: Optional[HashedNgramEmbedder] = None,
+                 nlist: Optional[int] = None):
+        """Embed every chunk; `nlist` IVF lists (default: √n once n ≥ IVF_MIN_ROWS, else none)."""
+        chunks   = list(chunks)
+        embedder = embedder or HashedNgramEmbedder()
+        vectors  = embedder.embed_many(chunk_text_for_embedding(c) for c in chunks)
+        if nlist is None:
+            nlist = int(math.sqrt(len(chunks))) if len(chunks) >= IVF_MIN_ROWS else 0
+        centroids = train_ivf(vectors, nlist) if nlist else None
+        self._set(chunks, embedder, vectors, centroids,
+                  _nearest(vectors, centroids) if nlist else None)
+
+    def _set(self, chunks, embedder, vectors, centroids, assign):
+        self.chunks, self.embedder, self.vectors = chunks, embedder, vectors
+        self.centroids, self.assign = centroids, assign
+        if assign is not None:
+            self.list_ids = np.argsort(assign, kind="stable").astype(np.int32)
+            self.list_offsets = np.concatenate(
+                ([0], np.cumsum(np.bincount(assign, minlength=len(centroids))))).astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def nlist(self) -> int:
+        return 0 if self.centroids is None else len(self.centroids)
+
+    def update(self, remove: Optional[Callable[[dict], bool]] = None,
+               add: Iterable[dict] = ()) -> "DenseIndex":
+        """New index without the chunks `remove` selects and with `add` appended (same order as BM25Index.update)."""
+        keep  = np.array([not remove(c) for c in self.chunks], dtype=bool) if remove \
+            else np.ones(len(self.chunks), dtype=bool)
+        add   = list(add)
+        fresh = self.embedder.embed_many(chunk_text_for_embedding(c) for c in add)
+        vectors = np.concatenate((np.asarray(self.vectors)[keep], fresh))
+        centroids, assign = self.centroids, None
+        if centroids is not None:     # new rows join the existing lists; a full rebuild re-trains
+            assign = np.concatenate((np.asarray(self.assign)[keep], _nearest(fresh, centroids)))
+        elif len(vectors) >= IVF_MIN_ROWS:
+            centroids = train_ivf(vectors, int(math.sqrt(len(vectors))))
+            assign    = _nearest(vectors, centroids)
+        index = DenseIndex.__new__(DenseIndex)
+        index._set([c for c, k in zip(self.chunks, keep) if k] + add,
+                   self.embedder, vectors, centroids, assign)
+        return index
+
+    # ── Search ────────────────────────────────────────────────────────────────
+    def scores_for(self, query_vec: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        return np.asarray(self.vectors[ids]) @ query_vec
+
+    def _candidates(self, query_vec: np.ndarray, nprobe: int) -> Optional[np.ndarray]:
+        if self.centroids is None:
+            return None
+        probe = np.argpartition(-(self.centroids @ query_vec), min(nprobe, self.nlist) - 1)[:nprobe]
+        return np.concatenate([self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe])
+
+    def search_vec(self, query_vec: np.ndarray, top_k: int = 3,
+                   nprobe: int = IVF_NPROBE) -> Tuple[np.ndarray, np.ndarray]:
+        """(row ids, cosine scores) of the best `top_k` rows, best first."""
+        cand = self._candidates(query_vec, nprobe)
+        if cand is not None:
+            ids, scores = cand, self.scores_for(query_vec, cand)
+        else:
+            ids_parts, score_parts = [], []
+            for lo in range(0, len(self.chunks), BLOCK_ROWS):
+                block = np.asarray(self.vectors[lo:lo + BLOCK_ROWS]) @ query_vec
+                k     = min(top_k, len(block))
+                best  = np.argpartition(-block, k - 1)[:k]
+                ids_parts.append(best + lo)
+                score_parts.append(block[best])
+            if not ids_parts:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            ids, scores = np.concatenate(ids_parts), np.concatenate(score_parts)
+        if len(ids) > top_k:
+            part = np.argpartition(-scores, top_k - 1)[:top_k]
+            ids, scores = ids[part], scores[part]
+        order = np.lexsort((ids, -scores))
+        return ids[order], scores[order]
+
+    def search(self, query: str, top_k: int = 3, min_score: float = 0.0) -> List[Tuple[float, dict]]:
+        """(cosine, chunk) pairs for the best `top_k` chunks scoring above `min_score`."""
+        q = self.embedder.embed(query)
+        if not q.any():
+            return []
+        ids, scores = self.search_vec(q, top_k)
+        return [(float(s), self.chunks[i]) for i, s in zip(ids, scores) if s > min_score]
+
+    # ── Persistence ───────────────────────────────────────────────────────────
+    def save(self, directory: str):
+        """vectors.npy (+ IVF centroids / assignments) and meta.json; chunks live with the BM25 index."""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "vectors.npy"), self.vectors)
+        if self.centroids is not None:
+            np.save(os.path.join(directory, "centroids.npy"), self.centroids)
+            np.save(os.path.join(directory, "assign.npy"), self.assign)
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"format": 1, "embedder": self.embedder.config(), "nlist": self.nlist}, f)
+
+    @classmethod
+    def load(cls, directory: str, chunks: List[dict], embedder: HashedNgramEmbedder) -> "DenseIndex":
+        """Reopen a saved index over `chunks` (same order as saved), vectors memory-mapped."""
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["embedder"] != embedder.config():
+            raise ValueError("dense index was built with a different embedder")
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        if len(vectors) != len(chunks):
+            raise ValueError("dense index does not match the chunk list")
+        centroids = assign = None
+        if meta["nlist"]:
+            centroids = np.load(os.path.join(directory, "centroids.npy"))
+            assign    = np.load(os.path.join(directory, "assign.npy"))
+        index = cls.__new__(cls)
+        index._set(chunks, embedder, vectors, centroids, assign)
+        return index
+
+
+# ── Hybrid ────────────────────────────────────────────────────────────────────
+
+def hybrid_search(bm25: BM25Index, dense: DenseIndex, query: str, top_k: int = 3,
+                  alpha: float = 0.5, pool: int = 20, min_score: float = 0.0) -> List[Tuple[float, dict]]:
+    """
+    Fuse keyword and dense scores: the top `pool` chunks of each retriever
+    are rescored by both, and ranked by
+
+        alpha · cosine + (1 − alpha) · bm25 / max bm25 among the pool
+
+    with cosines at or below `min_score` counted as 0. Both indexes must
+    cover the same chunks in the same order.
+    """
+    q = dense.embedder.embed(query)
+    dense_ids = dense.search_vec(q, pool)[0] if q.any() else np.zeros(0, dtype=np.int64)
+    keyword   = bm25.search_ids(query, pool)[0]
+    ids = np.union1d(dense_ids, keyword).astype(np.int64)
+    if not len(ids):
+        return []
+
+    kw    = bm25.score_docs(query, ids)
+    cos   = dense.scores_for(q, ids)
+    fused = alpha * np.where(cos > min_score, cos, 0) + (1 - alpha) * kw / max(float(kw.max()), 1e-9)
+    keep  = fused > 0
+    ids, fused = ids[keep], fused[keep]
+    order = np.lexsort((ids, -fused))[:top_k]
+    return [(float(fused[i]), bm25.chunks[ids[i]]) for i in order]
@@ -1,4 +1,4 @@
-"""
+r"""
 MindSaathi RAG - Guardrail Rules
 ================================
 NEW FILE v2.0
@@ -10,74 +10,255 @@ Blocks or redirects questions that:
   - Request interpretation as a definitive clinical result
 
 If triggered, returns a safe, empathetic redirect response.
+
+Rules live in rule packs, JSON files of the form
+
+    {"name": "memory-clinic", "version": 2,
+     "categories": [{"reason": "diagnosis_request",
+                     "safe_response": "...",          (new reasons only)
+                     "patterns": ["\\bam i getting worse\\b", ...]}]}
+
+guardrail_rules.json ships with the code. GUARDRAIL_RULE_PACKS names extra
+packs (separated by os.pathsep) that clinicians can edit without a code
+change. Their patterns join the category with the same reason, and new
+reasons rank after the built-in ones. Patterns are matched against the
+lower-cased question. They may not use named groups or backreferences.
+
+All patterns are compiled into one regex and checked in a single pass. Each
+pattern's leading literal text goes into a character trie, so at any
+position of the question the regex only tries the branches that match the
+next character. Its cost therefore barely moves as packs grow into hundreds
+of rules. A trailing empty named group tells which rule matched. When
+categories overlap, the earliest category wins, as before.
 """
 
+import json
+import os
 import re
-from typing import Dict
-
-# Patterns that indicate a diagnosis request
-DIAGNOSIS_PATTERNS = [
-    r"\bdo i have\b",
-    r"\bhave i got\b",
-    r"\bam i (suffering|diagnosed)\b",
-    r"\bis this (alzheimer|dementia|parkinson)",
-    r"\bconfirm(s)? (i have|my)\b",
-    r"\bdiagnos",
-]
-
-# Patterns that indicate medication / treatment request
-MEDICATION_PATTERNS = [
-    r"\bwhich (medicine|medication|drug|pill|tablet)\b",
-    r"\bwhat (medicine|medication|drug|should i take)\b",
-    r"\bshould i take\b",
-    r"\bdosage\b",
-    r"\bprescri(be|ption)\b",
-    r"\btreatment (plan|protocol)\b",
-    r"\bcure\b",
-]
-
-SAFE_DIAGNOSIS_RESPONSE = (
-    "MindSaathi cannot provide a diagnosis. This screening tool identifies "
-    "cognitive risk indicators for educational purposes only. "
-    "For a clinical diagnosis, please consult a qualified neurologist or physician. "
-    "You can find a specialist through your local hospital or the "
-    "Alzheimer's Association Helpline: 1-800-272-3900."
-)
-
-SAFE_MEDICATION_RESPONSE = (
-    "MindSaathi cannot provide medication or treatment advice. "
-    "Only a qualified physician or neurologist can recommend appropriate treatment. "
-    "Please consult your doctor, who can discuss evidence-based options based on "
-    "your complete medical history and clinical evaluation."
-)
+import threading
+from typing import Dict, List, Optional, Tuple
 
+from utils.logger import log_error, log_info
 
-def check_guardrails(question: str) -> dict:
+BUILTIN_RULES        = os.path.join(os.path.dirname(__file__), "guardrail_rules.json")
+GUARDRAIL_RULE_PACKS = [p for p in os.getenv("GUARDRAIL_RULE_PACKS", "").split(os.pathsep) if p]
+MAX_VARIANTS         = 32     # literal spellings of one pattern put into the trie
+
+_BOUNDARY      = r"\b"
+_META          = set(".^$*+?{}[]\\|()")
+_LITERAL_GROUP = re.compile(r"\((?:\?:)?([^.^$*+?{}\[\]\\|()]*(?:\|[^.^$*+?{}\[\]\\|()]*)*)\)(\?)?(?![*+?{])")
+
+
+# ── Compiling ─────────────────────────────────────────────────────────────────
+
+def _top_level_alternation(pattern: str) -> bool:
+    depth, i, in_class = 0, 0, False
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\":
+            i += 1
+        elif in_class:
+            in_class = ch != "]"
+        elif ch == "[":
+            in_class = True
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def _split(pattern: str) -> Tuple[bool, List[Tuple[str, str]]]:
     """
-    Check if a question violates guardrail rules.
+    (starts with \\b, [(leading literal text, rest of the pattern), ...]).
+    Groups of plain alternatives right after the literal, such as
+    "am i (suffering|diagnosed)" or "confirm(s)?", are spelled out into one
+    variant each, so they join the trie too.
+    """
+    if _top_level_alternation(pattern):
+        return False, [("", pattern)]
+    boundary = pattern.startswith(_BOUNDARY)
+    done, todo = [], [("", pattern[2:] if boundary else pattern)]
+    while todo:
+        literal, rest = todo.pop()
+        i = 0
+        while i < len(rest) and rest[i] not in _META:
+            i += 1
+        if 0 < i < len(rest) and rest[i] in "*+?{":
+            i -= 1      # the quantifier applies to the last literal character
+        literal, rest = literal + rest[:i], rest[i:]
+        m = _LITERAL_GROUP.match(rest)
+        alts = m.group(1).split("|") + [""] * bool(m.group(2)) if m else []
+        if alts and len(done) + len(todo) + len(alts) <= MAX_VARIANTS:
+            todo += [(literal + alt, rest[m.end():]) for alt in alts]
+        else:
+            done.append((literal, rest))
+    return boundary, done
 
-    Returns:
-        Dict with 'blocked' (bool), 'reason', 'safe_response'.
+
+def _trie_regex(rules: List[Tuple[str, str, str]]) -> str:
+    """One regex for (literal, rest, group) rules, branching a character at a time."""
+    root: dict = {}
+    for literal, rest, group in rules:
+        node = root
+        for ch in literal:
+            node = node.setdefault(ch, {})
+        node.setdefault("", []).append((rest, group))
+
+    def emit(node: dict) -> str:
+        alts = [f"(?:{rest})(?P<{group}>)" if rest else f"(?P<{group}>)" for rest, group in node.get("", [])]
+        alts += [re.escape(ch) + emit(child) for ch, child in node.items() if ch]
+        return alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+
+    return emit(root)
+
+
+def _combine(rules: List[Tuple[str, str]]) -> "re.Pattern":
+    """Compile (pattern, group name) pairs into a single regex."""
+    bounded, free, opaque = [], [], []
+    for pattern, group in rules:
+        boundary, variants = _split(pattern)
+        for k, (literal, rest) in enumerate(variants):
+            name = f"{group}_{k}" if k else group       # RuleSet maps "r7_2" back to "r7"
+            if not literal:
+                opaque.append(f"(?:{_BOUNDARY if boundary else ''}{rest})(?P<{name}>)")
+            else:
+                (bounded if boundary else free).append((literal, rest, name))
+    alts = ([_BOUNDARY + _trie_regex(bounded)] if bounded else []) + \
+           ([_trie_regex(free)] if free else []) + opaque
+    return re.compile("|".join(alts) if alts else r"(?!)")
+
+
+def _validate(pattern: str):
+    try:
+        compiled = re.compile(pattern)
+    except re.error as exc:
+        raise ValueError(f"bad guardrail pattern {pattern!r}: {exc}") from exc
+    if compiled.groupindex or re.search(r"\\[1-9]|\(\?P=", pattern):
+        raise ValueError(f"guardrail pattern {pattern!r} uses named groups or backreferences")
+
+
+class RuleSet:
+    """Compiled guardrail categories from one or more rule packs. Immutable."""
+
+    def __init__(self, packs: List[dict]):
+        self.categories: List[dict] = []
+        self.versions = [f"{p.get('name', '?')}@{p.get('version', '?')}" for p in packs]
+        by_reason: Dict[str, dict] = {}
+        for pack in packs:
+            for cat in pack.get("categories", []):
+                reason = cat.get("reason")
+                if not reason:
+                    raise ValueError(f"guardrail category without a reason in pack {pack.get('name', '?')!r}")
+                if reason not in by_reason:
+                    if not cat.get("safe_response"):
+                        raise ValueError(f"new guardrail category {reason!r} needs a safe_response")
+                    by_reason[reason] = {"reason": reason, "safe_response": cat["safe_response"], "patterns": []}
+                    self.categories.append(by_reason[reason])
+                for pattern in cat.get("patterns", []):
+                    _validate(pattern)
+                    by_reason[reason]["patterns"].append(pattern)
+
+        self.rule_of: Dict[str, Tuple[int, str]] = {}     # group → (category index, pattern)
+        all_rules, per_category = [], []
+        for ci, cat in enumerate(self.categories):
+            rules = []
+            for pattern in cat["patterns"]:
+                group = f"r{len(self.rule_of)}"
+                self.rule_of[group] = (ci, pattern)
+                rules.append((pattern, group))
+            all_rules += rules
+            per_category.append(rules)
+        try:
+            self.combined    = _combine(all_rules)
+            self.by_category = [_combine(rules) for rules in per_category]
+        except re.error as exc:
+            raise ValueError(f"guardrail patterns do not combine: {exc}") from exc
+
+    @property
+    def version(self) -> str:
+        return "+".join(self.versions)
+
+    def __len__(self) -> int:
+        return len(self.rule_of)
+
+    def match(self, q_lower: str) -> Optional[Tuple[dict, str]]:
+        """(category, pattern) of the first matching category, or None."""
+        m = self.combined.search(q_lower)
+        if m is None:
+            return None
+        ci, pattern = self.rule_of[m.lastgroup.partition("_")[0]]
+        # A hit is rare, so only then look for an earlier category matching elsewhere.
+        for earlier in range(ci):
+            m2 = self.by_category[earlier].search(q_lower)
+            if m2 is not None:
+                ci, pattern = self.rule_of[m2.lastgroup.partition("_")[0]]
+                break
+        return self.categories[ci], pattern
+
+
+# ── Loading ───────────────────────────────────────────────────────────────────
+
+def load_pack(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        pack = json.load(f)
+    if not isinstance(pack.get("categories"), list):
+        raise ValueError(f"{path}: a rule pack needs a 'categories' list")
+    return pack
+
+
+_rules: RuleSet = RuleSet([load_pack(BUILTIN_RULES)])
+_reload_lock    = threading.Lock()
+
+
+def reload_rules() -> dict:
     """
-    q_lower = question.lower()
+    Recompile the built-in pack plus GUARDRAIL_RULE_PACKS and swap them in.
+    Raises ValueError (keeping the current rules) if a pack is unreadable or invalid.
+    """
+    global _rules
+    with _reload_lock:
+        packs = [load_pack(BUILTIN_RULES)]
+        for path in GUARDRAIL_RULE_PACKS:
+            try:
+                packs.append(load_pack(path))
+            except (OSError, json.JSONDecodeError) as exc:
+                raise ValueError(f"cannot read guardrail pack {path}: {exc}") from exc
+        _rules = RuleSet(packs)
+    log_info(f"[guardrails] {len(_rules)} rules in {len(_rules.categories)} categories ({_rules.version})")
+    return rules_stats()
+
 
-    for pattern in DIAGNOSIS_PATTERNS:
-        if re.search(pattern, q_lower):
-            return {
-                "blocked": True,
-                "reason": "diagnosis_request",
-                "safe_response": SAFE_DIAGNOSIS_RESPONSE,
-            }
+def rules_stats() -> dict:
+    rules = _rules
+    return {"version": rules.version, "rules": len(rules), "categories": [c["reason"] for c in rules.categories]}
 
-    for pattern in MEDICATION_PATTERNS:
-        if re.search(pattern, q_lower):
-            return {
-                "blocked": True,
-                "reason": "medication_request",
-                "safe_response": SAFE_MEDICATION_RESPONSE,
-            }
 
-    return {"blocked": False, "reason": None, "safe_response": None}
+if GUARDRAIL_RULE_PACKS:
+    try:
+        reload_rules()
+    except ValueError as exc:
+        log_error(f"[guardrails] extra rule packs ignored, using built-in rules only: {exc}")
 
 
+def check_guardrails(question: str) -> dict:
+    """
+    Check if a question violates guardrail rules.
 
+    Returns:
+        Dict with 'blocked' (bool), 'reason', 'safe_response', and 'rule'
+        (the pattern that matched).
+    """
+    hit = _rules.match(question.lower())
+    if hit is None:
+        return {"blocked": False, "reason": None, "safe_response": None, "rule": None}
+    category, pattern = hit
+    return {
+        "blocked": True,
+        "reason": category["reason"],
+        "safe_response": category["safe_response"],
+        "rule": pattern,
+    }
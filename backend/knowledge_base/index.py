@@ -10,13 +10,38 @@ In production:
   - Embed documents from: NIH, WHO, Alzheimer's Association, Parkinson's Foundation
   - Use sentence-transformers for embedding + cosine similarity retrieval
 
-For now: keyword-based fallback with curated educational snippets.
-Only trusted sources are included.
+For now: BM25 keyword retrieval (knowledge_base/bm25.py) over the curated
+snippets below plus any documents in KB_CORPUS_DIR (knowledge_base/corpus.py).
+Only trusted sources are included. KB_RETRIEVAL=dense uses local hashed
+n-gram embeddings instead (knowledge_base/dense.py); KB_RETRIEVAL=hybrid
+fuses both scores.
+
+At import only the curated snippets are indexed. reload_index() (run at
+startup and by POST /api/chat/reindex) syncs the on-disk index with the
+corpus directory and swaps it in. Queries running at that moment finish on
+the old index.
 """
 
-import re
+import hashlib
+import json
+import os
+import threading
+import time
 from typing import List
 
+from knowledge_base import corpus
+from knowledge_base.bm25 import BM25Index
+from knowledge_base.dense import DenseIndex, hybrid_search
+from utils.logger import log_info
+
+_DATA_DIR     = os.path.join(os.path.dirname(__file__), "..", "data")
+KB_CORPUS_DIR = os.getenv("KB_CORPUS_DIR", os.path.join(_DATA_DIR, "kb_corpus"))
+KB_INDEX_DIR  = os.getenv("KB_INDEX_DIR", os.path.join(_DATA_DIR, "kb_index"))
+
+KB_RETRIEVAL       = os.getenv("KB_RETRIEVAL", "bm25").lower()       # bm25 | dense | hybrid
+KB_HYBRID_ALPHA    = float(os.getenv("KB_HYBRID_ALPHA", "0.5"))       # weight of the dense score
+KB_DENSE_MIN_SCORE = float(os.getenv("KB_DENSE_MIN_SCORE", "0.15"))  # cosine below this = unrelated
+
 # ── Curated knowledge base ─────────────────────────────────────────────────────
 # Source: publicly available educational content from trusted health organizations.
 # In production: replace with embedded vector store over full PDF/HTML documents.
@@ -122,12 +147,49 @@ KNOWLEDGE_BASE = [
 ]
 
 
+def _fingerprint(chunks: List[dict]) -> str:
+    return hashlib.sha256(json.dumps(chunks, sort_keys=True).encode()).hexdigest()[:12]
+
+
+KB_VERSION = _fingerprint(KNOWLEDGE_BASE)
+
+_index       = BM25Index(KNOWLEDGE_BASE)     # curated snippets until reload_index() runs
+_dense       = DenseIndex(KNOWLEDGE_BASE) if KB_RETRIEVAL != "bm25" else None
+_index_stats = {"documents": 0, "chunks": len(KNOWLEDGE_BASE), "version": KB_VERSION, "retrieval": KB_RETRIEVAL}
+_reload_lock = threading.Lock()
+
+
+def kb_version() -> str:
+    """Content hash of the knowledge base; changes whenever any chunk does."""
+    return KB_VERSION
+
+
+def reload_index() -> dict:
+    """Sync the persisted index with KB_CORPUS_DIR and swap it in. Returns what changed."""
+    global _index, _dense, _index_stats, KB_VERSION
+    with _reload_lock:
+        start = time.perf_counter()
+        index, dense, stats = corpus.sync(KB_CORPUS_DIR, KB_INDEX_DIR, KNOWLEDGE_BASE,
+                                          dense=KB_RETRIEVAL != "bm25")
+        _index, _dense, KB_VERSION = index, dense, stats["version"]
+        _index_stats = dict(stats, retrieval=KB_RETRIEVAL, seconds=round(time.perf_counter() - start, 3))
+    log_info(f"[kb] index {KB_VERSION}: {stats['chunks']} chunks from {stats['documents']} documents "
+             f"(+{stats['added']} / -{stats['removed']} files)")
+    return _index_stats
+
+
+def index_stats() -> dict:
+    return dict(_index_stats)
+
+
 def retrieve_relevant_chunks(question: str, top_k: int = 3) -> List[dict]:
     """
     Retrieve the most relevant knowledge base chunks for a question.
 
     In production: replace with vector similarity search.
-    Currently: keyword overlap scoring.
+    Currently: BM25 over chunk text + keywords (chunks sharing no term with
+    the question are never returned), or per KB_RETRIEVAL the local dense
+    index alone or fused with BM25.
 
     Args:
         question: User's natural language question.
@@ -136,16 +198,12 @@ def retrieve_relevant_chunks(question: str, top_k: int = 3) -> List[dict]:
     Returns:
         List of chunk dicts sorted by relevance.
     """
-    q_tokens = set(re.findall(r"\b\w+\b", question.lower()))
-
-    scored = []
-    for chunk in KNOWLEDGE_BASE:
-        kw_set = set(w for kw in chunk["keywords"] for w in kw.split())
-        overlap = len(q_tokens & kw_set)
-        if overlap > 0:
-            scored.append((overlap, chunk))
-
-    scored.sort(key=lambda x: -x[0])
-    return [chunk for _, chunk in scored[:top_k]]
-
-
+    index, dense = _index, _dense   # one consistent pair even if a reload swaps them meanwhile
+    if dense is not None and KB_RETRIEVAL == "dense":
+        hits = dense.search(question, top_k, min_score=KB_DENSE_MIN_SCORE)
+    elif dense is not None and KB_RETRIEVAL == "hybrid":
+        hits = hybrid_search(index, dense, question, top_k, alpha=KB_HYBRID_ALPHA,
+                             min_score=KB_DENSE_MIN_SCORE)
+    else:
+        hits = index.search(question, top_k)
+    return [chunk for _, chunk in hits]
@@ -1,13 +1,43 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from core.idempotency import idempotency_stats
+from core.security import cache_stats, session_stats, sweep_sessions
+from knowledge_base.guardrails import rules_stats
+from knowledge_base.index import index_stats, reload_index
+import rag_service
 from routers import analyze, auth, messages, content, chat, games
-from utils.logger import log_info
+from services.ai_service import risk_batcher
+from services.llm import gemini
+from storage.migrate import migrate_once
+from storage.writer import writer
+from utils.logger import log_error, log_info
+
+
+# ── Startup / shutdown ────────────────────────────────────────────────────────
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    migrate_once()   # one-shot import of legacy data/*.json into SQLite
+    writer.start()   # single-writer queue for hot append paths
+    sweeper = asyncio.create_task(sweep_sessions())   # expire idle / old sessions
+    try:
+        reload_index()   # knowledge-base corpus → persisted BM25 index (incremental)
+    except Exception as exc:
+        log_error(f"[kb] corpus index unavailable, using built-in snippets: {exc!r}")
+    yield
+    sweeper.cancel()
+    await gemini.aclose()
+    writer.stop()    # flush queued writes before exit
+
 
 app = FastAPI(
     title="MindSaathi API",
     description="Backend for MindSaathi cognitive risk assessment",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # ── CORS ──────────────────────────────────────────────────────────────────────
@@ -40,3 +70,21 @@ async def global_exception_handler(request: Request, exc: Exception):
 @app.get("/health")
 def health():
     return {"status": "ok", "service": "MindSaathi Backend"}
+
+
+# ── Metrics ───────────────────────────────────────────────────────────────────
+@app.get("/metrics")
+def metrics():
+    return {
+        "auth_cache":     cache_stats(),
+        "sessions":       session_stats(),
+        "write_queue":    writer.stats(),
+        "message_stream": messages.broker.stats(),
+        "llm":            rag_service.generator.stats(),
+        "answer_cache":   rag_service.cache_stats(),
+        "knowledge_base": index_stats(),
+        "guardrails":     rules_stats(),
+        "risk_batcher":   risk_batcher.stats(),
+        "analyze_cache":  analyze.cache_stats(),
+        "idempotency":    idempotency_stats(),
+    }
@@ -103,6 +103,17 @@ class DiseaseRiskLevels(BaseModel):
     dementia: str
     parkinsons: str
 
+# ── Batch scoring (/api/analyze/batch) ─────────────────────────────────────────
+
+ANALYZE_BATCH_MAX = 500
+
+class AnalyzeBatchItem(AnalyzeRequest):
+    patient_id: Optional[str] = None   # doctors: an approved patient whose history the result joins
+
+class AnalyzeBatchRequest(BaseModel):
+    # Raw items, validated one by one as AnalyzeBatchItem so a bad one fails alone.
+    items: List[Dict[str, Any]] = Field(min_length=1, max_length=ANALYZE_BATCH_MAX)
+
 # ── Response (V4) ──────────────────────────────────────────────────────────────
 
 class AnalyzeResponse(BaseModel):
@@ -156,3 +167,16 @@ class AnalyzeResponse(BaseModel):
     )
 
 
+class AnalyzeBatchResult(BaseModel):
+    index: int                                 # position in the request
+    ok: bool
+    saved: bool = False                        # stored in a user's history
+    duplicate: bool = False                    # already stored by an earlier identical submission
+    result: Optional[AnalyzeResponse] = None
+    error: Optional[str] = None
+
+class AnalyzeBatchResponse(BaseModel):
+    results: List[AnalyzeBatchResult]
+    scored: int
+    failed: int
+    saved: int
@@ -1,25 +1,41 @@
 """
 MindSaathi AI Service - RAG Educational Layer with Gemini
 ========================================================
-Uses Google Gemini (gemini-1.5-flash) for intelligent Q&A.
+Uses Google Gemini (gemini-1.5-flash) for intelligent Q&A through the shared
+async client in services/llm.py (deadline + circuit breaker).
 Falls back to static knowledge base if Gemini is unavailable.
 
+`generator` is the model behind NeuroBot (Gemini by default; tests and demos
+can swap in services.llm.StubGenerator). stream_educational_answer() yields
+the same answer as events for the SSE endpoint.
+
+Model answers are cached by normalized question (see _cache_key) for
+NEUROBOT_CACHE_TTL_SECONDS, and concurrent identical questions share one
+model call, streamed or not. Static fallbacks are never cached, so a
+recovered model is used again straight away.
+
 Guardrails:
   - Refuses diagnosis requests
   - Refuses medication/treatment requests
   - References trusted health organization sources only
 """
 
-import os
 import logging
-from typing import Optional
+import os
+import re
+import time
+import unicodedata
+from typing import AsyncIterator, Optional
 
 from knowledge_base.guardrails import check_guardrails
-from knowledge_base.index import retrieve_relevant_chunks
+from knowledge_base.index import kb_version, retrieve_relevant_chunks
+from services.llm import StreamInterrupted, default_generator
+from utils.cache import SingleFlight, StreamFlight, TTLCache
 
 logger = logging.getLogger(__name__)
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+NEUROBOT_CACHE_SIZE        = int(os.getenv("NEUROBOT_CACHE_SIZE", "1024"))
+NEUROBOT_CACHE_TTL_SECONDS = float(os.getenv("NEUROBOT_CACHE_TTL_SECONDS", "3600"))
 
 SYSTEM_PROMPT = """You are NeuroBot, an educational assistant for MindSaathi — a cognitive wellness screening tool.
 
@@ -46,45 +62,34 @@ MindSaathi measures 5 cognitive domains:
 - Motor Tap Test: rhythmic motor consistency, hand coordination
 """
 
+generator = default_generator()
+
 DISCLAIMER = "\n\n⚠️ *This is NOT medical advice. Always consult a qualified neurologist for clinical evaluation.*"
 
 
-def _try_gemini(question: str, context: str, user_context: Optional[dict]) -> Optional[str]:
-    """Try to get a response from Gemini. Returns None if unavailable."""
-    if not GEMINI_API_KEY:
-        return None
-    try:
-        import google.generativeai as genai
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash",
-            system_instruction=SYSTEM_PROMPT,
-        )
-
-        ctx_str = ""
-        if user_context:
-            parts = []
-            if user_context.get("user_name"):
-                parts.append(f"User: {user_context['user_name']}")
-            if user_context.get("recent_scores"):
-                parts.append(f"Recent scores: {user_context['recent_scores']}")
-            if parts:
-                ctx_str = f"\n[User context: {', '.join(parts)}]"
-
-        knowledge_str = f"\n\n[Knowledge base]:\n{context}" if context else ""
-        full_prompt = f"Question: {question}{ctx_str}{knowledge_str}"
-
-        response = model.generate_content(
-            full_prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=400,
-                temperature=0.3,
-            ),
-        )
-        return response.text.strip() if response.text else None
-    except Exception as e:
-        logger.warning(f"Gemini API call failed: {e}")
-        return None
+def _build_prompt(question: str, context: str, user_context: Optional[dict]) -> str:
+    ctx_str = ""
+    if user_context:
+        parts = []
+        if user_context.get("user_name"):
+            parts.append(f"User: {user_context['user_name']}")
+        if user_context.get("recent_scores"):
+            parts.append(f"Recent scores: {user_context['recent_scores']}")
+        if parts:
+            ctx_str = f"\n[User context: {', '.join(parts)}]"
+
+    knowledge_str = f"\n\n[Knowledge base]:\n{context}" if context else ""
+    return f"Question: {question}{ctx_str}{knowledge_str}"
+
+
+async def _try_gemini(question: str, context: str, user_context: Optional[dict]) -> Optional[str]:
+    """Try to get a response from the model. Returns None if unavailable, slow or failing."""
+    return await generator.generate(
+        SYSTEM_PROMPT,
+        _build_prompt(question, context, user_context),
+        max_tokens=400,
+        temperature=0.3,
+    )
 
 
 def _static_answer(question: str, chunks: list, user_context: Optional[dict]) -> str:
@@ -98,7 +103,126 @@ def _static_answer(question: str, chunks: list, user_context: Optional[dict]) ->
     return intro + body + outro
 
 
-def answer_educational_question(
+NO_KNOWLEDGE_ANSWER = (
+    "I don't have specific information about that in my knowledge base. "
+    "I recommend the Alzheimer's Association (alz.org), "
+    "NIH National Institute on Aging (nia.nih.gov), or a neurologist."
+)
+
+
+def _retrieve(question: str) -> tuple:
+    """(chunks, prompt context, source names) for a question."""
+    chunks = retrieve_relevant_chunks(question, top_k=3)
+    context = "\n\n".join(f"[{c['source']}]: {c['text']}" for c in chunks) if chunks else ""
+    return chunks, context, [c["source"] for c in chunks]
+
+
+def _fallback_answer(question: str, chunks: list, user_context: Optional[dict]) -> str:
+    return _static_answer(question, chunks, user_context) if chunks else NO_KNOWLEDGE_ANSWER
+
+
+def _chunk_text(text: str, size: int = 40) -> list:
+    """Split text into ~size-character pieces on word boundaries (for streaming)."""
+    pieces, start = [], 0
+    while start < len(text):
+        end = text.find(" ", start + size)
+        end = len(text) if end == -1 else end + 1
+        pieces.append(text[start:end])
+        start = end
+    return pieces
+
+
+# ── Answer cache ───────────────────────────────────────────────────────────────
+# Negations ("not", "no", "never") are deliberately kept: they change the answer.
+_STOPWORDS = frozenset("""
+    a an the is are was were be been am do does did can could should would will
+    i me my we our you your it its this that these those there what whats s
+    how why when which who please tell explain about of in on at to for with
+    and or so if just really mean means meaning
+""".split())
+
+_answer_cache = TTLCache(NEUROBOT_CACHE_SIZE, NEUROBOT_CACHE_TTL_SECONDS)
+_inflight     = SingleFlight()
+_streaming    = StreamFlight()
+_saved_seconds = 0.0
+
+
+def normalize_question(question: str) -> str:
+    """Case-, punctuation- and stopword-folded form: "What IS pause ratio?" → "pause ratio"."""
+    words = re.findall(r"\w+", unicodedata.normalize("NFKC", question).casefold())
+    kept  = [w for w in words if w not in _STOPWORDS]
+    return " ".join(kept or words)
+
+
+def _cache_key(question: str, user_context: Optional[dict]) -> tuple:
+    """
+    The personal fields that reach the prompt are part of the key, so an
+    answer written for one patient is never served to another.
+    """
+    ctx = user_context or {}
+    return (kb_version(), generator.name, normalize_question(question),
+            ctx.get("user_name") or "", str(ctx.get("recent_scores") or ""))
+
+
+def cache_stats() -> dict:
+    return {
+        **_answer_cache.stats(),
+        **{f"upstream_{k}": v for k, v in _inflight.stats().items()},
+        **{f"upstream_stream_{k}": v for k, v in _streaming.stats().items()},
+        "saved_seconds": round(_saved_seconds, 3),
+    }
+
+
+def _cache_hit(key: tuple) -> Optional[dict]:
+    global _saved_seconds
+    entry = _answer_cache.get(key)
+    if entry is None:
+        return None
+    result, cost = entry
+    _saved_seconds += cost
+    return dict(result)
+
+
+async def _model_answer(key: tuple, question: str, user_context: Optional[dict]) -> dict:
+    """Retrieval + model call for one cache miss; caches the answer if the model gave one."""
+    start = time.perf_counter()
+    chunks, context, sources = _retrieve(question)
+    model_answer = await _try_gemini(question, context, user_context)
+    answer = model_answer or _fallback_answer(question, chunks, user_context)
+
+    result = {
+        "answer": answer + DISCLAIMER,
+        "sources": sources,
+        "guardrail_triggered": False,
+        "disclaimer": DISCLAIMER,
+        "powered_by": generator.name if model_answer else "static",
+    }
+    if model_answer:
+        _answer_cache.set(key, (result, time.perf_counter() - start))
+    return result
+
+
+async def _model_stream(key: tuple, question: str, context: str, sources: list,
+                        user_context: Optional[dict]) -> AsyncIterator[str]:
+    """Model pieces for one streamed cache miss; caches the answer once the model completes it."""
+    start, pieces = time.perf_counter(), []
+    async for piece in generator.stream(
+        SYSTEM_PROMPT, _build_prompt(question, context, user_context),
+        max_tokens=400, temperature=0.3,
+    ):
+        pieces.append(piece)
+        yield piece
+    if pieces:
+        _answer_cache.set(key, ({
+            "answer": "".join(pieces).strip() + DISCLAIMER,
+            "sources": sources,
+            "guardrail_triggered": False,
+            "disclaimer": DISCLAIMER,
+            "powered_by": generator.name,
+        }, time.perf_counter() - start))
+
+
+async def answer_educational_question(
     question: str,
     user_context: Optional[dict] = None,
 ) -> dict:
@@ -111,7 +235,7 @@ def answer_educational_question(
     # ── Guardrail check ────────────────────────────────────────────────────
     guardrail_result = check_guardrails(question)
     if guardrail_result["blocked"]:
-        logger.warning(f"Guardrail triggered: {guardrail_result['reason']}")
+        logger.warning(f"Guardrail triggered: {guardrail_result['reason']} ({guardrail_result['rule']})")
         return {
             "answer": guardrail_result["safe_response"] + DISCLAIMER,
             "sources": [],
@@ -120,31 +244,65 @@ def answer_educational_question(
             "disclaimer": DISCLAIMER,
         }
 
-    # ── Retrieve relevant chunks ───────────────────────────────────────────
-    chunks = retrieve_relevant_chunks(question, top_k=3)
-    context = "\n\n".join(f"[{c['source']}]: {c['text']}" for c in chunks) if chunks else ""
-    sources = [c["source"] for c in chunks]
-
-    # ── Try Gemini first, fall back to static ─────────────────────────────
-    gemini_answer = _try_gemini(question, context, user_context)
-
-    if gemini_answer:
-        answer = gemini_answer
-    elif chunks:
-        answer = _static_answer(question, chunks, user_context)
-    else:
-        answer = (
-            "I don't have specific information about that in my knowledge base. "
-            "I recommend the Alzheimer's Association (alz.org), "
-            "NIH National Institute on Aging (nia.nih.gov), or a neurologist."
-        )
+    # ── Cached answer, else retrieve + model (one call per question) ─────
+    key = _cache_key(question, user_context)
+    cached = _cache_hit(key)
+    if cached is not None:
+        return cached
+    return dict(await _inflight.do(key, lambda: _model_answer(key, question, user_context)))
 
-    return {
-        "answer": answer + DISCLAIMER,
-        "sources": sources,
-        "guardrail_triggered": False,
-        "disclaimer": DISCLAIMER,
-        "powered_by": "gemini" if gemini_answer else "static",
-    }
 
+async def stream_educational_answer(
+    question: str,
+    user_context: Optional[dict] = None,
+) -> AsyncIterator[tuple]:
+    """
+    Same answer as answer_educational_question, as (event, data) pairs:
+
+      meta   {guardrail_triggered, sources[, reason]} — before any model call
+      token  {text} — answer pieces as the model produces them
+      done   {powered_by, disclaimer}
+
+    If the model yields nothing, the static answer is streamed instead; if it
+    fails part-way, the pieces already sent stand and the answer just ends.
+    """
+    logger.info(f"RAG stream: {question[:80]}")
+
+    guardrail_result = check_guardrails(question)
+    if guardrail_result["blocked"]:
+        logger.warning(f"Guardrail triggered: {guardrail_result['reason']} ({guardrail_result['rule']})")
+        yield "meta", {"guardrail_triggered": True, "sources": [], "reason": guardrail_result["reason"]}
+        for piece in _chunk_text(guardrail_result["safe_response"] + DISCLAIMER):
+            yield "token", {"text": piece}
+        yield "done", {"powered_by": "guardrail", "disclaimer": DISCLAIMER}
+        return
+
+    key = _cache_key(question, user_context)
+    cached = _cache_hit(key)
+    if cached is not None:
+        yield "meta", {"guardrail_triggered": False, "sources": cached["sources"]}
+        for piece in _chunk_text(cached["answer"].removesuffix(DISCLAIMER)):
+            yield "token", {"text": piece}
+        yield "token", {"text": DISCLAIMER}
+        yield "done", {"powered_by": cached["powered_by"], "disclaimer": DISCLAIMER}
+        return
+
+    chunks, context, sources = _retrieve(question)
+    yield "meta", {"guardrail_triggered": False, "sources": sources}
+
+    # Concurrent identical questions share one model stream (see StreamFlight).
+    streamed = False
+    try:
+        async for piece in _streaming.stream(
+            key, lambda: _model_stream(key, question, context, sources, user_context),
+        ):
+            streamed = True
+            yield "token", {"text": piece}
+    except StreamInterrupted:
+        pass
 
+    if not streamed:
+        for piece in _chunk_text(_fallback_answer(question, chunks, user_context)):
+            yield "token", {"text": piece}
+    yield "token", {"text": DISCLAIMER}
+    yield "done", {"powered_by": generator.name if streamed else "static", "disclaimer": DISCLAIMER}
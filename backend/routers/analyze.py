@@ -2,274 +2,417 @@
 analyze.py — MindSaathi V4
 Full pipeline: 18-feature extraction → 3-disease logistic models →
 V2 clinical layers → hybrid ML scoring → composite risk → risk_drivers →
-anomaly detection → JSON persistence.
+anomaly detection → SQLite persistence (storage/db.py).
+
+Scoring is a pure function of the payload: fallbacks for missing inputs are
+seeded from its canonical digest. Scored results are therefore cached by
+(digest, MODEL_VERSION). A submission whose digest the user already has
+in history from the last ANALYZE_DEDUP_SECONDS is treated as a client
+retry. It gets the stored result's response and is not saved again.
 """
 
-import json, os, math
-from datetime import datetime
-from fastapi import APIRouter, HTTPException, Header
-from typing import Optional
+import math
+import os
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+
+import numpy as np
 
-from models.schemas import AnalyzeRequest, AnalyzeResponse, DiseaseRiskLevels
+from models.schemas import (
+    AnalyzeBatchItem, AnalyzeBatchRequest, AnalyzeBatchResponse, AnalyzeBatchResult,
+    AnalyzeRequest, AnalyzeResponse, DiseaseRiskLevels,
+)
 from services.ai_service import (
     extract_speech_features, extract_memory_features,
     extract_reaction_features, extract_executive_features,
-    extract_motor_features, compute_disease_risks,
-    build_feature_vector, _prob_to_level,
+    extract_motor_features, score_disease_risks, compute_disease_risks_batch,
+    build_feature_vector, feature_list, _prob_to_level, MODEL_VERSION,
+    payload_digest, payload_rng,
+    DOMAINS, _compute_composite_risk, _compute_risk_drivers,
 )
 from core.clinical_config import (
     apply_condition_multipliers, compute_confidence_score,
     get_education_correction, FATIGUE_CONFIDENCE_THRESHOLD,
-    SAFE_OUTPUT_LANGUAGE, DOMAIN_WEIGHTS,
+    SAFE_OUTPUT_LANGUAGE,
 )
 from core.ml_engine import (
     compute_hybrid_risk, compute_confidence_interval,
     analyze_all_progress_anomalies, compute_feature_importance,
 )
-from core.progress_tracker import build_progress_summary
-from utils.logger import log_info
+from core import idempotency
+from core.progress_tracker import progress_summary_from_state
+from core.security import current_user, optional_user
+from storage import db
+from storage.writer import writer
+from utils.cache import TTLCache
+from utils.logger import log_info, log_warning
 
 router = APIRouter()
 DISCLAIMER = SAFE_OUTPUT_LANGUAGE["disclaimer"]
 
-DATA_DIR      = os.path.join(os.path.dirname(__file__), "..", "data")
-RESULTS_FILE  = os.path.join(DATA_DIR, "results.json")
-SESSIONS_FILE = os.path.join(DATA_DIR, "sessions.json")
-USERS_FILE    = os.path.join(DATA_DIR, "users.json")
-os.makedirs(DATA_DIR, exist_ok=True)
+RESULTS_KEEP = 20   # assessment history kept per user
 
+ANALYZE_CACHE_SIZE        = int(os.getenv("ANALYZE_CACHE_SIZE", "4096"))
+ANALYZE_CACHE_TTL_SECONDS = float(os.getenv("ANALYZE_CACHE_TTL_SECONDS", "3600"))
+ANALYZE_DEDUP_SECONDS     = float(os.getenv("ANALYZE_DEDUP_SECONDS", "600"))   # 0 = off
 
-def _load(path):
-    if not os.path.exists(path): return {}
-    with open(path) as f:
-        try: return json.load(f)
-        except: return {}
+# Simulated — for ValidationPanel
+MODEL_VALIDATION = {
+    "sensitivity": 0.82,
+    "specificity": 0.78,
+    "auc":         0.85,
+    "note":        "Simulated validation due to absence of clinical dataset.",
+}
 
-def _save(path, data):
-    with open(path, "w") as f: json.dump(data, f, indent=2)
+# (payload digest, MODEL_VERSION) → (result record, AnalyzeResponse fields)
+_result_cache = TTLCache(ANALYZE_CACHE_SIZE, ANALYZE_CACHE_TTL_SECONDS)
 
-def _user_from_token(token: str) -> Optional[dict]:
-    sessions = _load(SESSIONS_FILE)
-    session  = sessions.get(token)
-    if not session: return None
-    users = _load(USERS_FILE)
-    return users.get(session["user_id"])
 
+def cache_stats() -> dict:
+    return _result_cache.stats()
 
-def _compute_composite_risk(
-    speech: float, memory: float, reaction: float,
-    executive: float, motor: float,
-) -> float:
-    """
-    Composite risk score (0–100, higher = more risk).
-    Inverts domain scores (higher domain score = healthier = lower risk).
-    Uses DOMAIN_WEIGHTS for weighted average.
-    """
-    w = DOMAIN_WEIGHTS
-    risk = (
-        w["speech"]    * (100 - speech)
-        + w["memory"]    * (100 - memory)
-        + w["reaction"]  * (100 - reaction)
-        + w["executive"] * (100 - executive)
-        + w["motor"]     * (100 - motor)
-    )
-    return round(max(0.0, min(100.0, risk)), 2)
 
+# ── Pipeline stages (shared by /analyze and /analyze/batch) ─────────────────────
 
-def _compute_risk_drivers(
-    speech: float, memory: float, reaction: float,
-    executive: float, motor: float,
-) -> dict:
-    """
-    Risk contribution of each domain as percentage of total composite risk.
-    Used by RiskDriversPanel on the frontend.
-    """
-    w = DOMAIN_WEIGHTS
-    contributions = {
-        "speech":    w["speech"]    * (100 - speech),
-        "memory":    w["memory"]    * (100 - memory),
-        "reaction":  w["reaction"]  * (100 - reaction),
-        "executive": w["executive"] * (100 - executive),
-        "motor":     w["motor"]     * (100 - motor),
-    }
-    total = sum(contributions.values()) or 1.0
-    pcts = {k: round((v / total) * 100) for k, v in contributions.items()}
+def _extract(payload: AnalyzeRequest, digest: str) -> dict:
+    """Feature extraction for one assessment: domain scores, feature vector, attention variability."""
+    rng = payload_rng(digest)
+    speech_score,  sf  = extract_speech_features(payload.speech_audio or None, payload.speech)
+    memory_score,  mf  = extract_memory_features(payload.memory_results, payload.memory, rng)
+    reaction_score, rf = extract_reaction_features(payload.reaction_times, payload.reaction)
+    exec_score,    ef  = extract_executive_features(payload.stroop, rng)
+    motor_score,   mof = extract_motor_features(payload.tap, rng)
 
-    # Map to frontend field names expected by RiskDriversPanel
+    mean_rt = rf.get("mean_rt", 1)
+    std_rt  = rf.get("std_rt", 0)
     return {
-        "memory_recall_contribution_pct":      pcts["memory"],
-        "executive_function_contribution_pct": pcts["executive"],
-        "speech_delay_contribution_pct":       pcts["speech"],
-        "reaction_time_contribution_pct":      pcts["reaction"],
-        "motor_consistency_contribution_pct":  pcts["motor"],
+        "scores": [speech_score, memory_score, reaction_score, exec_score, motor_score],
+        "fv":     build_feature_vector(sf, mf, rf, ef, mof),
+        "avi":    round(std_rt / mean_rt, 4) if mean_rt > 0 else 0.0,
+        "digest": digest,
     }
 
 
+def _assemble(payloads: List[AnalyzeRequest], extracted: List[dict], risks: List[dict]) -> List[tuple]:
+    """
+    Clinical layers, composite risk, drivers and explainability for scored
+    assessments. Composite risk and drivers are computed over all of them
+    at once. Returns (result record, AnalyzeResponse fields) per assessment.
+    """
+    clinical = []
+    for payload, ex, r in zip(payloads, extracted, risks):
+        conditions_dict = payload.conditions.model_dump() if payload.conditions else {}
+        fatigue_dict    = payload.fatigue.model_dump()    if payload.fatigue    else {}
+
+        alz_risk_adj  = apply_condition_multipliers(r["alzheimers_risk"], conditions_dict)
+        dem_risk_adj  = apply_condition_multipliers(r["dementia_risk"],   conditions_dict)
+        park_risk_adj = apply_condition_multipliers(r["parkinsons_risk"], conditions_dict)
+
+        scores = list(ex["scores"])
+        if payload.profile and payload.profile.education_level:
+            edu_corr  = get_education_correction(payload.profile.education_level)
+            scores[1] = max(0.0, min(100.0, scores[1] + edu_corr * 100))
+
+        confidence  = compute_confidence_score(0.0, fatigue_dict)
+        hybrid_risk = compute_hybrid_risk(alz_risk_adj, r["alzheimers_risk"])
+        # What services/rescoring.py needs to score this result again under a new model
+        model_inputs = {
+            "features":   feature_list(ex["fv"]),
+            "profile":    payload.profile.model_dump(exclude_none=True) if payload.profile else None,
+            "conditions": [name for name, present in conditions_dict.items() if present],
+        }
+        clinical.append((scores, (alz_risk_adj, dem_risk_adj, park_risk_adj), confidence, hybrid_risk, model_inputs))
+
+    # ── Composite risk score + risk drivers, one row per assessment ──────────
+    domains    = np.array([c[0] for c in clinical], dtype=float).reshape(-1, len(DOMAINS))
+    composites = _compute_composite_risk(domains)
+    drivers    = _compute_risk_drivers(domains)
+
+    out = []
+    for ex, (scores, adj, confidence, hybrid_risk, model_inputs), composite_risk, risk_drivers in \
+            zip(extracted, clinical, composites, drivers):
+        speech_score, memory_score, reaction_score, exec_score, motor_score = scores
+        alz_risk_adj, dem_risk_adj, park_risk_adj = adj
+        ci     = compute_confidence_interval(hybrid_risk)
+        levels = {
+            "alzheimers": _prob_to_level(alz_risk_adj),
+            "dementia":   _prob_to_level(dem_risk_adj),
+            "parkinsons": _prob_to_level(park_risk_adj),
+        }
+        result_data = {
+            "timestamp":            datetime.utcnow().isoformat(),
+            "createdAt":            datetime.utcnow().isoformat(),  # for ProgressPage
+            "speech_score":         speech_score,
+            "memory_score":         memory_score,
+            "reaction_score":       reaction_score,
+            "executive_score":      exec_score,
+            "motor_score":          motor_score,
+            "alzheimers_risk":      alz_risk_adj,
+            "dementia_risk":        dem_risk_adj,
+            "parkinsons_risk":      park_risk_adj,
+            "composite_risk_score": composite_risk,
+            "hybrid_risk":          hybrid_risk,
+            "confidence":           confidence,
+            "risk_levels":          levels,
+            "attention_variability_index": ex["avi"],
+            "disclaimer": DISCLAIMER,
+            **model_inputs,
+            "model_version":        MODEL_VERSION,
+            "payload_hash":         ex["digest"],
+        }
+        fields = dict(
+            speech_score=speech_score,
+            memory_score=memory_score,
+            reaction_score=reaction_score,
+            executive_score=exec_score,
+            motor_score=motor_score,
+            alzheimers_risk=alz_risk_adj,
+            dementia_risk=dem_risk_adj,
+            parkinsons_risk=park_risk_adj,
+            risk_levels=DiseaseRiskLevels(**levels),
+            composite_risk_score=composite_risk,
+            hybrid_risk=hybrid_risk,
+            confidence=confidence,
+            recommend_retest=confidence < FATIGUE_CONFIDENCE_THRESHOLD,
+            ci_lower=ci["ci_lower"],
+            ci_upper=ci["ci_upper"],
+            ci_label=ci["ci_label"],
+            logistic_risk_probability=alz_risk_adj,    # primary risk signal
+            confidence_interval_label=ci["ci_label"],
+            risk_drivers=risk_drivers,
+            feature_importance=compute_feature_importance(ex["fv"].model_dump(), disease="alzheimers"),
+            model_validation=MODEL_VALIDATION,
+            feature_vector=ex["fv"],
+            attention_variability_index=ex["avi"],
+            disclaimer=DISCLAIMER,
+        )
+        out.append((result_data, fields))
+    return out
+
+
+def _stamped(scored: tuple) -> tuple:
+    """A cached (result record, fields) pair with the record timestamped now."""
+    result_data, fields = scored
+    now = datetime.utcnow().isoformat()
+    return {**result_data, "timestamp": now, "createdAt": now}, fields
+
+
+def _dedup_since() -> Optional[str]:
+    if ANALYZE_DEDUP_SECONDS <= 0:
+        return None
+    return (datetime.utcnow() - timedelta(seconds=ANALYZE_DEDUP_SECONDS)).isoformat()
+
+
+def _retry_of(history: List[dict], digest: str) -> Optional[int]:
+    """Index of a stored result for the same payload within ANALYZE_DEDUP_SECONDS, if any."""
+    since = _dedup_since()
+    if since is None:
+        return None
+    for i in range(len(history) - 1, -1, -1):
+        if history[i].get("timestamp", "") < since:
+            break                               # history is oldest first
+        if history[i].get("payload_hash") == digest:
+            return i
+    return None
+
+
+def _respond(fields: dict, anomaly_result: dict) -> AnalyzeResponse:
+    return AnalyzeResponse(
+        **fields,
+        anomaly_alert=anomaly_result["overall_alert"],
+        anomaly_details=anomaly_result["metrics"] if anomaly_result["overall_alert"] != "none" else None,
+    )
+
+
 @router.post("/analyze", response_model=AnalyzeResponse)
 async def analyze(
     payload: AnalyzeRequest,
-    authorization: Optional[str] = Header(default=None),
+    response: Response,
+    user: Optional[dict] = Depends(optional_user),
+    idempotency_key: Optional[str] = Header(default=None),
 ):
     log_info(f"[/api/analyze] submitting full pipeline")
 
-    try:
-        speech_score,  sf  = extract_speech_features(payload.speech_audio or None, payload.speech)
-        memory_score,  mf  = extract_memory_features(payload.memory_results, payload.memory)
-        reaction_score, rf = extract_reaction_features(payload.reaction_times, payload.reaction)
-        exec_score,    ef  = extract_executive_features(payload.stroop)
-        motor_score,   mof = extract_motor_features(payload.tap)
-
-        fv    = build_feature_vector(sf, mf, rf, ef, mof)
-        risks = compute_disease_risks(fv, payload.profile)
-
-        alz_risk  = risks["alzheimers_risk"]
-        dem_risk  = risks["dementia_risk"]
-        park_risk = risks["parkinsons_risk"]
-
-        mean_rt = rf.get("mean_rt", 1)
-        std_rt  = rf.get("std_rt", 0)
-        avi     = round(std_rt / mean_rt, 4) if mean_rt > 0 else 0.0
-
-    except Exception as exc:
-        raise HTTPException(status_code=422, detail=f"Processing error: {exc}")
-
-    # ── Clinical layers ────────────────────────────────────────────────────────
-    conditions_dict = payload.conditions.model_dump() if payload.conditions else {}
-    fatigue_dict    = payload.fatigue.model_dump()    if payload.fatigue    else {}
-
-    alz_risk_adj  = apply_condition_multipliers(alz_risk,  conditions_dict)
-    dem_risk_adj  = apply_condition_multipliers(dem_risk,  conditions_dict)
-    park_risk_adj = apply_condition_multipliers(park_risk, conditions_dict)
-
-    if payload.profile and payload.profile.education_level:
-        edu_corr     = get_education_correction(payload.profile.education_level)
-        memory_score = max(0.0, min(100.0, memory_score + edu_corr * 100))
-
-    confidence       = compute_confidence_score(0.0, fatigue_dict)
-    recommend_retest = confidence < FATIGUE_CONFIDENCE_THRESHOLD
-
-    # ── Hybrid risk + CI ───────────────────────────────────────────────────────
-    hybrid_risk = compute_hybrid_risk(alz_risk_adj, alz_risk)
-    ci          = compute_confidence_interval(hybrid_risk)
-
-    # ── Composite risk score (for ProgressPage wellness display) ──────────────
-    composite_risk = _compute_composite_risk(
-        speech_score, memory_score, reaction_score, exec_score, motor_score
+    digest = payload_digest(payload)
+    result, replayed = await idempotency.acall(
+        idempotency.scoped_key("analyze", user, idempotency_key), digest,
+        lambda: _analyze(payload, digest, user),
     )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
-    # ── Risk drivers (for RiskDriversPanel explainability) ────────────────────
-    risk_drivers = _compute_risk_drivers(
-        speech_score, memory_score, reaction_score, exec_score, motor_score
-    )
 
-    # ── Feature importance ─────────────────────────────────────────────────────
-    fv_dict            = fv.model_dump()
-    feature_importance = compute_feature_importance(fv_dict, disease="alzheimers")
+async def _analyze(payload: AnalyzeRequest, digest: str, user: Optional[dict]) -> AnalyzeResponse:
+    scored = _result_cache.get((digest, MODEL_VERSION))
+    if scored is None:
+        try:
+            ex    = _extract(payload, digest)
+            risks = await score_disease_risks(ex["fv"], payload.profile)
+        except Exception as exc:
+            raise HTTPException(status_code=422, detail=f"Processing error: {exc}")
+        [scored] = _assemble([payload], [ex], [risks])
+        _result_cache.set((digest, MODEL_VERSION), scored)
 
-    # ── Model validation (simulated — for ValidationPanel) ────────────────────
-    model_validation = {
-        "sensitivity": 0.82,
-        "specificity": 0.78,
-        "auc":         0.85,
-        "note":        "Simulated validation due to absence of clinical dataset.",
-    }
-
-    # ── Build result record ────────────────────────────────────────────────────
-    result_data = {
-        "timestamp":            datetime.utcnow().isoformat(),
-        "createdAt":            datetime.utcnow().isoformat(),  # for ProgressPage
-        "speech_score":         speech_score,
-        "memory_score":         memory_score,
-        "reaction_score":       reaction_score,
-        "executive_score":      exec_score,
-        "motor_score":          motor_score,
-        "alzheimers_risk":      alz_risk_adj,
-        "dementia_risk":        dem_risk_adj,
-        "parkinsons_risk":      park_risk_adj,
-        "composite_risk_score": composite_risk,
-        "hybrid_risk":          hybrid_risk,
-        "confidence":           confidence,
-        "risk_levels": {
-            "alzheimers": _prob_to_level(alz_risk_adj),
-            "dementia":   _prob_to_level(dem_risk_adj),
-            "parkinsons": _prob_to_level(park_risk_adj),
-        },
-        "attention_variability_index": avi,
-        "disclaimer": DISCLAIMER,
-    }
+    result_data, fields = _stamped(scored)
 
     # ── Anomaly detection + save ───────────────────────────────────────────────
     anomaly_result = {"overall_alert": "none", "metrics": {}}
 
-    if authorization:
-        token = authorization.replace("Bearer ", "").strip()
-        user  = _user_from_token(token)
-        if user:
-            results = _load(RESULTS_FILE)
-            uid     = user["id"]
-            history = results.get(uid, [])
-            anomaly_result = analyze_all_progress_anomalies(history, result_data)
-            history.append(result_data)
-            results[uid] = history[-20:]
-            _save(RESULTS_FILE, results)
-
-    return AnalyzeResponse(
-        speech_score=speech_score,
-        memory_score=memory_score,
-        reaction_score=reaction_score,
-        executive_score=exec_score,
-        motor_score=motor_score,
-        alzheimers_risk=alz_risk_adj,
-        dementia_risk=dem_risk_adj,
-        parkinsons_risk=park_risk_adj,
-        risk_levels=DiseaseRiskLevels(
-            alzheimers=_prob_to_level(alz_risk_adj),
-            dementia=_prob_to_level(dem_risk_adj),
-            parkinsons=_prob_to_level(park_risk_adj),
-        ),
-        composite_risk_score=composite_risk,
-        hybrid_risk=hybrid_risk,
-        confidence=confidence,
-        recommend_retest=recommend_retest,
-        ci_lower=ci["ci_lower"],
-        ci_upper=ci["ci_upper"],
-        ci_label=ci["ci_label"],
-        logistic_risk_probability=alz_risk_adj,    # primary risk signal
-        confidence_interval_label=ci["ci_label"],
-        anomaly_alert=anomaly_result["overall_alert"],
-        anomaly_details=anomaly_result["metrics"] if anomaly_result["overall_alert"] != "none" else None,
-        risk_drivers=risk_drivers,
-        feature_importance=feature_importance,
-        model_validation=model_validation,
-        feature_vector=fv,
-        attention_variability_index=avi,
-        disclaimer=DISCLAIMER,
+    if user:
+        uid     = user["id"]
+        history = await run_in_threadpool(db.get_results, uid)   # keep SQLite reads off the event loop
+        prior   = _retry_of(history, digest)
+        if prior is not None:
+            log_info(f"[/api/analyze] retried submission for {uid}, already stored")
+            return _respond(fields, analyze_all_progress_anomalies(history[:prior], history[prior]))
+        anomaly_result = analyze_all_progress_anomalies(history, result_data)
+        await writer.run_async(db.append_result, uid, result_data, keep=RESULTS_KEEP,
+                               dedup_since=_dedup_since())
+
+    return _respond(fields, anomaly_result)
+
+
+def _batch_owner(item: AnalyzeBatchItem, user: Optional[dict]) -> Optional[str]:
+    """Whose history a batch item joins: its patient_id (doctors, approved patients) or the caller."""
+    if item.patient_id is None or (user and item.patient_id == user["id"]):
+        return user["id"] if user else None
+    if not user or user.get("role") != "doctor":
+        raise PermissionError("Only doctors can submit assessments for a patient_id.")
+    if item.patient_id not in user.get("patient_list", []):
+        raise PermissionError(f"Patient {item.patient_id} is not enrolled with you.")
+    return item.patient_id
+
+
+@router.post("/analyze/batch", response_model=AnalyzeBatchResponse)
+async def analyze_batch(
+    payload: AnalyzeBatchRequest,
+    user: Optional[dict] = Depends(optional_user),
+):
+    """
+    Score many assessments in one request. Items are validated one by one,
+    so a bad item is reported in its own slot and the rest still go
+    through. Disease risks for the items not already cached come from one
+    matrix product; if that fails, they are scored one at a time and an
+    item that still fails gets the error in its slot. Results are stored
+    in a single write, in submission order. An item its owner already has
+    stored (a retried batch, or a repeat within this one) is marked
+    `duplicate` and not stored again.
+    """
+    log_info(f"[/api/analyze/batch] {len(payload.items)} assessments")
+    slots: List[AnalyzeBatchResult] = [AnalyzeBatchResult(index=i, ok=False) for i in range(len(payload.items))]
+
+    ok, items, owners, digests, scored = [], [], [], [], []
+    misses, extracted = [], []          # positions in `ok` not in the cache, and their features
+    for i, raw in enumerate(payload.items):
+        try:
+            item   = AnalyzeBatchItem.model_validate(raw)
+            owner  = _batch_owner(item, user)
+            digest = payload_digest(item)
+            cached = _result_cache.get((digest, MODEL_VERSION))
+            ex     = _extract(item, digest) if cached is None else None
+        except ValidationError as exc:
+            err = exc.errors()[0]
+            slots[i].error = f"Invalid assessment at {'.'.join(map(str, err['loc'])) or 'item'}: {err['msg']}"
+            continue
+        except PermissionError as exc:
+            slots[i].error = str(exc)
+            continue
+        except Exception as exc:
+            slots[i].error = f"Processing error: {exc}"
+            continue
+        ok.append(i)
+        items.append(item)
+        owners.append(owner)
+        digests.append(digest)
+        scored.append(cached)
+        if cached is None:
+            misses.append(len(ok) - 1)
+            extracted.append(ex)
+
+    miss_items = [items[k] for k in misses]
+    try:
+        risks = compute_disease_risks_batch([(ex["fv"], it.profile) for ex, it in zip(extracted, miss_items)])
+        fresh = list(zip(misses, _assemble(miss_items, extracted, risks)))
+    except Exception as exc:
+        # One bad item fails the whole product; score the misses one by one to isolate it.
+        log_warning(f"[/api/analyze/batch] batched scoring failed ({exc!r}), scoring items one at a time")
+        fresh = []
+        for k, ex, it in zip(misses, extracted, miss_items):
+            try:
+                [pair] = _assemble([it], [ex], compute_disease_risks_batch([(ex["fv"], it.profile)]))
+            except Exception as item_exc:
+                slots[ok[k]].error = f"Processing error: {item_exc}"
+                continue
+            fresh.append((k, pair))
+    for k, pair in fresh:
+        _result_cache.set((digests[k], MODEL_VERSION), pair)
+        scored[k] = pair
+    keep = [k for k, pair in enumerate(scored) if pair is not None]
+    ok, owners, digests, scored = ([xs[k] for k in keep] for xs in (ok, owners, digests, scored))
+
+    # ── Anomaly detection against each owner's history, batch items included ──
+    histories = await run_in_threadpool(
+        lambda: {owner: db.get_results(owner) for owner in dict.fromkeys(filter(None, owners))}
+    )
+    rows, row_slots = [], []
+    for i, owner, digest, pair in zip(ok, owners, digests, scored):
+        result_data, fields = _stamped(pair)
+        anomaly_result = {"overall_alert": "none", "metrics": {}}
+        if owner:
+            history = histories[owner]
+            prior   = _retry_of(history, digest)
+            if prior is not None:
+                anomaly_result = analyze_all_progress_anomalies(history[:prior][-RESULTS_KEEP:], history[prior])
+                slots[i].duplicate = True
+            else:
+                anomaly_result = analyze_all_progress_anomalies(history[-RESULTS_KEEP:], result_data)
+                history.append(result_data)
+                rows.append((owner, result_data))
+                row_slots.append(i)
+        slots[i].ok, slots[i].result = True, _respond(fields, anomaly_result)
+
+    # `saved` is what the write stored: dedup_since can still drop a row whose
+    # retry was stored after the histories above were read.
+    if rows:
+        appended = await writer.run_async(db.append_results, rows, keep=RESULTS_KEEP, dedup_since=_dedup_since())
+        for i, stored in zip(row_slots, appended):
+            slots[i].saved = stored
+
+    return AnalyzeBatchResponse(
+        results=slots,
+        scored=len(ok),
+        failed=len(slots) - len(ok),
+        saved=sum(s.saved for s in slots),
     )
 
 
 @router.get("/results/my")
-def get_my_results(authorization: str = Header(...)):
-    token = authorization.replace("Bearer ", "").strip()
-    user  = _user_from_token(token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Unauthorized.")
-    results      = _load(RESULTS_FILE)
-    user_results = results.get(user["id"], [])
-    progress     = build_progress_summary(user_results)
-    return {"results": user_results, "progress": progress}
+def get_my_results(
+    user: dict = Depends(current_user),
+    limit: int = Query(RESULTS_KEEP, ge=1, le=RESULTS_KEEP),
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+):
+    """
+    The caller's results, oldest first, one page at a time (`seq` cursors:
+    ?before= for older, ?after= for newer). `progress` always covers the
+    whole retained history.
+    """
+    page, has_more = db.results_page(user["id"], before, after, limit)
+    progress       = progress_summary_from_state(db.get_progress_state(user["id"]))
+    return {"results": page, "progress": progress, "has_more": has_more}
 
 
 @router.get("/results/patient/{patient_id}")
-def get_patient_results(patient_id: str, authorization: str = Header(...)):
-    token = authorization.replace("Bearer ", "").strip()
-    user  = _user_from_token(token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Unauthorized.")
+def get_patient_results(patient_id: str, user: dict = Depends(current_user)):
     if user.get("role", "patient") != "doctor":
         raise HTTPException(status_code=403, detail="Doctors only.")
-    results         = _load(RESULTS_FILE)
-    patient_results = results.get(patient_id, [])
-    progress        = build_progress_summary(patient_results)
+    patient_results = db.get_results(patient_id)
+    progress        = progress_summary_from_state(db.get_progress_state(patient_id))
     return {"results": patient_results, "progress": progress}
 
 
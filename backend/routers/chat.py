@@ -1,19 +1,29 @@
 """
 MindSaathi Backend - Chat/RAG Router
 ====================================
-POST /api/chat — Educational chatbot backed by the local RAG pipeline.
+POST /api/chat        — Educational chatbot backed by the local RAG pipeline.
+POST /api/chat/stream — Same answer as Server-Sent Events: guardrail decision
+                        and sources first, then the answer as it is generated.
+POST /api/chat/reindex — (doctors) pick up added / changed / removed documents
+                        in the knowledge-base corpus directory and edited
+                        guardrail rule packs, no restart.
 
 The RAG logic (guardrails + knowledge base retrieval) now lives directly
 in the backend (rag_service.py + knowledge_base/) so no separate
 ai-service process is required.
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 
-from rag_service import answer_educational_question
+from core.security import current_user
+from knowledge_base.guardrails import reload_rules
+from knowledge_base.index import reload_index
+from rag_service import answer_educational_question, stream_educational_answer
 from utils.logger import log_info
+from utils.sse import SSE_HEADERS, sse_event
 
 router = APIRouter()
 
@@ -48,7 +58,7 @@ async def chat(payload: ChatRequest):
     """
     log_info(f"[/api/chat] question={payload.question[:60]}")
 
-    result = answer_educational_question(payload.question, payload.user_context)
+    result = await answer_educational_question(payload.question, payload.user_context)
 
     return ChatResponse(
         answer=result["answer"],
@@ -58,3 +68,32 @@ async def chat(payload: ChatRequest):
     )
 
 
+@router.post("/chat/stream")
+async def chat_stream(payload: ChatRequest):
+    """
+    Streaming variant of /chat (text/event-stream). Events, in order:
+
+      meta   {guardrail_triggered, sources[, reason]}
+      token  {text}            — repeated; concatenate for the full answer
+      done   {powered_by, disclaimer}
+    """
+    log_info(f"[/api/chat/stream] question={payload.question[:60]}")
+
+    async def events():
+        async for event, data in stream_educational_answer(payload.question, payload.user_context):
+            yield sse_event(event, data)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.post("/chat/reindex")
+def chat_reindex(user: dict = Depends(current_user)):
+    """Sync the knowledge-base index with its corpus directory, reload guardrail packs, hot-swap both in."""
+    if user.get("role") != "doctor":
+        raise HTTPException(status_code=403, detail="Only doctors can reindex the knowledge base.")
+    log_info(f"[/api/chat/reindex] by {user['id']}")
+    try:
+        guardrails = reload_rules()
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Guardrail rule packs not reloaded: {exc}")
+    return {**reload_index(), "guardrails": guardrails}
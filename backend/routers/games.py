@@ -11,27 +11,25 @@ Endpoints:
   GET  /api/games/leaderboard        - Top scores per game (optional auth)
 """
 
-import json
-import os
 import uuid
 import math
 import statistics
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from pydantic import BaseModel, Field
 
+from core import idempotency
+from core.security import current_user, optional_user
+from storage import db
+from storage.writer import writer
 from utils.logger import log_info
 
 router = APIRouter(prefix="/games", tags=["games"])
 
 # ── Data persistence ──────────────────────────────────────────────────────────
-DATA_DIR        = os.path.join(os.path.dirname(__file__), "..", "data")
-GAME_RESULTS_FILE = os.path.join(DATA_DIR, "game_results.json")
-SESSIONS_FILE   = os.path.join(DATA_DIR, "sessions.json")
-USERS_FILE      = os.path.join(DATA_DIR, "users.json")
-os.makedirs(DATA_DIR, exist_ok=True)
+GAME_HISTORY_KEEP = 100   # game sessions kept per user
 
 
 # ── Game catalog (mirrors frontend gamesCatalog.js) ───────────────────────────
@@ -254,30 +252,6 @@ class GameSessionResult(BaseModel):
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
-def _load(path: str) -> dict:
-    if not os.path.exists(path):
-        return {}
-    with open(path) as f:
-        try:
-            return json.load(f)
-        except Exception:
-            return {}
-
-
-def _save(path: str, data: dict):
-    with open(path, "w") as f:
-        json.dump(data, f, indent=2)
-
-
-def _user_from_token(token: str) -> Optional[dict]:
-    sessions = _load(SESSIONS_FILE)
-    session  = sessions.get(token)
-    if not session:
-        return None
-    users = _load(USERS_FILE)
-    return users.get(session["user_id"])
-
-
 def _compute_game_score(
     answers: List[AnswerDetail],
     game_meta: dict,
@@ -426,31 +400,30 @@ def _compute_domain_summary(sessions: List[dict]) -> Dict[str, Any]:
     }
 
 
-def _compute_leaderboard(all_results: dict) -> List[dict]:
-    """Compute top scores per game across all users."""
-    # game_id -> list of {user_id, score, completed_at}
-    game_tops: Dict[str, List[dict]] = {}
+def _compute_leaderboard(game_ids: Optional[List[str]] = None) -> Dict[str, List[dict]]:
+    """Compute top scores per game across all users (all played games by default)."""
+    # game_id -> top 10 sessions, served by the (game_id, final_score) index
+    game_tops = {
+        gid: db.top_game_sessions(gid, limit=10)
+        for gid in (game_ids if game_ids is not None else db.played_game_ids())
+    }
 
     # Load users for display names
-    users = _load(USERS_FILE)
-
-    for uid, sessions in all_results.items():
-        user_name = users.get(uid, {}).get("full_name", "Anonymous")
-        for s in sessions:
-            gid   = s.get("game_id")
-            score = s.get("final_score")
-            if gid and score is not None:
-                game_tops.setdefault(gid, []).append({
-                    "user_id":      uid,
-                    "display_name": user_name,
-                    "score":        score,
-                    "completed_at": s.get("completed_at"),
-                })
+    users = db.get_users(s["user_id"] for tops in game_tops.values() for s in tops)
 
     leaderboard = {}
-    for gid, entries in game_tops.items():
-        top10 = sorted(entries, key=lambda e: e["score"], reverse=True)[:10]
-        leaderboard[gid] = top10
+    for gid, tops in game_tops.items():
+        if not tops:
+            continue
+        leaderboard[gid] = [
+            {
+                "user_id":      s["user_id"],
+                "display_name": users.get(s["user_id"], {}).get("full_name", "Anonymous"),
+                "score":        s["final_score"],
+                "completed_at": s.get("completed_at"),
+            }
+            for s in tops
+        ]
 
     return leaderboard
 
@@ -496,18 +469,12 @@ def list_games(
 
 
 @router.get("/summary")
-def get_game_summary(authorization: str = Header(...)):
+def get_game_summary(user: dict = Depends(current_user)):
     """
     Get the authenticated user's aggregated game performance summary,
     broken down by domain, category, and trend.
     """
-    token = authorization.replace("Bearer ", "").strip()
-    user  = _user_from_token(token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Unauthorized. Please log in.")
-
-    all_results = _load(GAME_RESULTS_FILE)
-    sessions    = all_results.get(user["id"], [])
+    sessions = db.get_game_sessions(user["id"])
 
     summary = _compute_domain_summary(sessions)
     domain_scores = _compute_cognitive_domain_scores(sessions)
@@ -525,45 +492,40 @@ def get_game_summary(authorization: str = Header(...)):
 
 @router.get("/history")
 def get_game_history(
-    authorization: str = Header(...),
+    user: dict = Depends(current_user),
     game_id: Optional[str] = None,
-    limit: int = 20,
+    limit: int = Query(20, ge=1, le=100),
+    before: Optional[int] = None,
+    after: Optional[int] = None,
 ):
     """
-    Get the authenticated user's game session history.
+    Get the authenticated user's game session history, newest first.
     Optional filter: ?game_id=game-story-reconstruct&limit=10
+    Paging: each session carries `seq`; pass ?before=<oldest seq shown> for
+    older sessions or ?after=<newest seq shown> for newer ones.
     """
-    token = authorization.replace("Bearer ", "").strip()
-    user  = _user_from_token(token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Unauthorized. Please log in.")
 
-    all_results = _load(GAME_RESULTS_FILE)
-    sessions    = all_results.get(user["id"], [])
-
-    if game_id:
-        sessions = [s for s in sessions if s.get("game_id") == game_id]
-
-    sessions_sorted = sessions[-limit:][::-1]  # newest first
+    page, has_more = db.game_sessions_page(user["id"], game_id, before, after, limit)
+    sessions_sorted = page[::-1]  # newest first
 
     return {
         "sessions": sessions_sorted,
-        "total": len(sessions),
+        "total": db.count_game_sessions(user["id"], game_id),
         "filtered_total": len(sessions_sorted),
+        "has_more": has_more,
     }
 
 
 @router.get("/leaderboard")
 def get_leaderboard(
     game_id: Optional[str] = None,
-    authorization: Optional[str] = Header(default=None),
+    user: Optional[dict] = Depends(optional_user),
 ):
     """
     Get top scores per game or for a specific game.
     Optional: ?game_id=game-calc-sprint
     """
-    all_results = _load(GAME_RESULTS_FILE)
-    leaderboard = _compute_leaderboard(all_results)
+    leaderboard = _compute_leaderboard([game_id] if game_id else None)
 
     if game_id:
         if game_id not in GAME_MAP:
@@ -590,7 +552,9 @@ def get_game(game_id: str):
 def submit_game(
     game_id: str,
     payload: GameSubmitRequest,
-    authorization: Optional[str] = Header(default=None),
+    response: Response,
+    user: Optional[dict] = Depends(optional_user),
+    idempotency_key: Optional[str] = Header(default=None),
 ):
     """
     Submit a completed game session and receive a scored result.
@@ -602,6 +566,9 @@ def submit_game(
 
     Returns:
       - Full GameSessionResult with accuracy, scores, cognitive metrics.
+
+    A resend with the same Idempotency-Key header gets the first response
+    back (same session_id) and is not scored or saved again.
     """
     game = GAME_MAP.get(game_id)
     if not game:
@@ -616,24 +583,28 @@ def submit_game(
             detail=f"Too many answers. Game has {game['total_questions']} questions.",
         )
 
-    log_info(f"[/api/games/{game_id}/submit] scoring {len(payload.answers)} answers")
+    result, replayed = idempotency.call(
+        idempotency.scoped_key(f"games/{game_id}", user, idempotency_key),
+        idempotency.fingerprint(payload.model_dump(mode="json")),
+        lambda: _score_and_save(game, payload, user),
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+
+def _score_and_save(game: dict, payload: GameSubmitRequest, user: Optional[dict]) -> GameSessionResult:
+    log_info(f"[/api/games/{game['id']}/submit] scoring {len(payload.answers)} answers")
 
     result = _compute_game_score(payload.answers, game, payload.total_time_seconds)
 
     # Persist result if user is authenticated
-    if authorization:
-        token = authorization.replace("Bearer ", "").strip()
-        user  = _user_from_token(token)
-        if user:
-            all_results = _load(GAME_RESULTS_FILE)
-            uid         = user["id"]
-            history     = all_results.get(uid, [])
-            record      = result.model_dump()
-            record["session_metadata"] = payload.session_metadata
-            history.append(record)
-            all_results[uid] = history[-100:]  # keep last 100 sessions
-            _save(GAME_RESULTS_FILE, all_results)
-            log_info(f"[games] saved session {result.session_id} for user {uid}")
+    if user:
+        uid    = user["id"]
+        record = result.model_dump()
+        record["session_metadata"] = payload.session_metadata
+        writer.run(db.append_game_session, uid, record, keep=GAME_HISTORY_KEEP)
+        log_info(f"[games] saved session {result.session_id} for user {uid}")
 
     return result
 
@@ -641,7 +612,7 @@ def submit_game(
 @router.get("/{game_id}/my-stats")
 def get_my_game_stats(
     game_id: str,
-    authorization: str = Header(...),
+    user: dict = Depends(current_user),
 ):
     """
     Get the authenticated user's personal stats for a specific game:
@@ -651,16 +622,7 @@ def get_my_game_stats(
     if not game:
         raise HTTPException(status_code=404, detail=f"Game '{game_id}' not found.")
 
-    token = authorization.replace("Bearer ", "").strip()
-    user  = _user_from_token(token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Unauthorized. Please log in.")
-
-    all_results = _load(GAME_RESULTS_FILE)
-    sessions    = [
-        s for s in all_results.get(user["id"], [])
-        if s.get("game_id") == game_id
-    ]
+    sessions = db.get_game_sessions(user["id"], game_id)
 
     if not sessions:
         return {
@@ -705,8 +667,7 @@ def get_game_leaderboard(game_id: str):
     if game_id not in GAME_MAP:
         raise HTTPException(status_code=404, detail=f"Game '{game_id}' not found.")
 
-    all_results = _load(GAME_RESULTS_FILE)
-    leaderboard = _compute_leaderboard(all_results)
+    leaderboard = _compute_leaderboard([game_id])
 
     return {
         "game_id":    game_id,
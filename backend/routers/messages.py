@@ -3,58 +3,44 @@ messages.py — MindSaathi Messaging Router
 Mounted at /api (no extra prefix), so routes are:
   POST   /api/messages/send
   GET    /api/messages/unread/count   ← MUST be before /{id}
+  GET    /api/messages/stream         ← Server-Sent Events; MUST be before /{id}
   GET    /api/conversations
   GET    /api/messages/{other_user_id}
   DELETE /api/messages/{message_id}
 """
 
-import json, os, uuid
+import asyncio
+import os
+import uuid
 from datetime import datetime
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from core.security import current_user
+from storage import db
+from utils.pubsub import OVERFLOW, Broker
+from utils.sse import KEEP_ALIVE, SSE_HEADERS, sse_event
 
 router = APIRouter(tags=["messages"])  # NO prefix — mounted under /api directly
 
-DATA_DIR      = os.path.join(os.path.dirname(__file__), "..", "data")
-MESSAGES_FILE = os.path.join(DATA_DIR, "messages.json")
-SESSIONS_FILE = os.path.join(DATA_DIR, "sessions.json")
-USERS_FILE    = os.path.join(DATA_DIR, "users.json")
-os.makedirs(DATA_DIR, exist_ok=True)
-
-def _load(path):
-    if not os.path.exists(path): return {}
-    with open(path) as f:
-        try: return json.load(f)
-        except: return {}
-
-def _load_msgs():
-    if not os.path.exists(MESSAGES_FILE): return []
-    with open(MESSAGES_FILE) as f:
-        try: return json.load(f)
-        except: return []
-
-def _save_msgs(msgs):
-    with open(MESSAGES_FILE, "w") as f: json.dump(msgs, f, indent=2)
-
-def _user_from_token(token: str):
-    sessions = _load(SESSIONS_FILE)
-    session  = sessions.get(token)
-    if not session: return None
-    users = _load(USERS_FILE)
-    return users.get(session["user_id"])
-
-def _auth(authorization: str):
-    token = authorization.replace("Bearer ", "").strip()
-    user  = _user_from_token(token)
-    if not user:
-        raise HTTPException(status_code=401, detail="Unauthorized.")
-    return user
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("MESSAGE_STREAM_HEARTBEAT_SECONDS", "15"))
+STREAM_QUEUE_MAX         = int(os.getenv("MESSAGE_STREAM_QUEUE_MAX", "100"))
+STREAM_CATCHUP_PAGE      = 500    # messages per catch-up read on reconnect
+
+# user_id → ("message", msg) / ("unread", {"count": n}) events for /messages/stream
+broker = Broker(maxsize=STREAM_QUEUE_MAX)
+
+
+def _publish_unread(*user_ids: str):
+    for uid in user_ids:
+        broker.publish(uid, ("unread", {"count": db.unread_count(uid)}))
 
 
 # ── POST /api/messages/send ───────────────────────────────────────────────────
 @router.post("/messages/send")
-def send_message(body: dict, authorization: str = Header(...)):
-    user         = _auth(authorization)
+def send_message(body: dict, user: dict = Depends(current_user)):
     text         = (body.get("text") or "").strip()
     recipient_id = (body.get("recipient_id") or "").strip()
 
@@ -64,22 +50,19 @@ def send_message(body: dict, authorization: str = Header(...)):
         raise HTTPException(status_code=400, detail="Recipient ID required.")
 
     # Validate recipient exists
-    users = _load(USERS_FILE)
-    if recipient_id not in users:
+    if not db.get_user(recipient_id):
         raise HTTPException(status_code=404, detail=f"Recipient not found.")
 
     # Enforce enrollment-based messaging access
-    sender_data = users.get(user["id"], {})
     if user.get("role") == "doctor":
-        enrolled_ids = set(sender_data.get("patient_list", []))
+        enrolled_ids = set(user.get("patient_list", []))
         if recipient_id not in enrolled_ids:
             raise HTTPException(status_code=403, detail="You can only message your enrolled patients.")
     else:
-        assigned_doctor = sender_data.get("assigned_doctor_id")
+        assigned_doctor = user.get("assigned_doctor_id")
         if recipient_id != assigned_doctor:
             raise HTTPException(status_code=403, detail="You can only message your assigned doctor.")
 
-    msgs = _load_msgs()
     msg  = {
         "id":           str(uuid.uuid4()),
         "sender_id":    user["id"],
@@ -88,46 +71,100 @@ def send_message(body: dict, authorization: str = Header(...)):
         "recipient_id": recipient_id,
         "text":         text,
         "timestamp":    datetime.utcnow().isoformat(),
-        # Track read state per-user. Sender has implicitly read it.
-        "read_by":      [user["id"]],
-        "deleted_by":   [],
     }
-    msgs.append(msg)
-    _save_msgs(msgs)
-    return {"message": msg}
+    with db.transaction() as conn:
+        seq = db.insert_message(msg, conn)
+    # Read state lives outside the log; the sender has implicitly read it.
+    out = {**msg, "seq": seq, "read_by": [user["id"]]}
+    broker.publish(recipient_id, ("message", out))
+    broker.publish(user["id"], ("message", out))      # the sender's other tabs
+    _publish_unread(recipient_id)
+    return {"message": out}
 
 
 # ── GET /api/messages/unread/count  (STATIC — must be before /{id}) ──────────
 @router.get("/messages/unread/count")
-def unread_count(authorization: str = Header(...)):
-    user  = _auth(authorization)
-    uid   = user["id"]
-    msgs  = _load_msgs()
-    count = sum(1 for m in msgs
-                if m["recipient_id"] == uid
-                and uid not in m.get("deleted_by", [])
-                and uid not in m.get("read_by", []))
-    return {"count": count}
+def unread_count(user: dict = Depends(current_user)):
+    return {"count": db.unread_count(user["id"])}
+
+
+# ── GET /api/messages/stream  (STATIC — must be before /{id}) ────────────────
+@router.get("/messages/stream")
+async def message_stream(
+    request: Request,
+    since: Optional[int] = None,
+    last_event_id: Optional[str] = Header(default=None),
+    user: dict = Depends(current_user),
+):
+    """
+    Push new messages and unread-count changes as Server-Sent Events, instead
+    of the client polling /messages/{id}. Message events carry `id: <seq>`;
+    reconnect with `?since=<seq>` (or Last-Event-ID) to replay what was missed.
+    """
+    uid    = user["id"]
+    cursor = since
+    if cursor is None and last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+
+    async def events():
+        # Subscribe first so nothing sent during the catch-up read is lost.
+        sub = broker.subscribe(uid)
+        try:
+            last_seq = cursor or 0
+            if cursor is not None:
+                # Page through the whole backlog: however long the client was away,
+                # live events must not start until everything before them was sent.
+                while True:
+                    page = await run_in_threadpool(db.messages_since, uid, last_seq, STREAM_CATCHUP_PAGE)
+                    for m in page:
+                        last_seq = m["seq"]
+                        yield sse_event("message", m, m["seq"])
+                    if len(page) < STREAM_CATCHUP_PAGE:
+                        break
+            yield sse_event("unread", {"count": await run_in_threadpool(db.unread_count, uid)})
+
+            while True:
+                try:
+                    item = await asyncio.wait_for(sub.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield KEEP_ALIVE
+                    continue
+                if item is OVERFLOW:
+                    break                     # client reconnects with Last-Event-ID
+                kind, data = item
+                if kind == "message":
+                    if data["seq"] <= last_seq:
+                        continue              # already sent during catch-up
+                    last_seq = data["seq"]
+                    yield sse_event(kind, data, data["seq"])
+                else:
+                    yield sse_event(kind, data)
+        finally:
+            broker.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
 
 
 # ── GET /api/conversations ────────────────────────────────────────────────────
 @router.get("/conversations")
-def get_conversations(authorization: str = Header(...)):
-    user  = _auth(authorization)
+def get_conversations(user: dict = Depends(current_user)):
     uid   = user["id"]
-    msgs  = _load_msgs()
-    users = _load(USERS_FILE)
 
     # Determine which users this person is allowed to message (enrollment-based)
     if user.get("role") == "doctor":
         # Doctor sees only their approved enrolled patients
-        doctor_record  = users.get(uid, {})
-        allowed_ids    = set(doctor_record.get("patient_list", []))
+        allowed_ids    = set(user.get("patient_list", []))
     else:
         # Patient sees only their assigned (approved) doctor
-        patient_record = users.get(uid, {})
-        assigned       = patient_record.get("assigned_doctor_id")
+        assigned       = user.get("assigned_doctor_id")
         allowed_ids    = {assigned} if assigned else set()
+    users = db.get_users(allowed_ids)
 
     partners = {}
     # First: seed all allowed contacts so they always appear (even with no messages)
@@ -142,26 +179,18 @@ def get_conversations(authorization: str = Header(...)):
                 "last_ts":   "",
             }
 
-    # Then: layer in actual message data for allowed partners
-    for m in msgs:
-        if uid not in m.get("deleted_by", []):
-            if m["sender_id"] == uid:
-                other = m["recipient_id"]
-            elif m["recipient_id"] == uid:
-                other = m["sender_id"]
-            else:
-                continue
-            # Only show messages with allowed partners
-            if other and other != uid and other in allowed_ids:
-                if other not in partners or m["timestamp"] > partners[other].get("last_ts", ""):
-                    u = users.get(other, {})
-                    partners[other] = {
-                        "user_id":   other,
-                        "full_name": u.get("full_name", "Unknown"),
-                        "role":      u.get("role", "patient"),
-                        "last_msg":  m["text"],
-                        "last_ts":   m["timestamp"],
-                    }
+    # Then: layer in the latest message of each conversation (one index seek each)
+    for other in allowed_ids:
+        m = db.last_message(uid, other) if other and other != uid else None
+        if m:
+            u = users.get(other, {})
+            partners[other] = {
+                "user_id":   other,
+                "full_name": u.get("full_name", "Unknown"),
+                "role":      u.get("role", "patient"),
+                "last_msg":  m["text"],
+                "last_ts":   m["timestamp"],
+            }
 
     convs = sorted(partners.values(), key=lambda x: x["last_ts"], reverse=True)
     return {"conversations": convs}
@@ -169,41 +198,31 @@ def get_conversations(authorization: str = Header(...)):
 
 # ── GET /api/messages/{other_user_id}  (DYNAMIC — after static routes) ───────
 @router.get("/messages/{other_user_id}")
-def get_messages(other_user_id: str, authorization: str = Header(...)):
-    user = _auth(authorization)
+def get_messages(
+    other_user_id: str,
+    user: dict = Depends(current_user),
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+):
+    """
+    The newest `limit` messages of a conversation, oldest first. Each carries
+    `seq`: ?before=<first seq> pages back through history, ?after=<last seq>
+    fetches only what is new.
+    """
     uid  = user["id"]
-    msgs = _load_msgs()
-    changed = False
     # Mark all incoming messages from this conversation partner as read.
-    for m in msgs:
-        if (m["sender_id"] == other_user_id and m["recipient_id"] == uid):
-            rb = m.setdefault("read_by", [])
-            if uid not in rb:
-                rb.append(uid)
-                changed = True
-    if changed:
-        _save_msgs(msgs)
-
-    conv = [
-        m for m in msgs
-        if ((m["sender_id"] == uid    and m["recipient_id"] == other_user_id) or
-            (m["sender_id"] == other_user_id and m["recipient_id"] == uid))
-        and uid not in m.get("deleted_by", [])
-    ]
-    return {"messages": conv}
+    if db.mark_conversation_read(uid, other_user_id):
+        _publish_unread(uid)
+    msgs, has_more = db.conversation(uid, other_user_id, before, after, limit)
+    return {"messages": msgs, "has_more": has_more}
 
 
 # ── DELETE /api/messages/{message_id} ────────────────────────────────────────
 @router.delete("/messages/{message_id}")
-def delete_message(message_id: str, authorization: str = Header(...)):
-    user = _auth(authorization)
-    msgs = _load_msgs()
-    for m in msgs:
-        if m["id"] == message_id:
-            if user["id"] not in m.get("deleted_by", []):
-                m.setdefault("deleted_by", []).append(user["id"])
-            break
-    _save_msgs(msgs)
+def delete_message(message_id: str, user: dict = Depends(current_user)):
+    with db.transaction() as conn:
+        hidden = db.delete_message_for(user["id"], message_id, conn)
+    if hidden:
+        _publish_unread(user["id"])
     return {"ok": True}
-
-
@@ -14,17 +14,36 @@ Feature vector:
 
 All domain score functions return 0–100 where HIGHER = healthier.
 Risk probabilities are in [0, 1].
+
+With RISK_BATCHING=true, score_disease_risks() gathers the feature vectors
+of concurrent requests for RISK_BATCH_WINDOW_MS and scores them together
+(compute_disease_risks_batch). Otherwise it calls compute_disease_risks().
+
+MODEL_VERSION is a hash of everything that turns features into risks: the
+model weights, feature scaling, domain weights and condition multipliers,
+plus MODEL_REVISION for changes in code. Each stored result records it,
+along with its features, so services/rescoring.py can re-score history
+after any of them change.
 """
 
+import hashlib
+import json
+import os
 import random
-from typing import Optional
+from typing import List, Optional
 
 import numpy as np
 
+from core.clinical_config import CONDITION_MULTIPLIERS, DOMAIN_WEIGHTS, MAX_RISK_CAP
 from models.schemas import (
-    SpeechData, MemoryData, ReactionData,
+    AnalyzeRequest, SpeechData, MemoryData, ReactionData,
     StroopData, TapData, UserProfile, FeatureVector,
 )
+from utils.batching import MicroBatcher
+
+RISK_BATCHING        = os.getenv("RISK_BATCHING", "false").lower() == "true"
+RISK_BATCH_WINDOW_MS = float(os.getenv("RISK_BATCH_WINDOW_MS", "2"))
+RISK_BATCH_MAX       = int(os.getenv("RISK_BATCH_MAX", "256"))
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # DISEASE MODEL WEIGHTS
@@ -116,6 +135,11 @@ def _predict_disease(feature_vec: np.ndarray, weights: np.ndarray, bias: float)
     return round(float(_sigmoid(logit)), 3)
 
 
+def _clamp(x: float, lo: float, hi: float) -> float:
+    """float(np.clip(x, lo, hi)) for one number, without the array round trip."""
+    return float(min(max(x, lo), hi))
+
+
 def _prob_to_level(prob: float) -> str:
     if prob < 0.35:
         return "Low"
@@ -127,8 +151,26 @@ def _prob_to_level(prob: float) -> str:
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # FEATURE EXTRACTORS
+# Missing memory / Stroop / tapping inputs are filled with plausible random
+# values drawn from `rng`. The API passes payload_rng(payload_digest(...)), so
+# the same payload always gets the same fallbacks and the same scores.
 # ═══════════════════════════════════════════════════════════════════════════════
 
+def payload_digest(payload: AnalyzeRequest) -> str:
+    """
+    SHA-256 of the payload's canonical JSON: every AnalyzeRequest field,
+    defaults filled in and keys sorted. Payloads that validate to the same
+    request get the same digest, however they were spelled.
+    """
+    doc = payload.model_dump(mode="json", include=set(AnalyzeRequest.model_fields))
+    return hashlib.sha256(json.dumps(doc, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def payload_rng(digest: str) -> random.Random:
+    """Fallback randomness seeded from a payload digest."""
+    return random.Random(int(digest[:16], 16))
+
+
 def extract_speech_features(audio_b64=None, speech: Optional[SpeechData] = None) -> tuple[float, dict]:
     """
     Extract speech features from structured SpeechData payload.
@@ -139,7 +181,7 @@ def extract_speech_features(audio_b64=None, speech: Optional[SpeechData] = None)
         wpm       = speech.wpm if speech.wpm and speech.wpm > 0 else _estimate_wpm(audio_b64)
         # Clamp to realistic range (10–350 wpm) to prevent absurd scores from
         # accidental short recordings on the frontend.
-        wpm       = float(np.clip(wpm, 10.0, 350.0))
+        wpm       = _clamp(wpm, 10.0, 350.0)
         speed_dev = speech.speed_deviation if speech.speed_deviation is not None else _estimate_speed_dev(wpm)
         spvar     = speech.speech_speed_variability if speech.speech_speed_variability is not None else speed_dev
         pause_r   = speech.pause_ratio if speech.pause_ratio is not None else 0.15
@@ -177,10 +219,10 @@ def extract_speech_features(audio_b64=None, speech: Optional[SpeechData] = None)
     restart_pen = min(restarts * 6, 20)
     delay_pen   = min(max(0, (start_del - 0.5) * 5), 15)
 
-    score = float(np.clip(
+    score = _clamp(
         wpm_score - pause_pen - var_pen + compl_bonus - restart_pen - delay_pen,
         0, 100
-    ))
+    )
     return round(score, 2), feats
 
 
@@ -200,19 +242,20 @@ def _estimate_speed_dev(wpm: float) -> float:
     return 14.0
 
 
-def extract_memory_features(memory_results: dict, memory: Optional[MemoryData] = None) -> tuple[float, dict]:
+def extract_memory_features(memory_results: dict, memory: Optional[MemoryData] = None,
+                            rng=random) -> tuple[float, dict]:
     if memory:
         imm    = memory.word_recall_accuracy
-        delyd  = memory.delayed_recall_accuracy if memory.delayed_recall_accuracy is not None else imm * random.uniform(0.8, 1.0)
+        delyd  = memory.delayed_recall_accuracy if memory.delayed_recall_accuracy is not None else imm * rng.uniform(0.8, 1.0)
         latenc = memory.recall_latency_seconds or 3.0
         order  = memory.order_match_ratio if memory.order_match_ratio is not None else 1.0
         intrus = memory.intrusion_count or 0
     else:
         imm    = memory_results.get("word_recall_accuracy", 50.0)
         delyd  = memory_results.get("pattern_accuracy", 50.0)
-        latenc = random.uniform(2, 8)
-        order  = random.uniform(0.6, 1.0)
-        intrus = random.randint(0, 4)
+        latenc = rng.uniform(2, 8)
+        order  = rng.uniform(0.6, 1.0)
+        intrus = rng.randint(0, 4)
 
     feats = dict(immediate_recall_accuracy=round(imm, 2), delayed_recall_accuracy=round(delyd, 2),
                  intrusion_count=float(intrus), recall_latency=round(latenc, 2),
@@ -222,7 +265,7 @@ def extract_memory_features(memory_results: dict, memory: Optional[MemoryData] =
     latency_pen    = min((latenc - 2) * 4, 25) if latenc > 2 else 0
     order_bonus    = order * 15
     intrusion_pen  = min(intrus * 5, 25)
-    score = float(np.clip(accuracy_score - latency_pen + order_bonus - intrusion_pen, 0, 100))
+    score = _clamp(accuracy_score - latency_pen + order_bonus - intrusion_pen, 0, 100)
     return round(score, 2), feats
 
 
@@ -251,41 +294,41 @@ def extract_reaction_features(reaction_times: list, reaction: Optional[ReactionD
 
     # Score based on realistic RT range: 150ms (fast) to 1200ms (slow)
     # 150ms → ~100,  400ms → ~75,  700ms → ~50,  1000ms → ~20,  1200ms → ~0
-    speed_score = float(np.clip(100 - ((mean_rt - 150) / 1050) * 100, 0, 100))
-    var_pen     = float(np.clip(std_rt / 8, 0, 20))           # variability penalty (max -20)
-    drift_pen   = float(np.clip(max(drift, 0) / 15, 0, 15))   # fatigue penalty (max -15)
-    miss_pen    = float(np.clip(miss_count * 8, 0, 25))        # miss penalty (max -25)
-    score = float(np.clip(speed_score - var_pen - drift_pen - miss_pen, 0, 100))
+    speed_score = _clamp(100 - ((mean_rt - 150) / 1050) * 100, 0, 100)
+    var_pen     = _clamp(std_rt / 8, 0, 20)           # variability penalty (max -20)
+    drift_pen   = _clamp(max(drift, 0) / 15, 0, 15)   # fatigue penalty (max -15)
+    miss_pen    = _clamp(miss_count * 8, 0, 25)        # miss penalty (max -25)
+    score = _clamp(speed_score - var_pen - drift_pen - miss_pen, 0, 100)
     return round(score, 2), feats
 
 
-def extract_executive_features(stroop: Optional[StroopData] = None) -> tuple[float, dict]:
+def extract_executive_features(stroop: Optional[StroopData] = None, rng=random) -> tuple[float, dict]:
     if stroop and stroop.total_trials > 0:
         error_rate = stroop.error_count / stroop.total_trials
-        stroop_rt  = stroop.incongruent_rt or stroop.mean_rt or random.uniform(450, 800)
+        stroop_rt  = stroop.incongruent_rt or stroop.mean_rt or rng.uniform(450, 800)
     else:
-        error_rate = random.uniform(0.05, 0.30)
-        stroop_rt  = random.uniform(450, 800)
+        error_rate = rng.uniform(0.05, 0.30)
+        stroop_rt  = rng.uniform(450, 800)
 
     feats = dict(stroop_error_rate=round(error_rate, 4), stroop_rt=round(stroop_rt, 2))
 
     error_pen = min(error_rate * 200, 60)
     rt_pen    = min((stroop_rt - 400) / 400 * 40, 40) if stroop_rt > 400 else 0
-    score = float(np.clip(100 - error_pen - rt_pen, 0, 100))
+    score = _clamp(100 - error_pen - rt_pen, 0, 100)
     return round(score, 2), feats
 
 
-def extract_motor_features(tap: Optional[TapData] = None) -> tuple[float, dict]:
+def extract_motor_features(tap: Optional[TapData] = None, rng=random) -> tuple[float, dict]:
     if tap and len(tap.intervals) >= 3:
         intervals = np.array(tap.intervals, dtype=float)
         tap_std   = float(np.std(intervals))
     else:
-        tap_std = random.uniform(20, 120)
+        tap_std = rng.uniform(20, 120)
 
     feats = dict(tap_interval_std=round(tap_std, 2))
     # Lower std = more consistent = better motor control
     penalty = min(tap_std / 2, 60)
-    score   = float(np.clip(100 - penalty, 0, 100))
+    score   = _clamp(100 - penalty, 0, 100)
     return round(score, 2), feats
 
 
@@ -293,39 +336,34 @@ def extract_motor_features(tap: Optional[TapData] = None) -> tuple[float, dict]:
 # DISEASE RISK COMPUTATION
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def compute_disease_risks(fv: FeatureVector, profile: Optional[UserProfile] = None) -> dict:
-    """
-    Build the 18-element feature vector and run three separate logistic models.
-    Raw features are normalised to roughly [0, 1] range before scoring.
-    """
-    vec = np.array([
-        fv.wpm / 200.0,
-        fv.speed_deviation / 50.0,
-        fv.speech_variability / 30.0,
-        fv.pause_ratio,
-        fv.speech_start_delay / 5.0,
-        fv.immediate_recall_accuracy / 100.0,
-        fv.delayed_recall_accuracy / 100.0,
-        fv.intrusion_count / 10.0,
-        fv.recall_latency / 15.0,
-        fv.order_match_ratio,
-        fv.mean_rt / 800.0,
-        fv.std_rt / 300.0,
-        fv.min_rt / 600.0,
-        fv.reaction_drift / 300.0,
-        fv.miss_count / 10.0,
-        fv.stroop_error_rate,
-        fv.stroop_rt / 1000.0,
-        fv.tap_interval_std / 200.0,
-    ])
+# Divisors that bring each raw feature to roughly [0, 1], in FeatureVector order.
+FEATURE_SCALE = np.array([
+    200.0, 50.0, 30.0, 1.0, 5.0,           # speech
+    100.0, 100.0, 10.0, 15.0, 1.0,         # memory
+    800.0, 300.0, 600.0, 300.0, 10.0,      # reaction
+    1.0, 1000.0,                           # executive
+    200.0,                                 # motor
+])
+FEATURE_NAMES = list(FeatureVector.model_fields)
 
-    alz_prob  = _predict_disease(vec, ALZ_WEIGHTS,  ALZ_BIAS)
-    dem_prob  = _predict_disease(vec, DEM_WEIGHTS,  DEM_BIAS)
-    park_prob = _predict_disease(vec, PARK_WEIGHTS, PARK_BIAS)
+# All three models side by side: one (N × 18) · (18 × 3) product scores N vectors.
+MODEL_WEIGHTS = np.stack([ALZ_WEIGHTS, DEM_WEIGHTS, PARK_WEIGHTS], axis=1)
+MODEL_BIAS    = np.array([ALZ_BIAS, DEM_BIAS, PARK_BIAS])
+
+
+def feature_list(fv: FeatureVector) -> List[float]:
+    """The feature vector as a plain list in FEATURE_NAMES order (its stored form)."""
+    return [getattr(fv, name) for name in FEATURE_NAMES]
 
-    # Clinical profile adjustment (gentle nudge, not dominant)
+
+def _normalised_vector(fv: FeatureVector) -> np.ndarray:
+    return np.array(feature_list(fv)) / FEATURE_SCALE
+
+
+def _profile_adjustment(profile: Optional[UserProfile]) -> tuple[float, float, float]:
+    """Clinical profile adjustment (gentle nudge, not dominant): (alz, dem, park) deltas."""
+    alz_adj = dem_adj = park_adj = 0.0
     if profile:
-        alz_adj = dem_adj = park_adj = 0.0
         if profile.age and profile.age > 65:
             alz_adj  += 0.04
             dem_adj  += 0.03
@@ -335,6 +373,22 @@ def compute_disease_risks(fv: FeatureVector, profile: Optional[UserProfile] = No
         if profile.education_level and profile.education_level >= 4:
             alz_adj  -= 0.03
             dem_adj  -= 0.02
+    return alz_adj, dem_adj, park_adj
+
+
+def compute_disease_risks(fv: FeatureVector, profile: Optional[UserProfile] = None) -> dict:
+    """
+    Build the 18-element feature vector and run three separate logistic models.
+    Raw features are normalised to roughly [0, 1] range before scoring.
+    """
+    vec = _normalised_vector(fv)
+
+    alz_prob  = _predict_disease(vec, ALZ_WEIGHTS,  ALZ_BIAS)
+    dem_prob  = _predict_disease(vec, DEM_WEIGHTS,  DEM_BIAS)
+    park_prob = _predict_disease(vec, PARK_WEIGHTS, PARK_BIAS)
+
+    if profile:
+        alz_adj, dem_adj, park_adj = _profile_adjustment(profile)
         alz_prob  = float(np.clip(alz_prob  + alz_adj,  0, 1))
         dem_prob  = float(np.clip(dem_prob  + dem_adj,  0, 1))
         park_prob = float(np.clip(park_prob + park_adj, 0, 1))
@@ -346,6 +400,46 @@ def compute_disease_risks(fv: FeatureVector, profile: Optional[UserProfile] = No
     }
 
 
+def disease_risk_matrix(features: np.ndarray, profiles: List[Optional[UserProfile]]) -> np.ndarray:
+    """
+    (N × 3) alzheimers / dementia / parkinsons risks for N raw feature rows
+    (FEATURE_NAMES order) and each row's profile: one matrix product and
+    one vectorised sigmoid.
+    """
+    X     = features / FEATURE_SCALE
+    # Python's round(), as in _predict_disease: np.round can differ in the last digit.
+    probs = np.array([round(p, 3) for p in _sigmoid(X @ MODEL_WEIGHTS + MODEL_BIAS).ravel().tolist()]).reshape(-1, 3)
+    has_profile = np.array([profile is not None for profile in profiles], dtype=bool)
+    if has_profile.any():
+        adj   = np.array([_profile_adjustment(profile) for profile in profiles])
+        probs = np.where(has_profile[:, None], np.clip(probs + adj, 0, 1), probs)
+    return probs
+
+
+def compute_disease_risks_batch(items: list) -> list:
+    """compute_disease_risks for many (FeatureVector, UserProfile | None) pairs at once."""
+    if not items:
+        return []
+    probs = disease_risk_matrix(
+        np.array([feature_list(fv) for fv, _ in items], dtype=float),
+        [profile for _, profile in items],
+    )
+    return [
+        {"alzheimers_risk": float(a), "dementia_risk": float(d), "parkinsons_risk": float(p)}
+        for a, d, p in probs
+    ]
+
+
+risk_batcher = MicroBatcher(compute_disease_risks_batch, RISK_BATCH_WINDOW_MS / 1000, RISK_BATCH_MAX)
+
+
+async def score_disease_risks(fv: FeatureVector, profile: Optional[UserProfile] = None) -> dict:
+    """compute_disease_risks, micro-batched with other requests when RISK_BATCHING is on."""
+    if not RISK_BATCHING:
+        return compute_disease_risks(fv, profile)
+    return await risk_batcher.submit((fv, profile))
+
+
 def build_feature_vector(speech_f, memory_f, reaction_f, executive_f, motor_f) -> FeatureVector:
     return FeatureVector(
         wpm=speech_f.get("wpm", 120),
@@ -368,3 +462,74 @@ def build_feature_vector(speech_f, memory_f, reaction_f, executive_f, motor_f) -
         tap_interval_std=motor_f.get("tap_interval_std", 40),
     )
 
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# COMPOSITE RISK
+# ═══════════════════════════════════════════════════════════════════════════════
+
+DOMAINS = ["speech", "memory", "reaction", "executive", "motor"]
+
+
+def _compute_composite_risk(domains: np.ndarray) -> List[float]:
+    """
+    Composite risk score (0–100, higher = more risk) for each row of
+    `domains` (speech, memory, reaction, executive, motor).
+    Inverts domain scores (higher domain score = healthier = lower risk).
+    Uses DOMAIN_WEIGHTS for weighted average.
+    """
+    risk = _domain_contributions(domains).sum(axis=1)
+    return [round(max(0.0, min(100.0, r)), 2) for r in risk.tolist()]
+
+
+def _compute_risk_drivers(domains: np.ndarray) -> List[dict]:
+    """
+    Risk contribution of each domain as percentage of total composite risk.
+    Used by RiskDriversPanel on the frontend.
+    """
+    contributions = _domain_contributions(domains)
+    totals        = contributions.sum(axis=1)
+    totals[totals == 0] = 1.0
+    pcts = contributions / totals[:, None] * 100
+
+    # Map to frontend field names expected by RiskDriversPanel
+    return [
+        {
+            "memory_recall_contribution_pct":      round(memory),
+            "executive_function_contribution_pct": round(executive),
+            "speech_delay_contribution_pct":       round(speech),
+            "reaction_time_contribution_pct":      round(reaction),
+            "motor_consistency_contribution_pct":  round(motor),
+        }
+        for speech, memory, reaction, executive, motor in pcts.tolist()
+    ]
+
+
+def _domain_contributions(domains: np.ndarray) -> np.ndarray:
+    w = DOMAIN_WEIGHTS
+    return (100 - domains) * np.array([w[d] for d in DOMAINS])
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MODEL VERSION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Bump when scoring code changes in a way the constants hashed below don't show
+# (e.g. _profile_adjustment, _prob_to_level or the hybrid blend).
+MODEL_REVISION = 1
+
+
+def _model_version() -> str:
+    spec = {
+        "revision":      MODEL_REVISION,
+        "features":      FEATURE_NAMES,
+        "scale":         FEATURE_SCALE.tolist(),
+        "weights":       MODEL_WEIGHTS.tolist(),
+        "bias":          MODEL_BIAS.tolist(),
+        "domains":       DOMAIN_WEIGHTS,
+        "conditions":    CONDITION_MULTIPLIERS,
+        "max_risk_cap":  MAX_RISK_CAP,
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:12]
+
+
+MODEL_VERSION = _model_version()
@@ -0,0 +1,301 @@
+"""
+llm.py — MindSaathi Gemini client
+Long-lived async client for NeuroBot's LLM calls (Gemini REST API).
+
+  - One pooled httpx.AsyncClient, created on first use and closed at shutdown,
+    instead of configuring the SDK and building a model on every question.
+  - At most GEMINI_MAX_CONCURRENCY calls in flight; each has a hard deadline
+    of GEMINI_TIMEOUT_SECONDS (queueing included), so a slow upstream never
+    holds a request longer than that and never blocks the event loop.
+  - A circuit breaker opens after GEMINI_BREAKER_FAILURES consecutive
+    failures / timeouts; while open, calls return None at once and callers
+    use the static knowledge-base answer. After GEMINI_BREAKER_COOLDOWN_SECONDS
+    one trial call is let through to probe recovery.
+
+GEMINI_API_BASE points the client at any Gemini-compatible endpoint — e.g. the
+local fake server in benchmarks/fake_gemini.py for tests.
+
+Generators are pluggable: anything with `name`, `generate()`, `stream()` and
+`stats()` (see TextGenerator) can drive NeuroBot. NEUROBOT_GENERATOR=stub
+selects StubGenerator, a deterministic local model for tests and demos.
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Optional, Protocol
+
+import httpx
+
+from utils.logger import log_warning
+
+GEMINI_API_KEY   = os.getenv("GEMINI_API_KEY", "")
+GEMINI_API_BASE  = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com").rstrip("/")
+GEMINI_MODEL     = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+
+GEMINI_TIMEOUT_SECONDS          = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "8"))
+GEMINI_MAX_CONCURRENCY          = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_BREAKER_FAILURES         = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_COOLDOWN_SECONDS = float(os.getenv("GEMINI_BREAKER_COOLDOWN_SECONDS", "30"))
+
+NEUROBOT_GENERATOR = os.getenv("NEUROBOT_GENERATOR", "gemini").lower()   # gemini | stub
+
+
+class StreamInterrupted(Exception):
+    """A stream failed after some text was already yielded; that text is incomplete."""
+
+
+class TextGenerator(Protocol):
+    name: str
+
+    async def generate(self, system: str, prompt: str,
+                       max_tokens: int = 400, temperature: float = 0.3) -> Optional[str]:
+        """Whole answer, or None if the model is unavailable."""
+
+    def stream(self, system: str, prompt: str,
+               max_tokens: int = 400, temperature: float = 0.3) -> AsyncIterator[str]:
+        """
+        Answer text pieces as produced; yields nothing if the model is
+        unavailable, raises StreamInterrupted if it fails part-way.
+        """
+
+    def stats(self) -> dict: ...
+
+
+class CircuitBreaker:
+    """closed → (N consecutive failures) → open → (cooldown) → half-open → one trial."""
+
+    def __init__(self, failures: int, cooldown: float):
+        self.threshold = failures
+        self.cooldown  = cooldown
+        self.failures  = 0
+        self.opened_at: Optional[float] = None
+        self.trial     = False
+        self.trips     = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial:
+            self.trial = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures, self.opened_at, self.trial = 0, None, False
+
+    def abandon(self):
+        """A call ended with no verdict (e.g. the client went away); free the trial slot."""
+        self.trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial or (self.opened_at is None and self.failures >= self.threshold):
+            self.trips += 1
+            self.opened_at, self.trial = time.monotonic(), False
+
+
+class GeminiClient:
+    name = "gemini"
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.breaker  = CircuitBreaker(GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_COOLDOWN_SECONDS)
+        self.calls    = 0
+        self.timeouts = 0
+        self.errors   = 0
+        self.rejected = 0     # short-circuited while the breaker was open
+
+    @property
+    def enabled(self) -> bool:
+        return bool(GEMINI_API_KEY)
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=GEMINI_API_BASE,
+                timeout=GEMINI_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=GEMINI_MAX_CONCURRENCY),
+                headers={"x-goog-api-key": GEMINI_API_KEY},
+            )
+            self._slots = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def _body(system: str, prompt: str, max_tokens: int, temperature: float) -> dict:
+        return {
+            "systemInstruction": {"parts": [{"text": system}]},
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": {"maxOutputTokens": max_tokens, "temperature": temperature},
+        }
+
+    async def _post(self, body: dict) -> Optional[str]:
+        http = self._http()
+        async with self._slots:
+            r = await http.post(f"/v1beta/models/{GEMINI_MODEL}:generateContent", json=body)
+        r.raise_for_status()
+        parts = r.json()["candidates"][0]["content"]["parts"]
+        text  = "".join(p.get("text", "") for p in parts).strip()
+        return text or None
+
+    async def generate(self, system: str, prompt: str,
+                       max_tokens: int = 400, temperature: float = 0.3) -> Optional[str]:
+        """Answer text, or None when disabled, short-circuited, timed out or failed."""
+        if not self.enabled:
+            return None
+        if not self.breaker.allow():
+            self.rejected += 1
+            return None
+        self.calls += 1
+        try:
+            text = await asyncio.wait_for(
+                self._post(self._body(system, prompt, max_tokens, temperature)),
+                GEMINI_TIMEOUT_SECONDS,
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.breaker.record_failure()
+            log_warning(f"[llm] Gemini call timed out after {GEMINI_TIMEOUT_SECONDS}s")
+            return None
+        except Exception as exc:
+            self.errors += 1
+            self.breaker.record_failure()
+            log_warning(f"[llm] Gemini call failed: {exc!r}")
+            return None
+        self.breaker.record_success()
+        return text
+
+    async def stream(self, system: str, prompt: str,
+                     max_tokens: int = 400, temperature: float = 0.3) -> AsyncIterator[str]:
+        """
+        Yield answer text as Gemini streams it (streamGenerateContent, SSE).
+        The deadline applies to the wait for a request slot, to the first
+        piece and to each gap after it. A failure before any text ends the
+        stream empty; after some text it raises StreamInterrupted.
+        """
+        if not self.enabled:
+            return
+        if not self.breaker.allow():
+            self.rejected += 1
+            return
+        self.calls += 1
+        body, verdict, yielded = self._body(system, prompt, max_tokens, temperature), False, False
+        http = self._http()
+        try:
+            # Waiting for a slot counts against the deadline, as in generate().
+            await asyncio.wait_for(self._slots.acquire(), GEMINI_TIMEOUT_SECONDS)
+            try:
+                async with http.stream(
+                    "POST", f"/v1beta/models/{GEMINI_MODEL}:streamGenerateContent",
+                    params={"alt": "sse"}, json=body,
+                ) as r:
+                    r.raise_for_status()
+                    lines = r.aiter_lines()
+                    while True:
+                        try:
+                            line = await asyncio.wait_for(lines.__anext__(), GEMINI_TIMEOUT_SECONDS)
+                        except StopAsyncIteration:
+                            break
+                        if not line.startswith("data:"):
+                            continue
+                        parts = json.loads(line[5:])["candidates"][0]["content"]["parts"]
+                        text  = "".join(p.get("text", "") for p in parts)
+                        if text:
+                            yielded = True
+                            yield text
+            finally:
+                self._slots.release()
+            verdict = True
+            self.breaker.record_success()
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            verdict = True
+            self.timeouts += 1
+            self.breaker.record_failure()
+            log_warning(f"[llm] Gemini stream stalled for {GEMINI_TIMEOUT_SECONDS}s")
+            if yielded:
+                raise StreamInterrupted("stalled")
+        except Exception as exc:
+            verdict = True
+            self.errors += 1
+            self.breaker.record_failure()
+            log_warning(f"[llm] Gemini stream failed: {exc!r}")
+            if yielded:
+                raise StreamInterrupted(repr(exc)) from exc
+        finally:
+            if not verdict:
+                self.breaker.abandon()
+
+    def stats(self) -> dict:
+        return {
+            "generator": self.name,
+            "enabled":  self.enabled,
+            "model":    GEMINI_MODEL,
+            "breaker":  self.breaker.state,
+            "trips":    self.breaker.trips,
+            "calls":    self.calls,
+            "timeouts": self.timeouts,
+            "errors":   self.errors,
+            "rejected": self.rejected,
+        }
+
+
+class StubGenerator:
+    """
+    Deterministic stand-in model: answers from the prompt's knowledge-base
+    excerpt, streamed word by word with an optional per-piece delay.
+    """
+
+    name = "stub"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    @staticmethod
+    def _answer(prompt: str) -> str:
+        question  = prompt.split("\n", 1)[0].removeprefix("Question: ")
+        knowledge = prompt.split("[Knowledge base]:\n", 1)[-1] if "[Knowledge base]:" in prompt else ""
+        excerpt   = knowledge.split("\n\n", 1)[0].split("]: ", 1)[-1]
+        return (f"You asked: {question} "
+                + (f"{excerpt} " if excerpt else "")
+                + "A neurologist can help interpret what this means for you.")
+
+    async def generate(self, system: str, prompt: str,
+                       max_tokens: int = 400, temperature: float = 0.3) -> Optional[str]:
+        self.calls += 1
+        return self._answer(prompt)
+
+    async def stream(self, system: str, prompt: str,
+                     max_tokens: int = 400, temperature: float = 0.3) -> AsyncIterator[str]:
+        self.calls += 1
+        words = self._answer(prompt).split(" ")
+        for i, word in enumerate(words):
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield word if i == len(words) - 1 else word + " "
+
+    def stats(self) -> dict:
+        return {"generator": self.name, "calls": self.calls}
+
+
+gemini = GeminiClient()
+
+
+def default_generator() -> TextGenerator:
+    if NEUROBOT_GENERATOR == "stub":
+        return StubGenerator()
+    return gemini
@@ -0,0 +1,272 @@
+"""
+offline_scoring.py — Score exported assessments offline, outside the HTTP API.
+
+Reads /api/analyze payloads from NDJSON (one JSON object per line) or CSV and
+writes one output row per input row. Each row holds the five domain scores,
+the 18 features and the three disease risks, computed by the same
+extract_*_features / compute_disease_risks_batch code as the API.
+
+    python -m services.offline_scoring export.ndjson scores.ndjson
+    python -m services.offline_scoring export.csv scores.csv --workers 4 --resume
+
+CSV columns are the payload's field paths (`memory.word_recall_accuracy`,
+`profile.age`, ...). List fields (`reaction_times`, `reaction.times`,
+`tap.intervals`) hold numbers separated by spaces or semicolons, and empty
+cells are missing values. An `id` column or key is copied to the output.
+
+Input is streamed in chunks of --chunk rows. Chunks are scored in a pool of
+--workers processes, each with one vectorised risk computation, and are
+written in input order. At most 2 × workers chunks are in flight, so memory
+stays bounded. After each chunk is written, a checkpoint (<output>.ckpt)
+records the rows done and the output size. --resume truncates the output to
+that size, skips those rows and carries on. A row that cannot be scored
+gets an `error` and no scores.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from models.schemas import AnalyzeRequest
+from services.ai_service import (
+    FEATURE_NAMES, build_feature_vector, compute_disease_risks_batch,
+    extract_executive_features, extract_memory_features, extract_motor_features,
+    extract_reaction_features, extract_speech_features, payload_digest, payload_rng,
+)
+
+CHUNK_ROWS     = 2_000
+LIST_FIELDS    = {"reaction_times", "reaction.times", "tap.intervals"}
+SCORE_COLUMNS  = ["speech_score", "memory_score", "reaction_score", "executive_score", "motor_score"]
+RISK_COLUMNS   = ["alzheimers_risk", "dementia_risk", "parkinsons_risk"]
+OUTPUT_COLUMNS = ["row", "id", *SCORE_COLUMNS, *RISK_COLUMNS, *FEATURE_NAMES, "error"]
+PROGRESS_EVERY = 5.0    # seconds between progress lines on stderr
+
+
+# ── Parsing ───────────────────────────────────────────────────────────────────
+
+def _csv_record(row: dict) -> dict:
+    """Nest dotted CSV columns into an /api/analyze payload."""
+    record: dict = {}
+    for column, value in row.items():
+        if column is None or value is None or value.strip() == "":
+            continue
+        if column in LIST_FIELDS:
+            value = [float(v) for v in value.replace(";", " ").split()]
+        node, *path = column.split(".")
+        target = record
+        while path:
+            target = target.setdefault(node, {})
+            node, *path = path
+        target[node] = value
+    return record
+
+
+def _format(path: str, given: Optional[str]) -> str:
+    fmt = given or ("csv" if path.lower().endswith(".csv") else "ndjson")
+    if fmt not in ("csv", "ndjson"):
+        raise SystemExit(f"unknown format {fmt!r} (csv | ndjson)")
+    return fmt
+
+
+def _read_rows(path: str, fmt: str, skip: int) -> Iterator[Tuple[int, object]]:
+    """(row number, raw row) from the input, starting after the first `skip` rows."""
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = csv.DictReader(f) if fmt == "csv" else (line for line in f if line.strip())
+        for n, raw in enumerate(rows):
+            if n >= skip:
+                yield n, raw
+
+
+def _chunks(rows: Iterator, size: int) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ── Scoring (runs in the worker processes) ─────────────────────────────────────
+
+def score_chunk(fmt: str, rows: List[Tuple[int, object]]) -> List[dict]:
+    """Score one chunk: per-row feature extraction, then one batched risk computation."""
+    out, scored = [], []
+    for n, raw in rows:
+        record = {"row": n, "id": None, "error": None}
+        out.append(record)
+        try:
+            data = _csv_record(raw) if fmt == "csv" else json.loads(raw)
+            record["id"] = data.get("id")
+            payload = AnalyzeRequest.model_validate(data)
+            rng     = payload_rng(payload_digest(payload))      # same fallbacks as the API
+            speech_score,  sf  = extract_speech_features(payload.speech_audio or None, payload.speech)
+            memory_score,  mf  = extract_memory_features(payload.memory_results, payload.memory, rng)
+            reaction_score, rf = extract_reaction_features(payload.reaction_times, payload.reaction)
+            exec_score,    ef  = extract_executive_features(payload.stroop, rng)
+            motor_score,   mof = extract_motor_features(payload.tap, rng)
+            fv = build_feature_vector(sf, mf, rf, ef, mof)
+        except ValidationError as exc:
+            err = exc.errors()[0]
+            record["error"] = f"invalid at {'.'.join(map(str, err['loc'])) or 'row'}: {err['msg']}"
+            continue
+        except Exception as exc:
+            record["error"] = f"{type(exc).__name__}: {exc}"
+            continue
+        scored.append((record, (speech_score, memory_score, reaction_score, exec_score, motor_score), fv, payload.profile))
+
+    try:
+        risks = compute_disease_risks_batch([(fv, profile) for _, _, fv, profile in scored])
+    except Exception:
+        # One bad row fails the whole product; score the rows one by one to isolate it.
+        risks = []
+        for record, _, fv, profile in scored:
+            try:
+                [r] = compute_disease_risks_batch([(fv, profile)])
+            except Exception as exc:
+                record["error"], r = f"{type(exc).__name__}: {exc}", None
+            risks.append(r)
+    for (record, scores, fv, _), r in zip(scored, risks):
+        if r is None:
+            continue
+        record.update(zip(SCORE_COLUMNS, scores))
+        record.update(fv.model_dump())
+        record.update(r)
+    return out
+
+
+# ── Output + checkpoint ───────────────────────────────────────────────────────
+
+class _Output:
+    def __init__(self, path: str, fmt: str, resume_bytes: Optional[int]):
+        self.fmt  = fmt
+        self.f    = open(path, "a" if resume_bytes is not None else "w", newline="", encoding="utf-8")
+        if resume_bytes is not None:
+            self.f.truncate(resume_bytes)      # drop anything written after the checkpoint
+            self.f.seek(resume_bytes)
+        self.csv = csv.DictWriter(self.f, OUTPUT_COLUMNS, extrasaction="ignore") if fmt == "csv" else None
+        if self.csv and not resume_bytes:
+            self.csv.writeheader()
+
+    def write(self, records: List[dict]) -> int:
+        if self.csv:
+            self.csv.writerows(records)
+        else:
+            self.f.writelines(json.dumps(r) + "\n" for r in records)
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+
+def _load_checkpoint(path: str, input_path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            ckpt = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if ckpt.get("input") != os.path.abspath(input_path):
+        raise SystemExit(f"{path} belongs to another input ({ckpt.get('input')})")
+    return ckpt
+
+
+def _save_checkpoint(path: str, input_path: str, rows_done: int, output_bytes: int):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"input": os.path.abspath(input_path), "rows_done": rows_done, "output_bytes": output_bytes}, f)
+    os.replace(tmp, path)
+
+
+# ── Driver ────────────────────────────────────────────────────────────────────
+
+class _Done:
+    """Stand-in future for the single-process path."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
+
+
+def run(input_path: str, output_path: str, in_fmt: str, out_fmt: str, workers: int,
+        chunk_rows: int = CHUNK_ROWS, resume: bool = False, log=sys.stderr) -> dict:
+    """Score `input_path` into `output_path`. Returns {"rows", "errors", "seconds", "rows_per_sec"}."""
+    ckpt_path = output_path + ".ckpt"
+    ckpt      = _load_checkpoint(ckpt_path, input_path) if resume else None
+    done      = ckpt["rows_done"] if ckpt else 0
+    out       = _Output(output_path, out_fmt, ckpt["output_bytes"] if ckpt else None)
+    if ckpt:
+        print(f"resuming after {done} rows", file=log)
+
+    pool     = ProcessPoolExecutor(workers) if workers > 1 else None
+    inflight: deque = deque()
+    rows = errors = 0
+    start = last_report = time.perf_counter()
+
+    def drain_one():
+        nonlocal done, rows, errors, last_report
+        records = inflight.popleft().result()
+        size    = out.write(records)
+        done   += len(records)
+        rows   += len(records)
+        errors += sum(r["error"] is not None for r in records)
+        _save_checkpoint(ckpt_path, input_path, done, size)
+        now = time.perf_counter()
+        if now - last_report >= PROGRESS_EVERY:
+            print(f"{done} rows, {rows / (now - start):.0f} rows/s", file=log)
+            last_report = now
+
+    try:
+        for chunk in _chunks(_read_rows(input_path, in_fmt, done), chunk_rows):
+            if pool:
+                inflight.append(pool.submit(score_chunk, in_fmt, chunk))
+            else:
+                inflight.append(_Done(score_chunk(in_fmt, chunk)))
+            while len(inflight) > 2 * workers:
+                drain_one()
+        while inflight:
+            drain_one()
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        out.close()
+
+    seconds = time.perf_counter() - start
+    summary = {"rows": rows, "errors": errors, "seconds": round(seconds, 2),
+               "rows_per_sec": round(rows / seconds) if seconds > 0 else 0}
+    print(f"scored {rows} rows ({errors} errors) in {seconds:.1f} s — {summary['rows_per_sec']} rows/s", file=log)
+    return summary
+
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(prog="python -m services.offline_scoring",
+                                     description="Score exported /api/analyze payloads offline.")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--input-format", choices=["ndjson", "csv"], help="default: from the file extension")
+    parser.add_argument("--output-format", choices=["ndjson", "csv"], help="default: from the file extension")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=CHUNK_ROWS, help="rows per scoring chunk")
+    parser.add_argument("--resume", action="store_true", help="continue from <output>.ckpt")
+    args = parser.parse_args(argv)
+
+    run(args.input, args.output,
+        _format(args.input, args.input_format), _format(args.output, args.output_format),
+        max(1, args.workers), max(1, args.chunk), args.resume)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
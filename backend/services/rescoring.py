@@ -0,0 +1,123 @@
+"""
+rescoring.py — Re-score stored assessment results under the current model.
+
+Every result stored by /api/analyze keeps its 18 features, the profile and
+conditions it was scored with, and the MODEL_VERSION that scored it. When the
+model weights, feature scaling or clinical_config weights change,
+MODEL_VERSION changes too. This job brings stored history up to date:
+
+    python -m services.rescoring               # re-score results not at MODEL_VERSION
+    python -m services.rescoring --dry-run     # score and report, write nothing
+
+All pending results are stacked into one (N × 18) matrix and scored in a
+single vectorised pass. That pass covers disease risks, condition
+multipliers, the hybrid blend, risk levels and composite risk. Each result
+is then updated in place under the new version. The values it replaces are
+appended to the result's `previous_versions`.
+
+Writes go out in short transactions of --batch results, with a --pause-ms
+gap after each one. Without the gap, a live write polling for the lock
+(SQLite's busy handler backs off to 100 ms) keeps missing it, and waits
+up to a second. With the defaults, the server's appends wait at most
+~50 ms while the job runs. Reads are never blocked (WAL). The API never
+rewrites a stored result, so the job cannot overwrite a concurrent change.
+Running it again only picks up results that are still behind. Results
+stored before features were kept cannot be re-scored; they are counted and
+left alone.
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime
+from typing import List
+
+import numpy as np
+
+from core.clinical_config import CONDITION_MULTIPLIERS, MAX_RISK_CAP
+from core.ml_engine import compute_hybrid_risk
+from models.schemas import UserProfile
+from services.ai_service import (
+    DOMAINS, MODEL_VERSION, _compute_composite_risk, _prob_to_level, disease_risk_matrix,
+)
+from storage import db
+
+WRITE_BATCH = 100
+WRITE_PAUSE = 0.01     # seconds between write transactions, so queued live writes get the lock
+
+
+def rescore(rows: List[dict]) -> List[dict]:
+    """New RESCORED fields for rows from db.results_to_rescore, in one vectorised pass."""
+    if not rows:
+        return []
+    features = np.array([r["features"] for r in rows], dtype=float)
+    profiles = [UserProfile(**r["profile"]) if r["profile"] is not None else None for r in rows]
+    base     = disease_risk_matrix(features, profiles)
+
+    # apply_condition_multipliers for the whole matrix: R × (1 + Σγ), capped
+    gamma    = np.array([sum(CONDITION_MULTIPLIERS.get(c, 0.0) for c in r["conditions"] or []) for r in rows])
+    adjusted = np.minimum(base * (1 + gamma)[:, None], MAX_RISK_CAP)
+
+    domains    = np.array([[r[f"{d}_score"] for d in DOMAINS] for r in rows], dtype=float)
+    composites = _compute_composite_risk(domains)
+
+    return [
+        {
+            "model_version":        MODEL_VERSION,
+            "alzheimers_risk":      alz,
+            "dementia_risk":        dem,
+            "parkinsons_risk":      park,
+            "hybrid_risk":          compute_hybrid_risk(alz, alz_base),
+            "composite_risk_score": composite,
+            "risk_levels": {
+                "alzheimers": _prob_to_level(alz),
+                "dementia":   _prob_to_level(dem),
+                "parkinsons": _prob_to_level(park),
+            },
+        }
+        for (alz, dem, park), alz_base, composite in zip(adjusted.tolist(), base[:, 0].tolist(), composites)
+    ]
+
+
+def run(batch: int = WRITE_BATCH, pause: float = WRITE_PAUSE, dry_run: bool = False, log=sys.stderr) -> dict:
+    """Re-score every stored result behind MODEL_VERSION. Returns counts and timings."""
+    t0 = time.perf_counter()
+    rows, legacy = db.results_to_rescore(MODEL_VERSION)
+    t1 = time.perf_counter()
+    scored = rescore(rows)
+    t2 = time.perf_counter()
+    print(f"model {MODEL_VERSION}: {len(rows)} results to re-score ({legacy} legacy skipped); "
+          f"read {t1 - t0:.2f} s, scored {t2 - t1:.2f} s", file=log)
+
+    updated = 0
+    if not dry_run:
+        rescored_at = datetime.utcnow().isoformat()
+        for start in range(0, len(rows), batch):
+            updates = [
+                (r["user_id"], r["seq"], {**fields, "rescored_at": rescored_at},
+                 {f: r[f] for f in db.RESCORED})
+                for r, fields in zip(rows[start:start + batch], scored[start:start + batch])
+            ]
+            with db.transaction() as conn:
+                updated += db.rescore_results(updates, conn)
+            time.sleep(pause)
+    t3 = time.perf_counter()
+    if not dry_run:
+        print(f"updated {updated} results in {t3 - t2:.2f} s", file=log)
+    return {"model_version": MODEL_VERSION, "pending": len(rows), "legacy": legacy, "updated": updated,
+            "read_s": round(t1 - t0, 3), "score_s": round(t2 - t1, 3), "write_s": round(t3 - t2, 3)}
+
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(prog="python -m services.rescoring",
+                                     description="Re-score stored results under the current model version.")
+    parser.add_argument("--batch", type=int, default=WRITE_BATCH, help="results per write transaction")
+    parser.add_argument("--pause-ms", type=float, default=WRITE_PAUSE * 1000, help="pause between write transactions")
+    parser.add_argument("--dry-run", action="store_true", help="score and report, write nothing")
+    args = parser.parse_args(argv)
+    run(max(1, args.batch), max(0.0, args.pause_ms) / 1000, args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
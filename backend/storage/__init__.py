@@ -0,0 +1 @@
+"""Shared persistence layer for MindSaathi (SQLite, WAL mode)."""
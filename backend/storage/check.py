@@ -0,0 +1,42 @@
+"""
+check.py — Consistency check for state derived from the stored logs.
+
+Two kinds of state are updated incrementally and can be recomputed from
+scratch:
+
+  - per-user unread counters, updated on every send, read and delete
+  - per-user running progress statistics, updated on every stored result
+
+This recomputes both and reports any drift:
+
+    python -m storage.check            # report only
+    python -m storage.check --repair   # report, then rebuild what is off
+"""
+
+import sys
+
+from storage import db
+
+
+def main(argv: list) -> int:
+    repair = "--repair" in argv
+    drift  = db.check_unread_counts(repair=repair)
+    for uid, c in sorted(drift.items()):
+        print(f"{uid}: stored={c['stored']} actual={c['actual']}")
+    if not drift:
+        print("unread counters consistent")
+    elif repair:
+        print(f"rebuilt unread counters ({len(drift)} users were off)")
+
+    progress = db.check_progress_stats(repair=repair)
+    for uid, fields in sorted(progress.items()):
+        print(f"{uid}: progress off in {', '.join(fields)}")
+    if not progress:
+        print("progress statistics consistent")
+    elif repair:
+        print(f"rebuilt progress statistics ({len(progress)} users were off)")
+    return 1 if (drift or progress) and not repair else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
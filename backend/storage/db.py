@@ -0,0 +1,1048 @@
+"""
+db.py — MindSaathi Storage Engine
+Single SQLite database (WAL mode) shared by every router.
+
+Replaces the per-router JSON `_load` / `_save` helpers: a request now reads and
+writes only the rows it touches instead of re-parsing and rewriting whole data
+files. Records are kept as JSON documents next to the indexed columns used for
+lookups, so router code keeps working with plain dicts.
+
+Tables:
+  users            id → user document               (idx: role · unique email+role)
+  sessions         token → user_id + created / last-seen times (idx: user_id)
+  token_denylist   revoked signed tokens until their expiry
+  results          per-user assessment history      (clustered: user_id, seq)
+  game_sessions    per-user game history            (clustered: user_id, seq · idx: game_id, score)
+  shards           per-user directory: next seq + row count for each history table
+  messages         append-only doctor ↔ patient log (idx: conversation · recipient · sender)
+  message_reads    per-user read watermark for each conversation
+  message_deletes  per-user "delete for me" marks
+  unread_counts    per-user unread total, kept in step with the three above
+  progress_stats   per-user running progress statistics, kept in step with results
+  content          doctor-authored passages / word sets (idx: kind)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.progress_tracker import (
+    new_progress_state, progress_state_add, progress_state_drift, progress_state_from,
+    progress_state_remove,
+)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+DB_PATH  = os.getenv("MINDSAATHI_DB_PATH", os.path.join(DATA_DIR, "mindsaathi.db"))
+os.makedirs(os.path.dirname(os.path.abspath(DB_PATH)), exist_ok=True)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    id    TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    role  TEXT NOT NULL DEFAULT 'patient',
+    doc   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email_role ON users(email, role);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    token      TEXT PRIMARY KEY,
+    user_id    TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    created_ts REAL NOT NULL DEFAULT 0,    -- epoch seconds, for the absolute TTL
+    last_seen  REAL NOT NULL DEFAULT 0     -- epoch seconds, for the idle TTL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id);
+
+-- Revoked signed tokens (AUTH_TOKEN_MODE=signed), kept only until they expire.
+CREATE TABLE IF NOT EXISTS token_denylist (
+    jti        TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+
+-- History tables are WITHOUT ROWID and keyed (user_id, seq): each user's rows
+-- sit together in the B-tree, so reads, appends and trims touch only that
+-- user's partition no matter how many patients exist.
+CREATE TABLE IF NOT EXISTS results (
+    user_id TEXT    NOT NULL,
+    seq     INTEGER NOT NULL,
+    doc     TEXT    NOT NULL,
+    PRIMARY KEY (user_id, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS game_sessions (
+    user_id     TEXT    NOT NULL,
+    seq         INTEGER NOT NULL,
+    game_id     TEXT    NOT NULL,
+    final_score REAL,
+    doc         TEXT    NOT NULL,
+    PRIMARY KEY (user_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_game_sessions_game ON game_sessions(game_id, final_score);
+
+CREATE TABLE IF NOT EXISTS shards (
+    user_id  TEXT    NOT NULL,
+    kind     TEXT    NOT NULL,          -- history table name
+    next_seq INTEGER NOT NULL,
+    count    INTEGER NOT NULL,
+    PRIMARY KEY (user_id, kind)
+) WITHOUT ROWID;
+
+-- Messages are an append-only log: a row is never rewritten once sent. `conv`
+-- is the unordered pair key, so one conversation is one contiguous index range.
+-- Per-user state lives beside the log: a read watermark per conversation
+-- (opening a chat marks everything up to it read) and per-user deletions.
+CREATE TABLE IF NOT EXISTS messages (
+    seq          INTEGER PRIMARY KEY AUTOINCREMENT,
+    id           TEXT NOT NULL UNIQUE,
+    conv         TEXT NOT NULL,
+    sender_id    TEXT NOT NULL,
+    recipient_id TEXT NOT NULL,
+    doc          TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_conv      ON messages(conv, seq);
+CREATE INDEX IF NOT EXISTS idx_messages_recipient ON messages(recipient_id, seq);
+CREATE INDEX IF NOT EXISTS idx_messages_sender    ON messages(sender_id, seq);
+
+CREATE TABLE IF NOT EXISTS message_reads (
+    user_id  TEXT    NOT NULL,
+    other_id TEXT    NOT NULL,
+    read_seq INTEGER NOT NULL,          -- incoming messages with seq <= read_seq are read
+    PRIMARY KEY (user_id, other_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS message_deletes (
+    user_id TEXT    NOT NULL,
+    seq     INTEGER NOT NULL,
+    PRIMARY KEY (user_id, seq)
+) WITHOUT ROWID;
+
+-- Maintained incrementally by send / read / delete (checked by check_unread_counts).
+CREATE TABLE IF NOT EXISTS unread_counts (
+    user_id TEXT    PRIMARY KEY,
+    count   INTEGER NOT NULL
+) WITHOUT ROWID;
+
+-- core.progress_tracker running state over each user's retained results,
+-- maintained by append_result / rescore_results (checked by check_progress_stats).
+CREATE TABLE IF NOT EXISTS progress_stats (
+    user_id TEXT PRIMARY KEY,
+    state   TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS content (
+    seq  INTEGER PRIMARY KEY AUTOINCREMENT,
+    id   TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    doc  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_content_kind ON content(kind, seq);
+"""
+
+# content.kind values ↔ keys of the legacy custom_content.json document
+CONTENT_KINDS = {"passage": "passages", "word_set": "word_sets"}
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+# ── Schema migrations ─────────────────────────────────────────────────────────
+# A fresh database gets SCHEMA at the latest version; an older one is brought
+# forward step by step, all inside one write transaction. Each step creates
+# only the objects it introduces, as they were at that version: SCHEMA
+# describes the latest layout, which an intermediate version does not have yet.
+# It is applied once, after the last step.
+
+def _v2_shard_histories(conn: sqlite3.Connection):
+    """Rebuild results / game_sessions clustered by (user_id, seq) + fill `shards`."""
+    conn.execute("ALTER TABLE results RENAME TO results_v1")
+    conn.execute("ALTER TABLE game_sessions RENAME TO game_sessions_v1")
+    conn.execute("DROP INDEX IF EXISTS idx_results_user")
+    conn.execute("DROP INDEX IF EXISTS idx_game_sessions_user")
+    conn.execute("DROP INDEX IF EXISTS idx_game_sessions_game")
+    _apply_schema(conn, """
+        CREATE TABLE results (
+            user_id TEXT    NOT NULL,
+            seq     INTEGER NOT NULL,
+            doc     TEXT    NOT NULL,
+            PRIMARY KEY (user_id, seq)
+        ) WITHOUT ROWID;
+        CREATE TABLE game_sessions (
+            user_id     TEXT    NOT NULL,
+            seq         INTEGER NOT NULL,
+            game_id     TEXT    NOT NULL,
+            final_score REAL,
+            doc         TEXT    NOT NULL,
+            PRIMARY KEY (user_id, seq)
+        ) WITHOUT ROWID;
+        CREATE INDEX idx_game_sessions_game ON game_sessions(game_id, final_score);
+        CREATE TABLE shards (
+            user_id  TEXT    NOT NULL,
+            kind     TEXT    NOT NULL,
+            next_seq INTEGER NOT NULL,
+            count    INTEGER NOT NULL,
+            PRIMARY KEY (user_id, kind)
+        ) WITHOUT ROWID;
+    """)
+    conn.execute(
+        "INSERT INTO results (user_id, seq, doc) "
+        "SELECT user_id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY seq), doc FROM results_v1"
+    )
+    conn.execute(
+        "INSERT INTO game_sessions (user_id, seq, game_id, final_score, doc) "
+        "SELECT user_id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY seq), "
+        "       game_id, final_score, doc FROM game_sessions_v1"
+    )
+    for table in HISTORY_TABLES:
+        conn.execute(
+            f"INSERT INTO shards (user_id, kind, next_seq, count) "
+            f"SELECT user_id, '{table}', MAX(seq) + 1, COUNT(*) FROM {table} GROUP BY user_id"
+        )
+    conn.execute("DROP TABLE results_v1")
+    conn.execute("DROP TABLE game_sessions_v1")
+
+
+def _v3_message_log(conn: sqlite3.Connection):
+    """Make messages append-only: pair key column, read/delete state moved out of the doc."""
+    conn.execute("ALTER TABLE messages RENAME TO messages_v2")
+    conn.execute("DROP INDEX IF EXISTS idx_messages_pair")
+    conn.execute("DROP INDEX IF EXISTS idx_messages_recipient")
+    _apply_schema(conn, """
+        CREATE TABLE messages (
+            seq          INTEGER PRIMARY KEY AUTOINCREMENT,
+            id           TEXT NOT NULL UNIQUE,
+            conv         TEXT NOT NULL,
+            sender_id    TEXT NOT NULL,
+            recipient_id TEXT NOT NULL,
+            doc          TEXT NOT NULL
+        );
+        CREATE INDEX idx_messages_conv      ON messages(conv, seq);
+        CREATE INDEX idx_messages_recipient ON messages(recipient_id, seq);
+        CREATE INDEX idx_messages_sender    ON messages(sender_id, seq);
+        CREATE TABLE message_reads (
+            user_id  TEXT    NOT NULL,
+            other_id TEXT    NOT NULL,
+            read_seq INTEGER NOT NULL,
+            PRIMARY KEY (user_id, other_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE message_deletes (
+            user_id TEXT    NOT NULL,
+            seq     INTEGER NOT NULL,
+            PRIMARY KEY (user_id, seq)
+        ) WITHOUT ROWID;
+    """)
+    conn.execute(
+        "INSERT INTO messages (seq, id, conv, sender_id, recipient_id, doc) "
+        "SELECT seq, id, "
+        "       MIN(sender_id, recipient_id) || '|' || MAX(sender_id, recipient_id), "
+        "       sender_id, recipient_id, json_remove(doc, '$.read_by', '$.deleted_by') "
+        "FROM messages_v2"
+    )
+    conn.execute(
+        "INSERT INTO message_reads (user_id, other_id, read_seq) "
+        "SELECT m.recipient_id, m.sender_id, MAX(m.seq) FROM messages_v2 m "
+        "WHERE EXISTS (SELECT 1 FROM json_each(m.doc, '$.read_by') r WHERE r.value = m.recipient_id) "
+        "GROUP BY m.recipient_id, m.sender_id"
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO message_deletes (user_id, seq) "
+        "SELECT d.value, m.seq FROM messages_v2 m, json_each(m.doc, '$.deleted_by') d"
+    )
+    conn.execute("DROP TABLE messages_v2")
+
+
+def _v4_unread_counts(conn: sqlite3.Connection):
+    """Add the per-user unread counters, seeded from the message log."""
+    _apply_schema(conn, """
+        CREATE TABLE unread_counts (
+            user_id TEXT    PRIMARY KEY,
+            count   INTEGER NOT NULL
+        ) WITHOUT ROWID;
+    """)
+    rebuild_unread_counts(conn)
+
+
+def _v5_session_expiry(conn: sqlite3.Connection):
+    """Timestamps for session TTLs. Existing sessions keep their age but start a fresh idle window."""
+    conn.execute("ALTER TABLE sessions ADD COLUMN created_ts REAL NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE sessions ADD COLUMN last_seen REAL NOT NULL DEFAULT 0")
+    now = time.time()
+    conn.execute(
+        "UPDATE sessions SET "
+        "created_ts = COALESCE((julianday(created_at) - 2440587.5) * 86400, ?), last_seen = ?",
+        (now, now),
+    )
+
+
+def _v6_progress_stats(conn: sqlite3.Connection):
+    """Add the per-user running progress statistics, seeded from stored results."""
+    _apply_schema(conn, """
+        CREATE TABLE progress_stats (
+            user_id TEXT PRIMARY KEY,
+            state   TEXT NOT NULL
+        ) WITHOUT ROWID;
+    """)
+    rebuild_progress_stats(conn)
+
+
+MIGRATIONS = [
+    (2, _v2_shard_histories),
+    (3, _v3_message_log),
+    (4, _v4_unread_counts),
+    (5, _v5_session_expiry),
+    (6, _v6_progress_stats),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+HISTORY_TABLES = ("results", "game_sessions")
+
+
+def _apply_schema(conn: sqlite3.Connection, ddl: str = SCHEMA):
+    # Statement by statement: executescript() would commit the open transaction.
+    for stmt in ddl.split(";"):
+        if stmt.strip():
+            conn.execute(stmt)
+
+
+def _init_schema(conn: sqlite3.Connection):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        fresh = not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'meta'"
+        ).fetchone()
+        if fresh:
+            _apply_schema(conn)
+            version = SCHEMA_VERSION
+        else:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+            version = int(row["value"]) if row else 1
+        for target, step in MIGRATIONS:
+            if target > version:
+                step(conn)
+                version = target
+        _apply_schema(conn)   # latest layout + objects added without a data migration (all IF NOT EXISTS)
+        set_meta("schema_version", str(version), conn)
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+# ── Connection handling ───────────────────────────────────────────────────────
+
+def _dumps(doc) -> str:
+    return json.dumps(doc, separators=(",", ":"))
+
+
+def connect() -> sqlite3.Connection:
+    """Open a new connection (schema is created on the first one)."""
+    global _schema_ready
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    with _schema_lock:
+        if not _schema_ready:
+            _init_schema(conn)
+            _schema_ready = True
+    return conn
+
+
+def get_conn() -> sqlite3.Connection:
+    """One connection per thread (FastAPI runs sync routes in a thread pool)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = connect()
+        _local.conn = conn
+    return conn
+
+
+@contextmanager
+def transaction():
+    """
+    Read-modify-write block. BEGIN IMMEDIATE takes the write lock up front so
+    overlapping requests serialize instead of silently overwriting each other.
+    """
+    conn = get_conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def get_meta(key: str) -> Optional[str]:
+    row = get_conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row["value"] if row else None
+
+
+def set_meta(key: str, value: str, conn: Optional[sqlite3.Connection] = None):
+    (conn or get_conn()).execute(
+        "INSERT INTO meta (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, value),
+    )
+
+
+# ── Users ─────────────────────────────────────────────────────────────────────
+
+def get_user(user_id: str) -> Optional[dict]:
+    row = get_conn().execute("SELECT doc FROM users WHERE id = ?", (user_id,)).fetchone()
+    return json.loads(row["doc"]) if row else None
+
+
+def get_users(user_ids: Iterable[str]) -> Dict[str, dict]:
+    ids = list(dict.fromkeys(i for i in user_ids if i))
+    if not ids:
+        return {}
+    marks = ",".join("?" * len(ids))
+    rows  = get_conn().execute(f"SELECT id, doc FROM users WHERE id IN ({marks})", ids)
+    return {r["id"]: json.loads(r["doc"]) for r in rows}
+
+
+def list_users(role: Optional[str] = None) -> List[dict]:
+    if role:
+        rows = get_conn().execute("SELECT doc FROM users WHERE role = ?", (role,))
+    else:
+        rows = get_conn().execute("SELECT doc FROM users")
+    return [json.loads(r["doc"]) for r in rows]
+
+
+def find_user_by_email(email: str, role: Optional[str] = None) -> Optional[dict]:
+    """
+    Point lookup on the unique (email, role) index, maintained by SQLite in the
+    same transaction as every user write. Without a role, returns the oldest
+    account registered under that email.
+    """
+    email = email.lower()
+    if role:
+        row = get_conn().execute(
+            "SELECT doc FROM users WHERE email = ? AND role = ?", (email, role)
+        ).fetchone()
+    else:
+        row = get_conn().execute(
+            "SELECT doc FROM users WHERE email = ? ORDER BY rowid LIMIT 1", (email,)
+        ).fetchone()
+    return json.loads(row["doc"]) if row else None
+
+
+def save_user(user: dict, conn: Optional[sqlite3.Connection] = None):
+    """Insert or replace a single user document."""
+    (conn or get_conn()).execute(
+        "INSERT INTO users (id, email, role, doc) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET email = excluded.email, role = excluded.role, doc = excluded.doc",
+        (user["id"], user.get("email", "").lower(), user.get("role", "patient"), _dumps(user)),
+    )
+
+
+# ── Sessions ──────────────────────────────────────────────────────────────────
+
+def create_session(token: str, user_id: str, now: float, conn: Optional[sqlite3.Connection] = None):
+    (conn or get_conn()).execute(
+        "INSERT INTO sessions (token, user_id, created_at, created_ts, last_seen) VALUES (?, ?, ?, ?, ?)",
+        (token, user_id, datetime.utcfromtimestamp(now).isoformat(), now, now),
+    )
+
+
+def get_session(token: str) -> Optional[dict]:
+    row = get_conn().execute(
+        "SELECT user_id, created_at, created_ts, last_seen FROM sessions WHERE token = ?", (token,)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def touch_session(token: str, now: float, conn: Optional[sqlite3.Connection] = None):
+    (conn or get_conn()).execute(
+        "UPDATE sessions SET last_seen = MAX(last_seen, ?) WHERE token = ?", (now, token)
+    )
+
+
+def delete_session(token: str) -> bool:
+    cur = get_conn().execute("DELETE FROM sessions WHERE token = ?", (token,))
+    return cur.rowcount > 0
+
+
+def delete_expired_sessions(created_before: float, seen_before: float,
+                            conn: Optional[sqlite3.Connection] = None) -> int:
+    """Drop sessions past their absolute or idle lifetime. Returns how many went."""
+    cur = (conn or get_conn()).execute(
+        "DELETE FROM sessions WHERE created_ts < ? OR last_seen < ?", (created_before, seen_before)
+    )
+    return cur.rowcount
+
+
+def count_sessions() -> int:
+    return get_conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def deny_token(jti: str, expires_at: float, conn: Optional[sqlite3.Connection] = None):
+    (conn or get_conn()).execute(
+        "INSERT OR IGNORE INTO token_denylist (jti, expires_at) VALUES (?, ?)", (jti, expires_at)
+    )
+
+
+def load_denylist(now: float) -> Dict[str, float]:
+    rows = get_conn().execute(
+        "SELECT jti, expires_at FROM token_denylist WHERE expires_at > ?", (now,)
+    )
+    return {r["jti"]: r["expires_at"] for r in rows}
+
+
+def delete_expired_denials(now: float, conn: Optional[sqlite3.Connection] = None) -> int:
+    cur = (conn or get_conn()).execute("DELETE FROM token_denylist WHERE expires_at <= ?", (now,))
+    return cur.rowcount
+
+
+# ── Cursor pagination ─────────────────────────────────────────────────────────
+
+def _page(conn: sqlite3.Connection, sql: str, params: tuple,
+          before: Optional[int], after: Optional[int], limit: int) -> Tuple[list, bool]:
+    """
+    One page of `sql` (a SELECT with a `seq` column and an open WHERE clause)
+    keyed on seq, returned oldest first. `after` pages forward from a cursor;
+    otherwise the newest `limit` rows (below `before`, if given) are returned.
+    Served by the (…, seq) index, so a page costs O(limit) whatever the
+    history length. The bool says whether more rows exist in that direction.
+    """
+    if after is not None:
+        sql, params, order = f"{sql} AND seq > ?", (*params, after), "ASC"
+    else:
+        order = "DESC"
+        if before is not None:
+            sql, params = f"{sql} AND seq < ?", (*params, before)
+    rows = conn.execute(f"{sql} ORDER BY seq {order} LIMIT ?", (*params, limit + 1)).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if order == "DESC":
+        rows.reverse()
+    return rows, more
+
+
+# ── Per-user history partitions ───────────────────────────────────────────────
+
+def _shard_append(conn: sqlite3.Connection, table: str, user_id: str, columns: dict, keep: int) -> List[str]:
+    """
+    Append one row to a user's partition of `table` and trim it to the newest
+    `keep` rows. The `shards` directory entry supplies the next sequence number
+    and row count, so neither the append nor the trim scans the partition.
+    Returns the documents trimmed, oldest first.
+    """
+    row = conn.execute(
+        "SELECT next_seq, count FROM shards WHERE user_id = ? AND kind = ?", (user_id, table)
+    ).fetchone()
+    seq, count = (row["next_seq"], row["count"]) if row else (1, 0)
+
+    cols  = ["user_id", "seq", *columns]
+    marks = ",".join("?" * len(cols))
+    conn.execute(
+        f"INSERT INTO {table} ({','.join(cols)}) VALUES ({marks})",
+        (user_id, seq, *columns.values()),
+    )
+    trimmed = []
+    if count + 1 > keep:
+        trimmed = conn.execute(
+            f"DELETE FROM {table} WHERE user_id = ? AND seq <= ? RETURNING seq, doc", (user_id, seq - keep)
+        ).fetchall()
+    conn.execute(
+        "INSERT INTO shards (user_id, kind, next_seq, count) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(user_id, kind) DO UPDATE SET next_seq = excluded.next_seq, count = excluded.count",
+        (user_id, table, seq + 1, min(count + 1, keep)),
+    )
+    return [r["doc"] for r in sorted(trimmed, key=lambda r: r["seq"])]
+
+
+# ── Assessment results ────────────────────────────────────────────────────────
+
+def get_results(user_id: str) -> List[dict]:
+    """A user's assessment history, oldest first (one range scan of their partition)."""
+    rows = get_conn().execute(
+        "SELECT doc FROM results WHERE user_id = ? ORDER BY seq", (user_id,)
+    )
+    return [json.loads(r["doc"]) for r in rows]
+
+
+def results_page(user_id: str, before: Optional[int] = None, after: Optional[int] = None,
+                 limit: int = 20) -> Tuple[List[dict], bool]:
+    """One page of a user's results, oldest first, each with its `seq` cursor."""
+    rows, more = _page(
+        get_conn(), "SELECT seq, doc FROM results WHERE user_id = ?", (user_id,), before, after, limit
+    )
+    return [{**json.loads(r["doc"]), "seq": r["seq"]} for r in rows], more
+
+
+def _stored_since(conn: sqlite3.Connection, user_id: str, payload_hash: str, since: str) -> bool:
+    """Whether the user has a result for the same payload stored at or after `since` (ISO time)."""
+    return conn.execute(
+        "SELECT 1 FROM results WHERE user_id = ? "
+        "AND json_extract(doc, '$.payload_hash') = ? AND json_extract(doc, '$.timestamp') >= ? LIMIT 1",
+        (user_id, payload_hash, since),
+    ).fetchone() is not None
+
+
+def append_result(user_id: str, record: dict, keep: int, conn: sqlite3.Connection,
+                  dedup_since: Optional[str] = None) -> bool:
+    """
+    Append one result and trim the user's history to the newest `keep`,
+    updating their progress state to match. With `dedup_since`, a result
+    whose payload_hash the user already has from that time on is not stored
+    again (a retried submission). Returns whether the result was appended.
+    """
+    if dedup_since and record.get("payload_hash") and \
+            _stored_since(conn, user_id, record["payload_hash"], dedup_since):
+        return False
+    trimmed = _shard_append(conn, "results", user_id, {"doc": _dumps(record)}, keep)
+    state   = _progress_state(conn, user_id) or new_progress_state()
+    for doc in trimmed:
+        progress_state_remove(state, json.loads(doc))
+    progress_state_add(state, record)
+    _save_progress_state(conn, user_id, state)
+    return True
+
+
+def append_results(rows: List[Tuple[str, dict]], keep: int, conn: sqlite3.Connection,
+                   dedup_since: Optional[str] = None) -> List[bool]:
+    """append_result for several (user_id, result) pairs, in order. Returns whether each was appended."""
+    return [append_result(user_id, record, keep, conn, dedup_since) for user_id, record in rows]
+
+
+RESCORE_INPUTS = ("features", "profile", "conditions", "speech_score", "memory_score",
+                  "reaction_score", "executive_score", "motor_score")
+RESCORED       = ("model_version", "alzheimers_risk", "dementia_risk", "parkinsons_risk",
+                  "hybrid_risk", "composite_risk_score", "risk_levels")
+
+
+def results_to_rescore(model_version: str) -> Tuple[List[dict], int]:
+    """
+    (rows, legacy count). One row per stored result that has model inputs
+    but was not scored by `model_version`: user_id, seq, RESCORE_INPUTS and
+    the current RESCORED values, pulled out with json_extract so whole
+    documents are never loaded. Legacy results (stored before features
+    were kept) cannot be re-scored and are only counted.
+    """
+    conn = get_conn()
+    cols = ", ".join(f"json_extract(doc, '$.{f}') AS {f}" for f in (*RESCORE_INPUTS, *RESCORED))
+    rows = conn.execute(
+        f"SELECT user_id, seq, {cols} FROM results "
+        f"WHERE json_extract(doc, '$.features') IS NOT NULL "
+        f"AND json_extract(doc, '$.model_version') IS NOT ?",
+        (model_version,),
+    ).fetchall()
+    legacy = conn.execute(
+        "SELECT COUNT(*) FROM results WHERE json_extract(doc, '$.features') IS NULL"
+    ).fetchone()[0]
+    out = []
+    for r in rows:
+        row = dict(r)
+        for f in ("features", "profile", "conditions", "risk_levels"):
+            if row[f] is not None:
+                row[f] = json.loads(row[f])
+        out.append(row)
+    return out, legacy
+
+
+def rescore_results(updates: List[Tuple[str, int, dict, dict]], conn: sqlite3.Connection) -> int:
+    """
+    Write re-scored results in place: (user_id, seq, new fields, previous
+    fields). The new fields are merged into the document and the previous
+    ones appended to its `previous_versions`. Results trimmed meanwhile are
+    skipped. The progress state of every user touched is rebuilt. Returns the
+    number of results updated.
+    """
+    updated = 0
+    for user_id, seq, fields, previous in updates:
+        updated += conn.execute(
+            "UPDATE results SET doc = json_set(json_patch(doc, ?), '$.previous_versions', "
+            "  json_insert(COALESCE(json_extract(doc, '$.previous_versions'), '[]'), '$[#]', json(?))) "
+            "WHERE user_id = ? AND seq = ?",
+            (_dumps(fields), _dumps(previous), user_id, seq),
+        ).rowcount
+    rebuild_progress_stats(conn, {user_id for user_id, *_ in updates})
+    return updated
+
+
+def result_summaries(user_ids: Iterable[str]) -> Dict[str, dict]:
+    """{user_id: {"count", "last"}} for each user that has at least one result."""
+    ids = list(dict.fromkeys(user_ids))
+    if not ids:
+        return {}
+    marks = ",".join("?" * len(ids))
+    rows  = get_conn().execute(
+        f"SELECT s.user_id, s.count, r.doc FROM shards s "
+        f"JOIN results r ON r.user_id = s.user_id AND r.seq = s.next_seq - 1 "
+        f"WHERE s.kind = 'results' AND s.user_id IN ({marks})",
+        ids,
+    )
+    return {r["user_id"]: {"count": r["count"], "last": json.loads(r["doc"])} for r in rows}
+
+
+# ── Running progress statistics ───────────────────────────────────────────────
+# /results/my and /results/patient/{id} serve their progress summary from one
+# row instead of re-folding the history. append_result moves the state along
+# with each append and trim, rescore_results rebuilds it for the users it
+# rewrites, and check_progress_stats() recomputes it from the results.
+
+def _progress_state(conn: sqlite3.Connection, user_id: str) -> Optional[dict]:
+    row = conn.execute("SELECT state FROM progress_stats WHERE user_id = ?", (user_id,)).fetchone()
+    return json.loads(row["state"]) if row else None
+
+
+def _save_progress_state(conn: sqlite3.Connection, user_id: str, state: dict):
+    conn.execute(
+        "INSERT INTO progress_stats (user_id, state) VALUES (?, ?) "
+        "ON CONFLICT(user_id) DO UPDATE SET state = excluded.state",
+        (user_id, _dumps(state)),
+    )
+
+
+def get_progress_state(user_id: str) -> Optional[dict]:
+    """A user's running progress state (None if they have never stored a result)."""
+    return _progress_state(get_conn(), user_id)
+
+
+def _results_by_user(conn: sqlite3.Connection, user_ids: Optional[Iterable[str]] = None) -> Dict[str, List[dict]]:
+    if user_ids is None:
+        rows = conn.execute("SELECT user_id, doc FROM results ORDER BY user_id, seq")
+    else:
+        ids   = list(user_ids)
+        marks = ",".join("?" * len(ids))
+        rows  = conn.execute(
+            f"SELECT user_id, doc FROM results WHERE user_id IN ({marks}) ORDER BY user_id, seq", ids
+        ) if ids else []
+    history: Dict[str, List[dict]] = {}
+    for r in rows:
+        history.setdefault(r["user_id"], []).append(json.loads(r["doc"]))
+    return history
+
+
+def rebuild_progress_stats(conn: sqlite3.Connection, user_ids: Optional[Iterable[str]] = None) -> int:
+    """Recompute the progress state of `user_ids` (default: everyone) from their results. Returns rows written."""
+    if user_ids is None:
+        conn.execute("DELETE FROM progress_stats")
+    else:
+        user_ids = list(user_ids)
+        conn.executemany("DELETE FROM progress_stats WHERE user_id = ?", [(u,) for u in user_ids])
+    history = _results_by_user(conn, user_ids)
+    for user_id, results in history.items():
+        _save_progress_state(conn, user_id, progress_state_from(results))
+    return len(history)
+
+
+def check_progress_stats(repair: bool = False) -> Dict[str, List[str]]:
+    """
+    Compare every stored progress state with the statistics computed from the
+    user's results. Returns {user_id: ["field.stat", ...]} for the states that
+    are off; with repair=True those are rebuilt in the same transaction.
+    """
+    with transaction() as conn:
+        history = _results_by_user(conn)
+        stored  = {
+            r["user_id"]: json.loads(r["state"])
+            for r in conn.execute("SELECT user_id, state FROM progress_stats")
+        }
+        drift   = {}
+        for uid in stored.keys() | history.keys():
+            off = progress_state_drift(stored.get(uid), history.get(uid, []))
+            if off:
+                drift[uid] = off
+        if repair and drift:
+            rebuild_progress_stats(conn, drift)
+    return drift
+
+
+# ── Game sessions ─────────────────────────────────────────────────────────────
+
+def get_game_sessions(user_id: str, game_id: Optional[str] = None) -> List[dict]:
+    """A user's game sessions, oldest first, optionally for one game."""
+    if game_id:
+        rows = get_conn().execute(
+            "SELECT doc FROM game_sessions WHERE user_id = ? AND game_id = ? ORDER BY seq",
+            (user_id, game_id),
+        )
+    else:
+        rows = get_conn().execute(
+            "SELECT doc FROM game_sessions WHERE user_id = ? ORDER BY seq", (user_id,)
+        )
+    return [json.loads(r["doc"]) for r in rows]
+
+
+def game_sessions_page(user_id: str, game_id: Optional[str] = None,
+                       before: Optional[int] = None, after: Optional[int] = None,
+                       limit: int = 20) -> Tuple[List[dict], bool]:
+    """One page of a user's game sessions, oldest first, each with its `seq` cursor."""
+    sql, params = "SELECT seq, doc FROM game_sessions WHERE user_id = ?", (user_id,)
+    if game_id:
+        sql, params = f"{sql} AND game_id = ?", (user_id, game_id)
+    rows, more = _page(get_conn(), sql, params, before, after, limit)
+    return [{**json.loads(r["doc"]), "seq": r["seq"]} for r in rows], more
+
+
+def count_game_sessions(user_id: str, game_id: Optional[str] = None) -> int:
+    conn = get_conn()
+    if game_id:
+        return conn.execute(
+            "SELECT COUNT(*) FROM game_sessions WHERE user_id = ? AND game_id = ?", (user_id, game_id)
+        ).fetchone()[0]
+    row = conn.execute(
+        "SELECT count FROM shards WHERE user_id = ? AND kind = 'game_sessions'", (user_id,)
+    ).fetchone()
+    return row["count"] if row else 0
+
+
+def append_game_session(user_id: str, record: dict, keep: int, conn: sqlite3.Connection):
+    """Append one game session and trim the user's history to the newest `keep`."""
+    _shard_append(conn, "game_sessions", user_id, {
+        "game_id":     record["game_id"],
+        "final_score": record.get("final_score"),
+        "doc":         _dumps(record),
+    }, keep)
+
+
+def top_game_sessions(game_id: str, limit: int) -> List[dict]:
+    """Highest-scoring sessions for one game (served from the game_id, score index)."""
+    rows = get_conn().execute(
+        "SELECT user_id, doc FROM game_sessions WHERE game_id = ? AND final_score IS NOT NULL "
+        "ORDER BY final_score DESC LIMIT ?",
+        (game_id, limit),
+    )
+    return [{"user_id": r["user_id"], **json.loads(r["doc"])} for r in rows]
+
+
+def played_game_ids() -> List[str]:
+    return [r["game_id"] for r in get_conn().execute("SELECT DISTINCT game_id FROM game_sessions")]
+
+
+# ── Messages ──────────────────────────────────────────────────────────────────
+
+def conv_key(user_id: str, other_id: str) -> str:
+    return "|".join(sorted((user_id, other_id)))
+
+
+def insert_message(msg: dict, conn: sqlite3.Connection) -> int:
+    """Append one message to the log and return its sequence number."""
+    cur = conn.execute(
+        "INSERT INTO messages (id, conv, sender_id, recipient_id, doc) VALUES (?, ?, ?, ?, ?)",
+        (msg["id"], conv_key(msg["sender_id"], msg["recipient_id"]),
+         msg["sender_id"], msg["recipient_id"], _dumps(msg)),
+    )
+    _bump_unread(conn, msg["recipient_id"], 1)
+    return cur.lastrowid
+
+
+def get_message(message_id: str) -> Optional[dict]:
+    row = get_conn().execute("SELECT doc FROM messages WHERE id = ?", (message_id,)).fetchone()
+    return json.loads(row["doc"]) if row else None
+
+
+_VISIBLE = (
+    "NOT EXISTS (SELECT 1 FROM message_deletes d WHERE d.user_id = ? AND d.seq = m.seq)"
+)
+
+
+def conversation(user_id: str, other_id: str, before: Optional[int] = None,
+                 after: Optional[int] = None, limit: int = 50) -> Tuple[List[dict], bool]:
+    """
+    One page of the messages between two users that `user_id` has not
+    deleted, oldest first, each with its `seq` cursor and the legacy
+    `read_by` list filled in from the read watermarks.
+    """
+    conn = get_conn()
+    rows, more = _page(
+        conn, f"SELECT m.seq, m.doc FROM messages m WHERE m.conv = ? AND {_VISIBLE}",
+        (conv_key(user_id, other_id), user_id), before, after, limit,
+    )
+    marks = {
+        r["user_id"]: r["read_seq"]
+        for r in conn.execute(
+            "SELECT user_id, read_seq FROM message_reads "
+            "WHERE (user_id = ? AND other_id = ?) OR (user_id = ? AND other_id = ?)",
+            (user_id, other_id, other_id, user_id),
+        )
+    }
+    out = []
+    for r in rows:
+        msg = json.loads(r["doc"])
+        recipient = msg["recipient_id"]
+        msg["seq"] = r["seq"]
+        msg["read_by"] = [msg["sender_id"]]
+        if r["seq"] <= marks.get(recipient, 0):
+            msg["read_by"].append(recipient)
+        out.append(msg)
+    return out, more
+
+
+def last_message(user_id: str, other_id: str) -> Optional[dict]:
+    """Newest message between two users that `user_id` has not deleted."""
+    row = get_conn().execute(
+        f"SELECT m.doc FROM messages m WHERE m.conv = ? AND {_VISIBLE} ORDER BY m.seq DESC LIMIT 1",
+        (conv_key(user_id, other_id), user_id),
+    ).fetchone()
+    return json.loads(row["doc"]) if row else None
+
+
+def _read_seq(conn: sqlite3.Connection, user_id: str, other_id: str) -> int:
+    row = conn.execute(
+        "SELECT read_seq FROM message_reads WHERE user_id = ? AND other_id = ?",
+        (user_id, other_id),
+    ).fetchone()
+    return row["read_seq"] if row else 0
+
+
+def _latest_from(conn: sqlite3.Connection, user_id: str, other_id: str) -> int:
+    return conn.execute(
+        "SELECT COALESCE(MAX(seq), 0) FROM messages WHERE conv = ? AND sender_id = ?",
+        (conv_key(user_id, other_id), other_id),
+    ).fetchone()[0]
+
+
+def messages_since(user_id: str, after_seq: int, limit: int = 500) -> List[dict]:
+    """A user's sent + received messages after `after_seq` (stream catch-up), with `seq` set."""
+    rows = get_conn().execute(
+        f"SELECT * FROM ("
+        f"  SELECT m.seq, m.doc FROM messages m WHERE m.recipient_id = ? AND m.seq > ? AND {_VISIBLE}"
+        f"  UNION ALL"
+        f"  SELECT m.seq, m.doc FROM messages m WHERE m.sender_id = ? AND m.seq > ? AND {_VISIBLE}"
+        f") ORDER BY seq LIMIT ?",
+        (user_id, after_seq, user_id, user_id, after_seq, user_id, limit),
+    )
+    return [{**json.loads(r["doc"]), "seq": r["seq"]} for r in rows]
+
+
+def mark_conversation_read(user_id: str, other_id: str) -> bool:
+    """Advance the read watermark to the newest message from `other_id`. True if it moved."""
+    conn = get_conn()
+    if _read_seq(conn, user_id, other_id) >= _latest_from(conn, user_id, other_id):
+        return False                      # the common polling case: no write at all
+    with transaction() as conn:
+        read_seq = _read_seq(conn, user_id, other_id)
+        latest   = _latest_from(conn, user_id, other_id)
+        if read_seq >= latest:
+            return False
+        newly_read = conn.execute(
+            f"SELECT COUNT(*) FROM messages m "
+            f"WHERE m.conv = ? AND m.sender_id = ? AND m.seq > ? AND m.seq <= ? AND {_VISIBLE}",
+            (conv_key(user_id, other_id), other_id, read_seq, latest, user_id),
+        ).fetchone()[0]
+        conn.execute(
+            "INSERT INTO message_reads (user_id, other_id, read_seq) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id, other_id) DO UPDATE SET read_seq = excluded.read_seq",
+            (user_id, other_id, latest),
+        )
+        _bump_unread(conn, user_id, -newly_read)
+    return True
+
+
+def delete_message_for(user_id: str, message_id: str, conn: sqlite3.Connection) -> bool:
+    """Hide one message from `user_id`'s view ("delete for me"). True if newly hidden."""
+    msg = conn.execute(
+        "SELECT seq, sender_id, recipient_id FROM messages WHERE id = ?", (message_id,)
+    ).fetchone()
+    if not msg:
+        return False
+    cur = conn.execute(
+        "INSERT OR IGNORE INTO message_deletes (user_id, seq) VALUES (?, ?)", (user_id, msg["seq"])
+    )
+    if not cur.rowcount:
+        return False
+    if msg["recipient_id"] == user_id and msg["seq"] > _read_seq(conn, user_id, msg["sender_id"]):
+        _bump_unread(conn, user_id, -1)
+    return True
+
+
+# ── Unread counters ───────────────────────────────────────────────────────────
+# The polled badge endpoint reads one row. Every path that changes what is
+# unread (send, read watermark, delete) adjusts the counter in the same
+# transaction; check_unread_counts() recomputes them from the log.
+
+def _bump_unread(conn: sqlite3.Connection, user_id: str, delta: int):
+    if delta:
+        conn.execute(
+            "INSERT INTO unread_counts (user_id, count) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET count = count + excluded.count",
+            (user_id, delta),
+        )
+
+
+def unread_count(user_id: str) -> int:
+    row = get_conn().execute(
+        "SELECT count FROM unread_counts WHERE user_id = ?", (user_id,)
+    ).fetchone()
+    return row["count"] if row else 0
+
+
+def _unread_from_log(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Unread totals derived from scratch: incoming, above the watermark, not deleted."""
+    rows = conn.execute(
+        "SELECT m.recipient_id AS user_id, COUNT(*) AS n FROM messages m "
+        "LEFT JOIN message_reads r ON r.user_id = m.recipient_id AND r.other_id = m.sender_id "
+        "WHERE m.seq > COALESCE(r.read_seq, 0) AND NOT EXISTS ("
+        "    SELECT 1 FROM message_deletes d WHERE d.user_id = m.recipient_id AND d.seq = m.seq"
+        ") GROUP BY m.recipient_id"
+    )
+    return {r["user_id"]: r["n"] for r in rows}
+
+
+def rebuild_unread_counts(conn: sqlite3.Connection) -> int:
+    """Replace every counter with its value recomputed from the log. Returns rows written."""
+    actual = _unread_from_log(conn)
+    conn.execute("DELETE FROM unread_counts")
+    conn.executemany(
+        "INSERT INTO unread_counts (user_id, count) VALUES (?, ?)", actual.items()
+    )
+    return len(actual)
+
+
+def check_unread_counts(repair: bool = False) -> Dict[str, dict]:
+    """
+    Compare the stored counters with the log. Returns the users whose counter
+    is wrong as {user_id: {"stored": n, "actual": m}}; with repair=True the
+    counters are rebuilt in the same transaction.
+    """
+    with transaction() as conn:
+        actual = _unread_from_log(conn)
+        stored = {r["user_id"]: r["count"] for r in conn.execute("SELECT user_id, count FROM unread_counts")}
+        drift  = {
+            uid: {"stored": stored.get(uid, 0), "actual": actual.get(uid, 0)}
+            for uid in stored.keys() | actual.keys()
+            if stored.get(uid, 0) != actual.get(uid, 0)
+        }
+        if repair and drift:
+            rebuild_unread_counts(conn)
+    return drift
+
+
+# ── Custom content ────────────────────────────────────────────────────────────
+
+def get_content() -> dict:
+    """All custom content in the legacy {"passages": [...], "word_sets": [...]} shape."""
+    out  = {key: [] for key in CONTENT_KINDS.values()}
+    rows = get_conn().execute("SELECT kind, doc FROM content ORDER BY seq")
+    for r in rows:
+        out[CONTENT_KINDS[r["kind"]]].append(json.loads(r["doc"]))
+    return out
+
+
+def add_content(kind: str, item: dict) -> int:
+    """Insert a passage / word set and return how many of that kind exist."""
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO content (id, kind, doc) VALUES (?, ?, ?)",
+            (item["id"], kind, _dumps(item)),
+        )
+        return conn.execute("SELECT COUNT(*) FROM content WHERE kind = ?", (kind,)).fetchone()[0]
+
+
+def delete_content(kind: str, item_id: str):
+    get_conn().execute("DELETE FROM content WHERE kind = ? AND id = ?", (kind, item_id))
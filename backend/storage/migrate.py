@@ -0,0 +1,135 @@
+"""
+migrate.py — One-shot import of the legacy data/*.json files into SQLite.
+
+Runs automatically at startup (see main.py) and records completion in the
+`meta` table, so it only ever imports once. Can also be run by hand:
+
+    python -m storage.migrate
+
+The JSON files are left untouched; they can be archived once the import has
+been verified.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from storage import db
+from utils.logger import log_info, log_warning
+
+MIGRATION_KEY = "json_import_completed_at"
+
+
+def _read(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            log_warning(f"[migrate] could not parse {path} — skipped")
+            return default
+
+
+def import_json(data_dir: str = db.DATA_DIR) -> Optional[dict]:
+    """
+    Import every legacy JSON file in one transaction. Returns row counts, or
+    None if the import already ran (checked under the write lock, so several
+    workers starting at once import only once).
+    """
+    users    = _read(os.path.join(data_dir, "users.json"), {})
+    sessions = _read(os.path.join(data_dir, "sessions.json"), {})
+    results  = _read(os.path.join(data_dir, "results.json"), {})
+    games    = _read(os.path.join(data_dir, "game_results.json"), {})
+    messages = _read(os.path.join(data_dir, "messages.json"), [])
+    content  = _read(os.path.join(data_dir, "custom_content.json"), {})
+
+    counts = dict(users=0, sessions=0, results=0, game_sessions=0, messages=0, content=0)
+
+    with db.transaction() as conn:
+        if conn.execute("SELECT 1 FROM meta WHERE key = ?", (MIGRATION_KEY,)).fetchone():
+            return None
+
+        for uid, user in users.items():
+            user.setdefault("id", uid)
+            try:
+                db.save_user(user, conn)
+            except sqlite3.IntegrityError:
+                log_warning(f"[migrate] duplicate email+role for user {uid} — skipped")
+                continue
+            counts["users"] += 1
+
+        # Imported sessions keep their age (absolute TTL) with a fresh idle window.
+        now = time.time()
+        for token, s in sessions.items():
+            created = s.get("created_at") or datetime.utcnow().isoformat()
+            try:
+                created_ts = datetime.fromisoformat(created).replace(tzinfo=timezone.utc).timestamp()
+            except ValueError:
+                created_ts = now
+            conn.execute(
+                "INSERT OR IGNORE INTO sessions (token, user_id, created_at, created_ts, last_seen) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (token, s["user_id"], created, created_ts, now),
+            )
+            counts["sessions"] += 1
+
+        for uid, history in results.items():
+            for r in history:
+                db.append_result(uid, r, keep=len(history), conn=conn)
+            counts["results"] += len(history)
+
+        for uid, history in games.items():
+            for s in history:
+                s.setdefault("game_id", "")
+                db.append_game_session(uid, s, keep=len(history), conn=conn)
+            counts["game_sessions"] += len(history)
+
+        # Messages go into the append-only log; their read_by / deleted_by lists
+        # become read watermarks and per-user delete marks; the unread counters
+        # are derived from the result once everything is in.
+        for m in sorted(messages, key=lambda m: m.get("timestamp", "")):
+            read_by, deleted_by = m.pop("read_by", []), m.pop("deleted_by", [])
+            if db.get_message(m["id"]):
+                continue
+            seq = db.insert_message(m, conn)
+            if m["recipient_id"] in read_by:
+                conn.execute(
+                    "INSERT INTO message_reads (user_id, other_id, read_seq) VALUES (?, ?, ?) "
+                    "ON CONFLICT(user_id, other_id) DO UPDATE SET read_seq = excluded.read_seq",
+                    (m["recipient_id"], m["sender_id"], seq),
+                )
+            for uid in deleted_by:
+                db.delete_message_for(uid, m["id"], conn)
+            counts["messages"] += 1
+        db.rebuild_unread_counts(conn)
+
+        for kind, key in db.CONTENT_KINDS.items():
+            items = content.get(key, [])
+            conn.executemany(
+                "INSERT OR IGNORE INTO content (id, kind, doc) VALUES (?, ?, ?)",
+                [(item["id"], kind, db._dumps(item)) for item in items],
+            )
+            counts["content"] += len(items)
+
+        db.set_meta(MIGRATION_KEY, datetime.utcnow().isoformat(), conn)
+
+    return counts
+
+
+def migrate_once(data_dir: str = db.DATA_DIR) -> bool:
+    """Import legacy JSON data unless a previous run already did. Returns True if it ran."""
+    if db.get_meta(MIGRATION_KEY):
+        return False
+    counts = import_json(data_dir)
+    if counts is None:
+        return False
+    log_info(f"[migrate] imported legacy JSON data: {counts}")
+    return True
+
+
+if __name__ == "__main__":
+    print("imported" if migrate_once() else "already migrated")
@@ -0,0 +1,181 @@
+"""
+writer.py — Single-writer persistence queue with write coalescing.
+
+Hot write paths (`/api/analyze`, `/api/games/{id}/submit`) enqueue their
+mutation instead of opening a write transaction of their own. One background
+thread owns a dedicated write connection; it drains the queue and commits
+every mutation that arrives within WRITE_COALESCE_MS as a single transaction,
+so N concurrent submissions cost one commit (and one fsync) instead of N
+competing for the SQLite write lock.
+
+Each mutation runs inside its own SAVEPOINT: a failing mutation is rolled back
+and its error re-raised to the submitting request without affecting the rest
+of the batch.
+
+Read-your-writes: `run()` / `run_async()` return only after the batch holding
+the mutation has committed, so the submitting request (and anything it does
+next) sees its own write.
+"""
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from typing import Callable
+
+from storage import db
+from utils.logger import log_error, log_info
+
+WRITE_COALESCE_MS = float(os.getenv("WRITE_COALESCE_MS", "2"))
+WRITE_MAX_BATCH   = int(os.getenv("WRITE_MAX_BATCH", "256"))
+
+_STOP = object()
+
+
+class WriteQueue:
+    def __init__(self, window_ms: float = WRITE_COALESCE_MS, max_batch: int = WRITE_MAX_BATCH):
+        self.window    = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread   = None
+        self._lock     = threading.Lock()
+        self.batches   = 0
+        self.ops       = 0
+        self.failures  = 0
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Flush everything already queued, then stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    # ── Submission ────────────────────────────────────────────────────────────
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue `fn(*args, conn=<write conn>, **kwargs)`; the future resolves after commit."""
+        if not (self._thread and self._thread.is_alive()):
+            self.start()
+        fut: Future = Future()
+        self._queue.put((fn, args, kwargs, fut))
+        return fut
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """Blocking submit for sync routes (thread pool)."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def run_async(self, fn: Callable, *args, **kwargs):
+        """Awaitable submit for async routes — never blocks the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        return {
+            "queued":         self._queue.qsize(),
+            "batches":        self.batches,
+            "ops":            self.ops,
+            "failures":       self.failures,
+            "avg_batch_size": round(self.ops / self.batches, 2) if self.batches else None,
+            "window_ms":      self.window * 1000,
+        }
+
+    # ── Writer thread ─────────────────────────────────────────────────────────
+
+    def _collect(self, first) -> tuple[list, bool]:
+        batch, stopping = [first], False
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stopping = True
+                break
+            batch.append(item)
+        return batch, stopping
+
+    def _loop(self):
+        conn = db.connect()
+        conn.execute("PRAGMA synchronous=FULL")   # durable commits; cost is shared per batch
+        log_info("[writer] single-writer queue started")
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stopping = self._collect(first)
+            self._commit(conn, batch)
+            if stopping:
+                break
+        # Drain anything enqueued after the stop marker so no caller hangs.
+        leftovers = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                leftovers.append(item)
+        if leftovers:
+            self._commit(conn, leftovers)
+        conn.close()
+        log_info("[writer] single-writer queue stopped")
+
+    @staticmethod
+    def _settle(fut: Future, result=None, exc: Exception = None):
+        """Resolve one caller's future; a future that cannot take it must not stop the thread."""
+        try:
+            if exc is not None:
+                fut.set_exception(exc)
+            else:
+                fut.set_result(result)
+        except InvalidStateError:
+            log_error("[writer] a write finished after its future was already resolved")
+
+    def _commit(self, conn, batch: list):
+        # Ops cancelled while queued (an async caller that went away) are
+        # dropped; the rest are marked running, so they can no longer be
+        # cancelled and will be resolved once the batch commits.
+        batch = [op for op in batch if op[3].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for i, (fn, args, kwargs, fut) in enumerate(batch):
+                conn.execute(f"SAVEPOINT op{i}")
+                try:
+                    outcomes.append((fut, fn(*args, conn=conn, **kwargs), None))
+                    conn.execute(f"RELEASE op{i}")
+                except Exception as exc:
+                    conn.execute(f"ROLLBACK TO op{i}")
+                    conn.execute(f"RELEASE op{i}")
+                    outcomes.append((fut, None, exc))
+            conn.execute("COMMIT")
+        except Exception as exc:
+            log_error(f"[writer] batch of {len(batch)} failed: {exc}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self.failures += len(batch)
+            for _, _, _, fut in batch:
+                self._settle(fut, exc=exc)
+            return
+
+        self.batches += 1
+        self.ops     += len(batch)
+        for fut, result, exc in outcomes:
+            if exc is not None:
+                self.failures += 1
+            self._settle(fut, result, exc)
+
+
+writer = WriteQueue()
@@ -0,0 +1,84 @@
+"""
+batching.py
+───────────
+MicroBatcher: gathers items submitted by concurrent requests for a short
+window and hands them to one vectorised call. It is for async code and
+must be used from one event loop.
+"""
+
+import asyncio
+from typing import Any, Callable, List, Optional
+
+
+class MicroBatcher:
+    """
+    `await submit(item)` queues the item. The queue is flushed as soon as
+    it holds `max_size` items, `window` seconds after its first item
+    arrived, or earlier, once a pass of the event loop adds nothing to it.
+    Waiting longer than that only adds latency, because every request that
+    was ready has already been queued. `fn(items)` is called with the whole
+    batch and must return one result per item, in order. If it raises,
+    every caller in the batch gets that exception.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], window: float, max_size: int):
+        self.fn        = fn
+        self.window    = window
+        self.max_size  = max_size
+        self._pending: "list[tuple[Any, asyncio.Future]]" = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._seen     = -1      # queue length at the last idle check
+        self.batches   = 0
+        self.items     = 0
+        self.max_batch = 0
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        fut  = loop.create_future()
+        self._pending.append((item, fut))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+            self._seen  = 0
+            loop.call_soon(self._flush_if_idle)
+        return await fut
+
+    def _flush_if_idle(self):
+        if self._timer is None:
+            return                          # already flushed
+        if len(self._pending) == self._seen:
+            self._flush()
+        else:
+            self._seen = len(self._pending)
+            asyncio.get_running_loop().call_soon(self._flush_if_idle)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.batches  += 1
+        self.items    += len(batch)
+        self.max_batch = max(self.max_batch, len(batch))
+        try:
+            results = self.fn([item for item, _ in batch])
+        except Exception as exc:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+        for (_, fut), result in zip(batch, results):
+            if not fut.done():      # the caller may have been cancelled meanwhile
+                fut.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "batches":    self.batches,
+            "items":      self.items,
+            "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch":  self.max_batch,
+            "pending":    len(self._pending),
+        }
@@ -0,0 +1,172 @@
+"""
+cache.py
+────────
+Small in-process caches shared by the backend.
+TTLCache is thread-safe: sync FastAPI routes run concurrently in a thread pool.
+SingleFlight and StreamFlight are for async code and must be used from one
+event loop.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, List, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded LRU map whose entries also expire `ttl` seconds after insertion.
+    Keeps hit / miss / eviction counters for the metrics endpoint.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize   = maxsize
+        self.ttl       = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock     = threading.Lock()
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= now:
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size":      len(self._data),
+            "maxsize":   self.maxsize,
+            "ttl":       self.ttl,
+            "hits":      self.hits,
+            "misses":    self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls per key: while `fn()` for a key is running,
+    further callers with the same key await that same call instead of
+    starting another. Callers are shielded from each other — one caller
+    going away does not cancel the shared call.
+    """
+
+    def __init__(self):
+        self._inflight: "dict[Hashable, asyncio.Task]" = {}
+        self.calls     = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {"inflight": len(self._inflight), "calls": self.calls, "coalesced": self.coalesced}
+
+
+class _Broadcast:
+    """Items of one stream, kept so that late followers can replay them."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done  = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def pump(self, source: AsyncIterator[Any]):
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._wake()
+        except Exception as exc:
+            self.error = exc
+        finally:
+            self.done = True
+            self._wake()
+
+    async def follow(self) -> AsyncIterator[Any]:
+        i = 0
+        while True:
+            while i < len(self.items):
+                yield self.items[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class StreamFlight:
+    """
+    SingleFlight for async streams: while the stream from `fn()` for a key is
+    running, further callers with the same key receive its items (those
+    produced so far, then the rest as they arrive) instead of opening another
+    stream. An exception from the stream reaches every caller after the
+    items before it. The stream is consumed by its own task, so one caller
+    going away does not cut it short for the others.
+    """
+
+    def __init__(self):
+        self._inflight: "dict[Hashable, _Broadcast]" = {}
+        self.calls     = 0
+        self.coalesced = 0
+
+    async def stream(self, key: Hashable, fn: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        flight = self._inflight.get(key)
+        if flight is None:
+            self.calls += 1
+            flight = self._inflight[key] = _Broadcast()
+            task = asyncio.ensure_future(flight.pump(fn()))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        async for item in flight.follow():
+            yield item
+
+    def stats(self) -> dict:
+        return {"inflight": len(self._inflight), "calls": self.calls, "coalesced": self.coalesced}
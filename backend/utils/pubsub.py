@@ -0,0 +1,103 @@
+"""
+pubsub.py
+─────────
+In-process publish / subscribe for pushing events to streaming clients.
+Subscribers are asyncio queues owned by the event loop; publish() may be
+called from any thread (sync routes run in the thread pool) and hands each
+event over with call_soon_threadsafe, so an idle subscriber costs nothing
+but its queue.
+
+A subscriber that falls more than `maxsize` events behind is cut off: its
+queue is cleared and it receives `OVERFLOW`, after which the stream should
+end so the client reconnects and catches up from storage.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Any, Hashable
+
+OVERFLOW = object()
+
+
+class Subscription:
+    def __init__(self, topic: Hashable, maxsize: int):
+        self.topic   = topic
+        self.maxsize = maxsize
+        self.loop    = asyncio.get_running_loop()
+        self.queue: "asyncio.Queue" = asyncio.Queue()
+        self.closed  = False
+
+    def _offer(self, event: Any) -> bool:
+        """Queue one event; False if this subscriber is (now) cut off."""
+        if self.closed:
+            return False
+        if self.queue.qsize() >= self.maxsize:
+            self.closed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+            return False
+        self.queue.put_nowait(event)
+        return True
+
+    async def get(self) -> Any:
+        return await self.queue.get()
+
+
+class Broker:
+    def __init__(self, maxsize: int = 100):
+        self.maxsize   = maxsize
+        self._subs: "defaultdict[Hashable, set]" = defaultdict(set)
+        self._lock     = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+
+    def subscribe(self, topic: Hashable) -> Subscription:
+        """Must be called from the event loop that will consume the subscription."""
+        sub = Subscription(topic, self.maxsize)
+        with self._lock:
+            self._subs[topic].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subs.get(sub.topic)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.topic]
+
+    def publish(self, topic: Hashable, event: Any) -> int:
+        """Deliver `event` to every subscriber of `topic`. Returns how many there were."""
+        with self._lock:
+            subs = list(self._subs.get(topic, ()))
+            self.published += 1
+        for sub in subs:
+            if sub.closed:
+                continue
+            try:
+                sub.loop.call_soon_threadsafe(self._deliver, sub, event)
+            except RuntimeError:      # loop already closed (shutdown)
+                self.unsubscribe(sub)
+        return len(subs)
+
+    def _deliver(self, sub: Subscription, event: Any):
+        was_open = not sub.closed
+        if sub._offer(event):
+            self.delivered += 1
+        elif was_open:
+            self.overflows += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            topics      = len(self._subs)
+            subscribers = sum(len(s) for s in self._subs.values())
+        return {
+            "topics":      topics,
+            "subscribers": subscribers,
+            "published":   self.published,
+            "delivered":   self.delivered,
+            "overflows":   self.overflows,
+        }
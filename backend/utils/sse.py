@@ -0,0 +1,19 @@
+"""
+sse.py
+──────
+Server-Sent Events framing shared by the streaming endpoints
+(/api/messages/stream, /api/chat/stream).
+"""
+
+import json
+from typing import Optional
+
+# Stop proxies (nginx) from buffering the stream and browsers from caching it.
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+KEEP_ALIVE = ": keep-alive\n\n"
+
+
+def sse_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
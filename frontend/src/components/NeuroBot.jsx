@@ -6,7 +6,7 @@
  */
 import { useState, useRef, useEffect } from "react";
 import { T } from "../utils/theme";
-import { submitChat } from "../services/api";
+import { streamChat, submitChat } from "../services/api";
 
 // ── Built-in fallback answers (no backend needed) ────────────────────────────
 const FALLBACKS = [
@@ -173,20 +173,43 @@ export default function NeuroBot({ user }) {
     setMessages(m => [...m, { role: "user", text: question }]);
     setLoading(true);
 
+    // Stream the answer into a bot bubble as it arrives; if the stream can't
+    // start, fall back to the one-shot endpoint, then to the built-in answers.
+    let sources = [], started = false;
+
     try {
-      const res = await submitChat(question, { user_name: user?.name });
-      setMessages(m => [...m, {
-        role: "bot",
-        text: res.answer,
-        sources: res.sources || [],
-      }]);
+      await streamChat(question, { user_name: user?.name }, (event, data) => {
+        if (event === "meta") {
+          sources = data.sources || [];
+        } else if (event === "token" && !started) {
+          started = true;
+          setLoading(false);
+          setMessages(m => [...m, { role: "bot", text: data.text, sources }]);
+        } else if (event === "token") {
+          setMessages(m => {
+            const last = m[m.length - 1];
+            return [...m.slice(0, -1), { ...last, text: last.text + data.text }];
+          });
+        }
+      });
     } catch {
-      // Backend unavailable — use built-in fallback
-      setMessages(m => [...m, {
-        role: "bot",
-        text: getFallback(question),
-        sources: [],
-      }]);
+      if (!started) {
+        try {
+          const res = await submitChat(question, { user_name: user?.name });
+          setMessages(m => [...m, {
+            role: "bot",
+            text: res.answer,
+            sources: res.sources || [],
+          }]);
+        } catch {
+          // Backend unavailable — use built-in fallback
+          setMessages(m => [...m, {
+            role: "bot",
+            text: getFallback(question),
+            sources: [],
+          }]);
+        }
+      }
     } finally {
       setLoading(false);
     }
@@ -2,7 +2,7 @@ import { useState, useEffect, useMemo } from "react";
 import { T } from "../utils/theme";
 import NeuroBot from "./NeuroBot";
 import { GAMES } from "../utils/gamesCatalog";
-import { getUnreadCount } from "../services/api";
+import { getUnreadCount, subscribeMessages } from "../services/api";
 import { setCommunityPresence, subscribeCommunityMembers } from "../services/community";
 
 const LIME = "#C8F135";
@@ -223,12 +223,15 @@ export function Sidebar({ role, page, setPage, setView, onLogout, isMobile = fal
     };
 
     refreshUnread();
-    const iv = setInterval(refreshUnread, 8000);
+    // The server pushes the new count whenever it changes.
+    const unsubscribe = subscribeMessages((event, data) => {
+      if (event === "unread" && alive) setUnread(data.count || 0);
+    });
     window.addEventListener("neuroaid:messages-read", refreshUnread);
 
     return () => {
       alive = false;
-      clearInterval(iv);
+      unsubscribe();
       window.removeEventListener("neuroaid:messages-read", refreshUnread);
     };
   }, []);
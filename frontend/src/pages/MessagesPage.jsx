@@ -1,6 +1,6 @@
 import { useState, useEffect, useRef } from "react";
 import { T } from "../utils/theme";
-import { getUser, getConversations, getMessages, sendMessage, deleteMessage, getPatients, getDoctors } from "../services/api";
+import { getUser, getConversations, getMessages, sendMessage, deleteMessage, getPatients, getDoctors, subscribeMessages } from "../services/api";
 
 const LIME = "#C8F135";
 
@@ -31,6 +31,8 @@ export default function MessagesPage() {
   const [convs,      setConvs]      = useState([]);
   const [active,     setActive]     = useState(null);
   const [messages,   setMessages]   = useState([]);
+  const [hasOlder,   setHasOlder]   = useState(false);   // more history before messages[0]
+  const [olderBusy,  setOlderBusy]  = useState(false);
   const [text,       setText]       = useState("");
   const [loading,    setLoading]    = useState(true);
   const [sending,    setSending]    = useState(false);
@@ -40,14 +42,58 @@ export default function MessagesPage() {
   const [pickList,   setPickList]   = useState([]);    // list of people to start chat with
 
   const bottomRef = useRef(null);
-  const pollRef   = useRef(null);
+  const activeRef = useRef(null);   // id of the open conversation, for stream events
+  const msgsRef   = useRef([]);     // messages of the open conversation, for stream events
+  const convsRef  = useRef([]);
   const inputRef  = useRef(null);
+  const lastIdRef = useRef(null);   // newest message shown; scroll only when it changes
+
+  useEffect(() => { msgsRef.current = messages; }, [messages]);
+  useEffect(() => { convsRef.current = convs; }, [convs]);
 
   useEffect(() => {
     loadConvs();
-    return () => clearInterval(pollRef.current);
+    // New messages are pushed by the server instead of polled. A pushed message
+    // is merged in place; only an incoming one in the open chat goes back to the
+    // server, for just the messages after the last one shown (which marks it read).
+    return subscribeMessages((event, msg) => {
+      if (event !== "message") return;
+      const other = msg.sender_id === me?.id ? msg.recipient_id : msg.sender_id;
+      if (other === activeRef.current) {
+        if (msg.sender_id === me?.id) appendMsgs([msg]);
+        else loadNewer(other);
+      }
+      bumpConv(other, msg);
+    });
   }, []);
 
+  // Add messages not already shown, keeping seq order.
+  function appendMsgs(msgs) {
+    setMessages(cur => {
+      const seen  = new Set(cur.map(m => m.id));
+      const fresh = msgs.filter(m => !seen.has(m.id));
+      return fresh.length ? [...cur, ...fresh].sort((a, b) => a.seq - b.seq) : cur;
+    });
+  }
+
+  async function loadNewer(otherId) {
+    const shown = msgsRef.current;
+    if (!shown.length) return loadMsgs(otherId);
+    try {
+      const { messages: msgs } = await getMessages(otherId, { after: shown[shown.length - 1].seq });
+      if (activeRef.current === otherId) appendMsgs(msgs || []);
+      window.dispatchEvent(new Event("neuroaid:messages-read"));
+    } catch (e) {}
+  }
+
+  // Move a conversation to the top with its newest message; unknown partners reload the list.
+  function bumpConv(otherId, msg) {
+    const list = convsRef.current;
+    const conv = list.find(c => c.user_id === otherId);
+    if (!conv) return loadConvs();
+    setConvs([{ ...conv, last_msg: msg.text, last_ts: msg.timestamp }, ...list.filter(c => c !== conv)]);
+  }
+
   async function loadConvs() {
     setLoading(true);
     try {
@@ -60,30 +106,53 @@ export default function MessagesPage() {
   function openConv(conv) {
     setActive(conv);
     setShowPicker(false);
+    activeRef.current = conv.user_id;
+    setMessages([]);
+    setHasOlder(false);
     loadMsgs(conv.user_id);
-    clearInterval(pollRef.current);
-    pollRef.current = setInterval(() => loadMsgs(conv.user_id), 4000);
     setTimeout(() => inputRef.current?.focus(), 100);
   }
 
   async function loadMsgs(otherId) {
     try {
-      const msgs = await getMessages(otherId);
+      const { messages: msgs, has_more } = await getMessages(otherId);
+      if (activeRef.current !== otherId) return;
       setMessages(msgs || []);
+      setHasOlder(!!has_more);
       // Notify sidebar to refresh unread badge immediately after chat is opened/read.
       window.dispatchEvent(new Event("neuroaid:messages-read"));
     } catch (e) {}
   }
 
+  // Prepend the page before the oldest message shown.
+  async function loadOlder() {
+    const otherId = activeRef.current;
+    const oldest  = msgsRef.current[0];
+    if (!otherId || !oldest || olderBusy) return;
+    setOlderBusy(true);
+    try {
+      const { messages: msgs, has_more } = await getMessages(otherId, { before: oldest.seq });
+      if (activeRef.current !== otherId) return;
+      setMessages(cur => {
+        const seen = new Set(cur.map(m => m.id));
+        return [...(msgs || []).filter(m => !seen.has(m.id)), ...cur];
+      });
+      setHasOlder(!!has_more);
+    } catch (e) {}
+    finally { setOlderBusy(false); }
+  }
+
   useEffect(() => {
-    bottomRef.current?.scrollIntoView({ behavior: "smooth" });
+    const lastId = messages.length ? messages[messages.length - 1].id : null;
+    if (lastId !== lastIdRef.current) bottomRef.current?.scrollIntoView({ behavior: "smooth" });
+    lastIdRef.current = lastId;
   }, [messages]);
 
   // "New Chat" — load the people this user can message
   async function openPicker() {
     setShowPicker(true);
     setActive(null);
-    clearInterval(pollRef.current);
+    activeRef.current = null;
     try {
       if (isDoctor) {
         const list = await getPatients();
@@ -101,9 +170,9 @@ export default function MessagesPage() {
     const txt = text.trim();
     setText("");
     try {
-      await sendMessage(active.user_id, txt);
-      await loadMsgs(active.user_id);
-      await loadConvs();
+      const { message } = await sendMessage(active.user_id, txt);
+      if (activeRef.current === active.user_id) appendMsgs([message]);
+      bumpConv(active.user_id, message);
     } catch (e) { alert("Failed to send: " + e.message); }
     finally { setSending(false); }
   }
@@ -248,6 +317,12 @@ export default function MessagesPage() {
 
           {/* Message thread */}
           <div style={{ flex: 1, overflowY: "auto", padding: "20px 24px", display: "flex", flexDirection: "column", gap: 10 }}>
+            {hasOlder && (
+              <button onClick={loadOlder} disabled={olderBusy}
+                style={{ alignSelf: "center", padding: "5px 14px", borderRadius: 20, background: "rgba(255,255,255,0.05)", border: "1px solid rgba(255,255,255,0.1)", color: "#888", fontSize: 12, cursor: olderBusy ? "default" : "pointer", fontFamily: "'DM Sans',sans-serif" }}>
+                {olderBusy ? "Loading…" : "Load older messages"}
+              </button>
+            )}
             {messages.length === 0 ? (
               <div style={{ flex: 1, display: "flex", flexDirection: "column", alignItems: "center", justifyContent: "center", gap: 12, color: "#555", paddingBottom: 60 }}>
                 <div style={{ fontSize: 42, opacity: 0.2 }}>👋</div>
@@ -88,9 +88,17 @@ export async function getPatientResults(patientId) {
 export async function sendMessage(recipientId, text) {
   return request("POST", "/messages/send", { recipient_id: recipientId, text }, true);
 }
-export async function getMessages(otherUserId) {
-  const data = await request("GET", `/messages/${otherUserId}`, null, true);
-  return data.messages;
+/**
+ * One page of a conversation, oldest first: the newest messages, or with
+ * { before: seq } the page before seq, or with { after: seq } only what is
+ * newer. Resolves to { messages, has_more }. Marks the conversation read.
+ */
+export async function getMessages(otherUserId, { before, after } = {}) {
+  const params = new URLSearchParams();
+  if (before != null) params.set("before", before);
+  if (after  != null) params.set("after", after);
+  const qs = params.toString() ? `?${params}` : "";
+  return request("GET", `/messages/${otherUserId}${qs}`, null, true);
 }
 export async function deleteMessage(messageId) {
   return request("DELETE", `/messages/${messageId}`, null, true);
@@ -104,6 +112,86 @@ export async function getUnreadCount() {
   return data.count;
 }
 
+// ── Server-Sent Events ────────────────────────────────────────────────────────
+// Reads a text/event-stream fetch() response, calling onEvent(event, data, id)
+// per event (data parsed as JSON; keep-alive comments skipped). Resolves when
+// the server closes the stream.
+async function readEvents(res, onEvent) {
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buf = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) return;
+    buf += value;
+    let end;
+    while ((end = buf.indexOf("\n\n")) >= 0) {
+      const block = buf.slice(0, end);
+      buf = buf.slice(end + 2);
+      let event = "message", data = "", id = null;
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+        else if (line.startsWith("id: ")) id = Number(line.slice(4));
+      }
+      if (data) onEvent(event, JSON.parse(data), id);
+    }
+  }
+}
+
+// ── Message stream ────────────────────────────────────────────────────────────
+// One shared connection to /messages/stream for the whole tab. fetch() is used
+// instead of EventSource so the bearer token stays in a header. Handlers get
+// (event, data) with event = "message" | "unread". After a drop the stream
+// reconnects with ?since=<last seq> and the server replays anything missed.
+// At most one loop runs at a time (streamRunning): a handler that subscribes
+// while the loop is between connections is picked up by that same loop.
+const streamHandlers = new Set();
+let streamAbort = null;
+let streamRunning = false;
+
+async function runMessageStream() {
+  streamRunning = true;
+  try {
+    await messageStreamLoop();
+  } finally {
+    streamRunning = false;
+  }
+}
+
+async function messageStreamLoop() {
+  let since = null;
+  while (streamHandlers.size) {
+    const ctrl = new AbortController();
+    streamAbort = ctrl;
+    try {
+      const qs  = since !== null ? `?since=${since}` : "";
+      const res = await fetch(`${BASE}/messages/stream${qs}`, {
+        headers: { Authorization: `Bearer ${getToken()}`, Accept: "text/event-stream" },
+        signal: ctrl.signal,
+      });
+      if (!res.ok || !res.body) throw new Error(`stream ${res.status}`);
+      await readEvents(res, (event, payload, id) => {
+        if (id !== null) since = id;
+        streamHandlers.forEach(h => h(event, payload));
+      });
+    } catch (e) {
+      if (ctrl.signal.aborted) continue;   // last handler left; carry on only if another arrived
+    }
+    if (!getToken()) return;
+    await new Promise(r => setTimeout(r, 2000));
+  }
+}
+
+/** Subscribe to pushed message / unread events. Returns an unsubscribe function. */
+export function subscribeMessages(handler) {
+  streamHandlers.add(handler);
+  if (!streamRunning) runMessageStream();
+  return () => {
+    streamHandlers.delete(handler);
+    if (!streamHandlers.size && streamAbort) streamAbort.abort();
+  };
+}
+
 export async function getDoctors() {
   const data = await request("GET", "/auth/doctors", null, true);
   return data.doctors;
@@ -130,4 +218,19 @@ export async function approvePatient(patientId, action) {
 // ── Chat / RAG ────────────────────────────────────────────────────────────────
 export async function submitChat(question, user_context = {}) {
   return request("POST", "/chat", { question, user_context });
+}
+
+/**
+ * Streamed answer from /chat/stream. onEvent(event, data) receives
+ * "meta" {guardrail_triggered, sources}, then "token" {text} pieces, then
+ * "done" {powered_by, disclaimer}. Rejects if the request itself fails.
+ */
+export async function streamChat(question, user_context = {}, onEvent) {
+  const res = await fetch(`${BASE}/chat/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+    body: JSON.stringify({ question, user_context }),
+  });
+  if (!res.ok || !res.body) throw new Error(`chat stream ${res.status}`);
+  await readEvents(res, onEvent);
 }
\ No newline at end of file